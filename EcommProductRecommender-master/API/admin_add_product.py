@@ -1,10 +1,49 @@
 # admin_add_product.py
+import argparse
+import csv
 import sqlite3
 import json
 import os
+import pathlib
+
+from product_catalog import (
+    PRODUCT_COLUMNS, ProductValidationError, normalize_product, product_content_hash,
+    ensure_content_hash_column, iter_json_records, SQLITE_MAX_PARAMS
+)
 
 # --- Configuration ---
 DATABASE_PATH = "ecommerce.db" # Path to your SQLite database file
+BUSY_TIMEOUT_MS = 5000 # Wait this long for the API's locks instead of failing with "database is locked"
+DEFAULT_BATCH_CHUNK_SIZE = 500 # Operations per write transaction in --batch mode
+BATCH_OPERATIONS = ("add", "edit", "delete")
+EDITABLE_FIELDS = ("name", "price", "category", "image_urls", "tags")
+
+UPSERT_SQL = f'''
+    INSERT INTO products ({", ".join(PRODUCT_COLUMNS)}, content_hash)
+    VALUES ({", ".join("?" * (len(PRODUCT_COLUMNS) + 1))})
+    ON CONFLICT(id) DO UPDATE SET
+        {", ".join(f"{column} = excluded.{column}" for column in PRODUCT_COLUMNS[1:])},
+        content_hash = excluded.content_hash
+'''
+
+
+def connect_db(read_only=False):
+    """
+    Opens the products database for admin writes. WAL mode lets the API keep reading
+    while we write, and busy_timeout waits out short API writes instead of erroring.
+    read_only (e.g. for dry runs) opens it with mode=ro and changes nothing: no journal
+    mode switch and no content_hash migration.
+    """
+    if read_only:
+        uri = f"{pathlib.Path(DATABASE_PATH).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        return conn
+    conn = sqlite3.connect(DATABASE_PATH, timeout=BUSY_TIMEOUT_MS / 1000)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA journal_mode = WAL") # Persistent; a no-op once set
+    ensure_content_hash_column(conn)
+    return conn
 
 def get_product_details(initial_data=None):
     """
@@ -96,27 +135,15 @@ def insert_or_update_product_in_db(product_data):
     """
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = connect_db()
         c = conn.cursor()
 
-        image_urls_json = json.dumps(product_data["image_urls"])
-        tags_json = json.dumps(product_data["tags"])
-
-        # Use INSERT OR REPLACE to handle updates if ID exists
-        c.execute('''
-            INSERT OR REPLACE INTO products (id, name, price, category, image_urls, tags)
-            VALUES (?, ?, ?, ?, ?, ?)
-        ''', (
-            product_data["id"],
-            product_data["name"],
-            product_data["price"],
-            product_data["category"],
-            image_urls_json,
-            tags_json
-        ))
+        row = normalize_product(product_data)
+        # Upsert; content_hash keeps load_products_to_db.py from rewriting this row later
+        c.execute(UPSERT_SQL, row + (product_content_hash(row),))
 
         conn.commit()
-        action = "added/updated" # Since we use INSERT OR REPLACE
+        action = "added/updated" # Since we upsert
         print(f"\nSuccess! Product '{product_data['name']}' (ID: {product_data['id']}) {action} in '{DATABASE_PATH}'.")
 
     except sqlite3.Error as e:
@@ -140,7 +167,7 @@ def find_product_by_id(product_id):
     """
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = connect_db()
         # Enable row factory to access columns by name
         conn.row_factory = sqlite3.Row
         c = conn.cursor()
@@ -222,7 +249,7 @@ def delete_product():
     # 2. Delete from DB
     conn = None
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
+        conn = connect_db()
         c = conn.cursor()
 
         c.execute("DELETE FROM products WHERE id = ?", (product_id,))
@@ -259,6 +286,230 @@ def add_product():
         print(f"\nFailed to add product: {e}")
 
 
+# --- Batch Mode ---
+def _parse_list_field(value):
+    """A JSON list, or a comma-separated string like the interactive tags prompt accepts."""
+    if isinstance(value, list):
+        return value
+    value = str(value).strip()
+    if value.startswith('['):
+        return json.loads(value)
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def read_batch_operations(path):
+    """
+    Yields operation dicts from a CSV file (header: op,id,name,price,category,image_urls,tags)
+    or a JSONL/JSON array file. Empty CSV cells count as "not given", so an edit row can
+    change just the price.
+    """
+    if path.lower().endswith('.csv'):
+        with open(path, newline='', encoding='utf-8') as f:
+            for record in csv.DictReader(f):
+                yield {key.strip(): value for key, value in record.items() if key and value not in (None, '')}
+    else:
+        yield from iter_json_records(path)
+
+
+def _row_to_product(row):
+    product = dict(zip(PRODUCT_COLUMNS, row))
+    product['image_urls'] = json.loads(product['image_urls']) if product['image_urls'] else []
+    product['tags'] = json.loads(product['tags']) if product['tags'] else []
+    return product
+
+
+def _fetch_products(conn, product_ids):
+    """{id: product dict} for the given ids that exist."""
+    products = {}
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), SQLITE_MAX_PARAMS):
+        chunk = product_ids[start:start + SQLITE_MAX_PARAMS]
+        rows = conn.execute(
+            f"SELECT {', '.join(PRODUCT_COLUMNS)} FROM products WHERE id IN ({','.join('?' * len(chunk))})", chunk
+        )
+        for row in rows:
+            products[row[0]] = _row_to_product(row)
+    return products
+
+
+def _operation_fields(operation):
+    fields = {}
+    for field in ('name', 'price', 'category'):
+        if operation.get(field) is not None:
+            fields[field] = operation[field]
+    image_urls = operation.get('image_urls', operation.get('imageUrls'))
+    if image_urls is not None:
+        fields['image_urls'] = _parse_list_field(image_urls)
+    if operation.get('tags') is not None:
+        fields['tags'] = _parse_list_field(operation['tags'])
+    return fields
+
+
+def _touched_ids(operations):
+    return {str(op.get('id')).strip() for op in operations if isinstance(op, dict) and op.get('id')}
+
+
+def plan_batch_chunk(operations, current, first_number=1):
+    """
+    Resolves a chunk of add/edit/delete operations against the current rows
+    (_fetch_products output for the chunk's ids). Operations on the same id apply in
+    order; only each product's net change is written.
+
+    Returns:
+        tuple: (upsert_rows, delete_ids, diff_lines, errors, counts). counts has
+               added, updated, deleted and unchanged.
+    """
+    state = {} # id -> product dict after the chunk's operations, None if deleted
+    errors = []
+    for number, operation in enumerate(operations, start=first_number):
+        try:
+            if not isinstance(operation, dict):
+                raise ProductValidationError(f"Expected an object, got {type(operation).__name__}")
+            op = str(operation.get('op', '')).strip().lower()
+            product_id = str(operation.get('id') or '').strip()
+            if op not in BATCH_OPERATIONS:
+                raise ProductValidationError(f"Unknown op {op!r} (expected one of {', '.join(BATCH_OPERATIONS)})")
+            if not product_id:
+                raise ProductValidationError("Missing product id")
+            existing = state[product_id] if product_id in state else current.get(product_id)
+
+            if op == 'delete':
+                if existing is None:
+                    raise ProductValidationError(f"Product {product_id} not found")
+                state[product_id] = None
+                continue
+            if op == 'edit':
+                if existing is None:
+                    raise ProductValidationError(f"Product {product_id} not found")
+                product = {**existing, **_operation_fields(operation)}
+            else: # add (replaces an existing product, like the interactive menu)
+                product = {'image_urls': [], 'tags': [], **_operation_fields(operation), 'id': product_id}
+            state[product_id] = _row_to_product(normalize_product(product))
+        except (ProductValidationError, ValueError) as e: # ValueError includes bad JSON lists
+            errors.append(f"Operation {number}: {e}")
+
+    upsert_rows, delete_ids, diff_lines = [], [], []
+    counts = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    for product_id, product in state.items():
+        before = current.get(product_id)
+        if product is None:
+            if before is None: # Added and deleted within the chunk
+                continue
+            delete_ids.append(product_id)
+            diff_lines.append(f"- {product_id} ({before['name']})")
+            counts["deleted"] += 1
+            continue
+        row = normalize_product(product)
+        if before is not None and normalize_product(before) == row:
+            counts["unchanged"] += 1
+            continue
+        upsert_rows.append(row + (product_content_hash(row),))
+        if before is None:
+            diff_lines.append(f"+ {product_id} {product['name']!r} price={product['price']}")
+            counts["added"] += 1
+        else:
+            changes = [f"{field}: {before[field]!r} -> {product[field]!r}"
+                       for field in EDITABLE_FIELDS if before[field] != product[field]]
+            diff_lines.append(f"~ {product_id} " + "; ".join(changes))
+            counts["updated"] += 1
+    return upsert_rows, delete_ids, diff_lines, errors, counts
+
+
+def run_batch(path, dry_run=False, chunk_size=DEFAULT_BATCH_CHUNK_SIZE, single_transaction=False):
+    """
+    Applies a file of add/edit/delete operations with executemany.
+
+    By default each chunk is diffed against a snapshot read (WAL: no lock), then written in
+    its own BEGIN IMMEDIATE transaction that only re-checks the chunk's rows and runs the
+    executemany, so the write lock is held for milliseconds and other writers aren't
+    starved. Invalid operations are reported and skipped. With single_transaction, everything is applied
+    atomically and any invalid operation rolls the whole batch back. dry_run prints the
+    diff without writing, over a read-only connection.
+
+    Returns:
+        dict: added, updated, deleted, unchanged and invalid counts, and whether it was applied.
+    """
+    if not os.path.exists(path):
+        print(f"Error: Batch file '{path}' not found.")
+        return None
+
+    totals = {"added": 0, "updated": 0, "deleted": 0, "unchanged": 0, "invalid": 0, "applied": False}
+    try:
+        conn = connect_db(read_only=dry_run)
+    except sqlite3.Error as e: # e.g. a dry run against a database that doesn't exist yet
+        print(f"Error: Could not open {DATABASE_PATH}: {e}")
+        return None
+    conn.isolation_level = None # Transactions are managed explicitly below
+    chunk, number = [], 1
+    planned = {} # dry_run: id -> product as earlier chunks would have left it, None if deleted
+    try:
+        if single_transaction and not dry_run:
+            conn.execute("BEGIN IMMEDIATE")
+
+        def process(operations, first_number):
+            touched_ids = _touched_ids(operations)
+            current = _fetch_products(conn, touched_ids)
+            if dry_run: # Nothing was written, so later chunks see earlier chunks' planned changes here
+                for product_id in touched_ids & planned.keys():
+                    if planned[product_id] is None:
+                        current.pop(product_id, None)
+                    else:
+                        current[product_id] = planned[product_id]
+            plan = plan_batch_chunk(operations, current, first_number)
+            if not dry_run and not single_transaction:
+                conn.execute("BEGIN IMMEDIATE")
+                latest = _fetch_products(conn, touched_ids)
+                if latest != current: # Changed by another writer since the snapshot
+                    plan = plan_batch_chunk(operations, latest, first_number)
+            upsert_rows, delete_ids, diff_lines, errors, counts = plan
+            if not dry_run:
+                conn.executemany(UPSERT_SQL, upsert_rows)
+                conn.executemany("DELETE FROM products WHERE id = ?", [(product_id,) for product_id in delete_ids])
+                if not single_transaction:
+                    conn.execute("COMMIT")
+            else:
+                planned.update((row[0], _row_to_product(row[:-1])) for row in upsert_rows)
+                planned.update((product_id, None) for product_id in delete_ids)
+                for line in diff_lines:
+                    print(line)
+            for error in errors:
+                print(f"Skipping invalid operation: {error}")
+            for key, value in counts.items():
+                totals[key] += value
+            totals["invalid"] += len(errors)
+
+        for operation in read_batch_operations(path):
+            chunk.append(operation)
+            if len(chunk) >= chunk_size:
+                process(chunk, number)
+                number += len(chunk)
+                chunk = []
+        if chunk:
+            process(chunk, number)
+
+        if single_transaction and not dry_run:
+            if totals["invalid"]:
+                conn.execute("ROLLBACK")
+                print(f"\n{totals['invalid']} invalid operations; rolled back, nothing was changed.")
+                return totals
+            conn.execute("COMMIT")
+        totals["applied"] = not dry_run
+    except (sqlite3.Error, json.JSONDecodeError) as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        print(f"\nBatch failed: {e}")
+        if not single_transaction and not dry_run:
+            print("Chunks before the failure were committed.")
+        return totals
+    finally:
+        conn.close()
+
+    verb = "Would apply" if dry_run else "Applied"
+    print(f"\n{verb}: {totals['added']} added, {totals['updated']} updated, {totals['deleted']} deleted; "
+          f"{totals['unchanged']} unchanged, {totals['invalid']} invalid.")
+    return totals
+
+
 def main_menu():
     """
     Displays the main menu and handles user choice.
@@ -289,11 +540,26 @@ def main():
     """
     Main function to run the product administration script.
     """
+    parser = argparse.ArgumentParser(description="Add, edit or delete products interactively or from a batch file.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="CSV or JSONL of operations (op=add|edit|delete, id, name, price, category, image_urls, tags)")
+    parser.add_argument("--dry-run", action="store_true", help="Print the diff without writing (with --batch)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_BATCH_CHUNK_SIZE,
+                        help="Operations per transaction (with --batch)")
+    parser.add_argument("--single-transaction", action="store_true",
+                        help="Apply the whole batch atomically; any invalid operation aborts it")
+    args = parser.parse_args()
+
     if not os.path.exists(DATABASE_PATH):
         print(f"Error: Database file '{DATABASE_PATH}' not found in the current directory.")
         print("Please ensure you are running this script from the correct directory.")
         return
 
+    if args.batch:
+        run_batch(args.batch, dry_run=args.dry_run, chunk_size=args.chunk_size,
+                  single_transaction=args.single_transaction)
+        return
+
     # Run the main menu loop
     main_menu()
 
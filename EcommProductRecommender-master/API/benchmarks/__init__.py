@@ -0,0 +1,9 @@
+# Performance benchmarks for the recommender API.
+# Run from the API directory, e.g.:
+#   python -m benchmarks.bench_pipeline --scales small medium --output bench.json
+#   python -m benchmarks.bench_sampler
+#   python -m benchmarks.load_test --concurrency 16 --requests 2000 [--transport uvicorn]
+#   SERVING_BACKEND=numpy python -m benchmarks.load_test
+#   python -m benchmarks.bench_startup --backends keras numpy
+#   python -m benchmarks.bench_bundle --scales small medium
+# Reports are JSON on stdout so runs can be diffed between commits.
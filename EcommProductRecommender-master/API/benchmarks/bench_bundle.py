@@ -0,0 +1,99 @@
+# bench_bundle.py
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.bench_pipeline import timed, git_revision
+
+# --- Configuration ---
+SCALES = {
+    # name: (num_users, num_items)
+    "small": (1_000, 500),
+    "medium": (50_000, 20_000),
+    "large": (500_000, 100_000),
+}
+REPEATS = 3
+
+
+def bench_scale(name, num_users, num_items, work_dir):
+    from tensorflow.keras.models import load_model
+    from model import create_ncf_model
+    from mappings import save_mappings, load_mappings
+    from inference import NCFScorer, export_ncf_weights
+    from serving_bundle import write_bundle, load_bundle
+
+    print(f"--- Scale '{name}': {num_users} users, {num_items} items ---", file=sys.stderr)
+    timings = {}
+    model_path = os.path.join(work_dir, f"{name}_model.h5")
+    mappings_path = os.path.join(work_dir, f"{name}_mappings.json")
+    bundle_root = os.path.join(work_dir, f"{name}_bundle")
+
+    model = create_ncf_model(num_users, num_items)
+    model.save(model_path)
+    user_map = {f"user{i}": i for i in range(num_users)}
+    item_map = {f"item{j}": j for j in range(num_items)}
+    save_mappings(user_map, item_map, mappings_path)
+    weights = export_ncf_weights(model)
+    _, timings["write_bundle"] = timed(write_bundle, bundle_root, weights, user_map, item_map)
+
+    _, timings["h5_load_model"] = timed(load_model, model_path, repeats=REPEATS)
+    _, timings["json_load_mappings"] = timed(load_mappings, mappings_path, repeats=REPEATS)
+    timings["h5_total"] = timings["h5_load_model"] + timings["json_load_mappings"]
+
+    bundle, timings["bundle_load_mmap"] = timed(load_bundle, bundle_root, verify=False, repeats=REPEATS)
+    _, timings["bundle_load_mmap_verified"] = timed(load_bundle, bundle_root, verify=True, repeats=REPEATS)
+    _, timings["bundle_load_in_memory"] = timed(load_bundle, bundle_root, mmap=False, verify=False, repeats=REPEATS)
+    _, timings["bundle_mappings"] = timed(bundle.mappings, repeats=REPEATS)
+    _, timings["bundle_scorer"] = timed(NCFScorer, bundle.weights, repeats=REPEATS)
+    timings["bundle_total"] = timings["bundle_load_mmap"] + timings["bundle_mappings"] + timings["bundle_scorer"]
+
+    # Same scores either way: one user against the whole catalog
+    all_items = np.arange(num_items)
+    users = np.zeros(num_items, dtype=np.int64)
+    keras_scores = model.predict([users, all_items], batch_size=8192, verbose=0).reshape(-1)
+    bundle_scores = NCFScorer(bundle.weights).score(users, all_items)
+
+    return {
+        "scale": name,
+        "num_users": num_users,
+        "num_items": num_items,
+        "h5_bytes": os.path.getsize(model_path),
+        "bundle_bytes": sum(info["bytes"] for info in bundle.manifest["arrays"].values()),
+        "max_abs_score_delta": float(np.abs(keras_scores - bundle_scores).max()),
+        "seconds": timings,
+    }
+
+
+def run(scale_names, output_path=None):
+    with tempfile.TemporaryDirectory(prefix="recsys_bundle_") as work_dir:
+        with contextlib.redirect_stdout(sys.stderr):
+            results = [bench_scale(name, *SCALES[name], work_dir) for name in scale_names]
+
+    report = {
+        "benchmark": "serving_bundle",
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output)
+    print(output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare serving-bundle load time against load_model on .h5.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    run(args.scales, args.output)
@@ -0,0 +1,150 @@
+# bench_pipeline.py
+import argparse
+import contextlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+from benchmarks.synthetic import generate_interactions, generate_catalog, write_catalog_db
+
+# --- Configuration ---
+SCALES = {
+    # name: (num_users, num_items, num_events)
+    "small": (500, 200, 5_000),
+    "medium": (5_000, 2_000, 50_000),
+    "large": (50_000, 20_000, 500_000),
+}
+LEGACY_NEGATIVE_SAMPLING_LIMIT = 10_000 # The row-by-row sampler in load_and_preprocess_data is quadratic
+TRAIN_EPOCHS = 1
+BATCHED_SCORING_USERS = 64
+SEARCH_QUERIES = ["electronics", "product 1", "wireless", "no-such-product"]
+REPEATS = 3
+
+
+def timed(func, *args, repeats=1, **kwargs):
+    """Runs func repeats times; returns (last result, best wall time in seconds)."""
+    best = float("inf")
+    result = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_scale(name, num_users, num_items, num_events, work_dir):
+    # Imported after chdir so main's relative database and model paths resolve inside work_dir.
+    import main
+    from train import load_and_preprocess_data, train_model, save_mappings, load_mappings, make_negative_sampler
+    from inference import NCFScorer
+    from evaluation import leave_last_out_split, evaluate_ranking
+
+    print(f"--- Scale '{name}': {num_users} users, {num_items} items, {num_events} events ---", file=sys.stderr)
+    timings = {}
+
+    csv_path = os.path.join(work_dir, f"{name}_interactions.csv")
+    generate_interactions(num_users, num_items, num_events).to_csv(csv_path, index=False)
+
+    (df_processed, user_map, item_map, n_users, n_items), timings["load_and_preprocess_positives"] = timed(
+        load_and_preprocess_data, csv_path, negative_samples=0
+    )
+    if len(df_processed) <= LEGACY_NEGATIVE_SAMPLING_LIMIT:
+        _, timings["load_and_preprocess_fixed_negatives"] = timed(load_and_preprocess_data, csv_path)
+
+    model_path = os.path.join(work_dir, f"{name}_model.h5")
+    (model, _), timings["train_model_per_epoch"] = timed(
+        train_model, df_processed, n_users, n_items, model_save_path=model_path,
+        epochs=TRAIN_EPOCHS, negative_sampler=make_negative_sampler(df_processed, n_items)
+    )
+    timings["train_model_per_epoch"] /= TRAIN_EPOCHS
+
+    mappings_path = os.path.join(work_dir, f"{name}_mappings.json")
+    _, timings["save_mappings"] = timed(save_mappings, user_map, item_map, mappings_path, repeats=REPEATS)
+    _, timings["load_mappings"] = timed(load_mappings, mappings_path, repeats=REPEATS)
+
+    main.PRODUCTS_DB_PATH = os.path.join(work_dir, f"{name}_ecommerce.db")
+    write_catalog_db(generate_catalog(num_items), main.PRODUCTS_DB_PATH)
+    for query in SEARCH_QUERIES + [""]:
+        _, timings[f"search_products_in_db[{query or '<all>'}]"] = timed(main.search_products_in_db, query, repeats=REPEATS)
+
+    # Scoring: one user against the whole catalog (the request path), then many users in one pass.
+    all_items = np.arange(n_items)
+    single_user = np.zeros(n_items, dtype=np.int64)
+    batch_users = np.repeat(np.arange(min(BATCHED_SCORING_USERS, n_users)), n_items)
+    batch_items = np.tile(all_items, min(BATCHED_SCORING_USERS, n_users))
+    scorer = NCFScorer.from_keras_model(model)
+
+    _, timings["score_single_user_keras"] = timed(model.predict, [single_user, all_items], batch_size=512, verbose=0, repeats=REPEATS)
+    _, timings["score_batched_users_keras"] = timed(model.predict, [batch_users, batch_items], batch_size=8192, verbose=0, repeats=REPEATS)
+    _, timings["score_single_user_numpy"] = timed(scorer.predict, [single_user, all_items], repeats=REPEATS)
+    _, timings["score_batched_users_numpy"] = timed(scorer.predict, [batch_users, batch_items], batch_size=65536, repeats=REPEATS)
+    timings["batched_users"] = min(BATCHED_SCORING_USERS, n_users)
+
+    # Leave-last-out ranking evaluation, as run by the retrain gate (timing only: the model saw the held-out rows)
+    train_mask, test_users, test_items = leave_last_out_split(
+        df_processed['user_idx'].values, df_processed['item_idx'].values, df_processed['timestamp'].values
+    )
+    train_users, train_items = df_processed['user_idx'].values[train_mask], df_processed['item_idx'].values[train_mask]
+    _, timings["evaluate_ranking_sampled"] = timed(evaluate_ranking, scorer, test_users, test_items, n_items,
+                                                   train_user_idx=train_users, train_item_idx=train_items)
+    _, timings["evaluate_ranking_full_catalog"] = timed(evaluate_ranking, scorer, test_users, test_items, n_items,
+                                                        train_user_idx=train_users, train_item_idx=train_items,
+                                                        num_candidates=None)
+    timings["evaluated_users"] = len(test_users)
+
+    return {
+        "scale": name,
+        "num_users": n_users,
+        "num_items": n_items,
+        "num_events": num_events,
+        "num_training_rows": len(df_processed),
+        "seconds": timings,
+    }
+
+
+def run(scale_names, output_path=None):
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="recsys_bench_") as work_dir:
+        os.chdir(work_dir)
+        try:
+            # The pipeline prints progress; keep stdout for the JSON report only.
+            with contextlib.redirect_stdout(sys.stderr):
+                results = [bench_scale(name, *SCALES[name], work_dir) for name in scale_names]
+        finally:
+            os.chdir(original_dir)
+
+    report = {
+        "benchmark": "pipeline",
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.time(),
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output)
+    print(output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the training and serving pipeline on synthetic data.")
+    parser.add_argument("--scales", nargs="+", choices=list(SCALES), default=["small", "medium"])
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+    run(args.scales, args.output)
@@ -0,0 +1,59 @@
+# bench_sampler.py
+import json
+import time
+import numpy as np
+
+from sampling import NegativeSampler, NegativeSamplingSequence
+
+# --- Configuration ---
+SCALES = [
+    # (num_users, num_items, num_positives)
+    (1_000, 500, 20_000),
+    (10_000, 5_000, 200_000),
+    (100_000, 50_000, 2_000_000),
+]
+NEGATIVE_SAMPLES = 4
+BATCH_SIZE = 2048
+ZIPF_EXPONENT = 1.1
+
+
+def make_positives(num_users, num_items, num_positives, seed=0):
+    """Random positives with Zipf-distributed item popularity."""
+    rng = np.random.default_rng(seed)
+    users = rng.integers(0, num_users, size=num_positives)
+    items = (rng.zipf(ZIPF_EXPONENT, size=num_positives) - 1) % num_items
+    return users, items
+
+
+def bench_scale(num_users, num_items, num_positives):
+    users, items = make_positives(num_users, num_items, num_positives)
+    results = {"num_users": num_users, "num_items": num_items, "num_positives": num_positives}
+
+    for strategy in ("uniform", "popularity"):
+        start = time.perf_counter()
+        sampler = NegativeSampler(users, items, num_items, strategy=strategy, seed=0)
+        build_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        neg_users, _ = sampler.sample(users, NEGATIVE_SAMPLES)
+        sample_seconds = time.perf_counter() - start
+
+        sequence = NegativeSamplingSequence(users, items, sampler, NEGATIVE_SAMPLES, BATCH_SIZE, seed=0)
+        start = time.perf_counter()
+        rows = 0
+        for i in range(len(sequence)):
+            _, labels = sequence[i]
+            rows += len(labels)
+        epoch_seconds = time.perf_counter() - start
+
+        results[strategy] = {
+            "build_seconds": build_seconds,
+            "negatives_per_second": len(neg_users) / sample_seconds,
+            "epoch_rows_per_second": rows / epoch_seconds,
+        }
+    return results
+
+
+if __name__ == "__main__":
+    report = {"benchmark": "negative_sampler", "results": [bench_scale(*scale) for scale in SCALES]}
+    print(json.dumps(report, indent=2))
@@ -0,0 +1,120 @@
+# bench_startup.py
+import argparse
+import contextlib
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+# --- Configuration ---
+BACKENDS = ("keras", "numpy")
+BENCH_API_KEY = "startupbenchkey"
+NUM_USERS = 5_000
+NUM_ITEMS = 2_000
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def max_rss_mb():
+    # Linux keeps ru_maxrss across exec (it would report the parent's peak), so prefer VmHWM
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024.0
+    except OSError:
+        pass
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024.0 * 1024.0) if sys.platform == "darwin" else rss / 1024.0
+
+
+def prepare_model(work_dir):
+    """Writes an untrained model, its NumPy weights and mappings; returns their paths."""
+    from model import create_ncf_model
+    from mappings import save_mappings
+    from inference import export_ncf_weights, save_ncf_weights, weights_path_for_model
+
+    model_path = os.path.join(work_dir, "ncf_model.h5")
+    mappings_path = os.path.join(work_dir, "ncf_mappings.json")
+    model = create_ncf_model(NUM_USERS, NUM_ITEMS)
+    model.save(model_path)
+    save_ncf_weights(export_ncf_weights(model), weights_path_for_model(model_path))
+    save_mappings({f"user{i}": i for i in range(NUM_USERS)}, {f"item{j}": j for j in range(NUM_ITEMS)}, mappings_path)
+    return model_path, mappings_path
+
+
+def measure_child(work_dir, model_path, mappings_path):
+    """Runs inside a fresh interpreter: times 'import main', then the first model load."""
+    os.chdir(work_dir)
+    start = time.perf_counter()
+    import main
+    import_seconds = time.perf_counter() - start
+    result = {
+        "import_main_seconds": import_seconds,
+        "max_rss_mb_after_import": max_rss_mb(),
+        "tensorflow_imported_after_import": "tensorflow" in sys.modules,
+        "pandas_imported_after_import": "pandas" in sys.modules,
+    }
+
+    main.API_KEYS_DB[BENCH_API_KEY] = {"model_path": model_path, "mappings_path": mappings_path,
+                                       "num_users": NUM_USERS, "num_items": NUM_ITEMS}
+    start = time.perf_counter()
+    main.get_model_and_mappings_for_key(BENCH_API_KEY)
+    result["first_model_load_seconds"] = time.perf_counter() - start
+    result["max_rss_mb_after_model_load"] = max_rss_mb()
+    result["tensorflow_imported_after_model_load"] = "tensorflow" in sys.modules
+    return result
+
+
+def run_backend(backend, work_dir, model_path, mappings_path):
+    env = dict(os.environ, SERVING_BACKEND=backend)
+    output = subprocess.check_output(
+        [sys.executable, "-m", "benchmarks.bench_startup", "--child", work_dir, model_path, mappings_path],
+        cwd=API_DIR, env=env,
+    )
+    # The report is the last stdout line; anything before it is app output.
+    return {"serving_backend": backend, **json.loads(output.decode().strip().splitlines()[-1])}
+
+
+def run(backends, output_path=None):
+    # Imported here, not at module level: the child must not pull pandas/TensorFlow in before measuring.
+    from benchmarks.bench_pipeline import git_revision
+
+    with tempfile.TemporaryDirectory(prefix="recsys_startup_") as work_dir:
+        print("Preparing model artifacts...", file=sys.stderr)
+        with contextlib.redirect_stdout(sys.stderr):
+            model_path, mappings_path = prepare_model(work_dir)
+        results = [run_backend(backend, work_dir, model_path, mappings_path) for backend in backends]
+
+    report = {
+        "benchmark": "startup",
+        "git_revision": git_revision(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "timestamp": time.time(),
+        "num_users": NUM_USERS,
+        "num_items": NUM_ITEMS,
+        "results": results,
+    }
+    output = json.dumps(report, indent=2)
+    if output_path:
+        with open(output_path, "w") as f:
+            f.write(output)
+    print(output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure API import time, RSS and first model load per serving backend.")
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    parser.add_argument("--child", nargs=3, metavar=("WORK_DIR", "MODEL_PATH", "MAPPINGS_PATH"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        print(json.dumps(measure_child(*args.child)))
+    else:
+        run(args.backends, args.output)
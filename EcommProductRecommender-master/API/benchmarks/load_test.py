@@ -0,0 +1,218 @@
+# load_test.py
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import socket
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+import httpx
+
+from benchmarks.synthetic import generate_catalog, generate_interactions, write_catalog_db
+
+# --- Configuration ---
+LOAD_TEST_API_KEY = "loadtestkey"
+DEFAULT_NUM_USERS = 2_000
+DEFAULT_NUM_ITEMS = 1_000
+DEFAULT_CONCURRENCY = 16
+DEFAULT_REQUESTS = 2_000
+DEFAULT_MIX = "recommendations=0.6,search=0.2,interactions=0.2"
+SEARCH_TERMS = ["electronics", "wireless", "home", "premium", "product 12", "sports"]
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(mix):
+    """'recommendations=0.6,search=0.2' -> {'recommendations': 0.6, 'search': 0.2}"""
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition("=")
+        weights[name.strip()] = float(weight)
+    unknown = set(weights) - {"recommendations", "search", "interactions"}
+    if unknown:
+        raise ValueError(f"Unknown endpoints in request mix: {sorted(unknown)}")
+    return weights
+
+
+def prepare_environment(work_dir, num_users, num_items):
+    """
+    Points the app at temp-dir databases and registers an untrained synthetic
+    model under models_store/ for LOAD_TEST_API_KEY. Returns (app, user_ids, item_ids).
+    """
+    os.chdir(work_dir)
+    # Imported after chdir so main's relative database and model paths resolve inside work_dir.
+    import main
+    from model import create_ncf_model
+    from mappings import save_mappings
+    from inference import export_ncf_weights, save_ncf_weights, weights_path_for_model
+
+    # httpx.ASGITransport doesn't send lifespan events, so run the startup work here.
+    main.init_databases()
+
+    products = generate_catalog(num_items)
+    write_catalog_db(products, main.PRODUCTS_DB_PATH)
+
+    interactions = generate_interactions(num_users, num_items, num_users * 5)
+    user_ids = sorted(interactions["user_id"].unique())
+    item_ids = [p["id"] for p in products]
+
+    model_dir = os.path.join(main.MODELS_BASE_DIR, LOAD_TEST_API_KEY)
+    os.makedirs(model_dir, exist_ok=True)
+    model_path = os.path.join(model_dir, "ncf_model.h5")
+    mappings_path = os.path.join(model_dir, "ncf_mappings.json")
+    model = create_ncf_model(len(user_ids), len(item_ids))
+    model.save(model_path)
+    save_ncf_weights(export_ncf_weights(model), weights_path_for_model(model_path))
+    save_mappings({u: i for i, u in enumerate(user_ids)}, {it: i for i, it in enumerate(item_ids)}, mappings_path)
+
+    main.API_KEYS_DB[LOAD_TEST_API_KEY] = {
+        "model_path": model_path,
+        "mappings_path": mappings_path,
+        "num_users": len(user_ids),
+        "num_items": len(item_ids),
+    }
+    return main.app, user_ids, item_ids
+
+
+def make_request(endpoint, rng, user_ids, item_ids):
+    """Returns (method, path, json body) for one request of the given endpoint type."""
+    if endpoint == "recommendations":
+        body = {"user_id": rng.choice(user_ids), "count": 10}
+        if rng.random() < 0.3:
+            body["search_query"] = rng.choice(SEARCH_TERMS)
+        return "POST", "/v1/recommendations", body
+    if endpoint == "search":
+        return "POST", "/search", {"query": rng.choice(SEARCH_TERMS)}
+    return "POST", "/interactions", {
+        "user_id": rng.choice(user_ids),
+        "item_id": rng.choice(item_ids),
+        "type": "cart" if rng.random() < 0.2 else "tap",
+    }
+
+
+async def run_load(client, mix, total_requests, concurrency, user_ids, item_ids, seed=0):
+    endpoints = list(mix)
+    weights = [mix[e] for e in endpoints]
+    latencies = {e: [] for e in endpoints}
+    errors = {e: 0 for e in endpoints}
+    remaining = [total_requests]
+    headers = {"X-API-Key": LOAD_TEST_API_KEY}
+
+    async def worker(worker_id):
+        rng = random.Random(seed + worker_id)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            endpoint = rng.choices(endpoints, weights)[0]
+            method, path, body = make_request(endpoint, rng, user_ids, item_ids)
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, path, json=body, headers=headers)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            latencies[endpoint].append(time.perf_counter() - start)
+            if not ok:
+                errors[endpoint] += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    per_endpoint = {}
+    for endpoint, values in latencies.items():
+        if not values:
+            continue
+        values_ms = np.array(values) * 1000.0
+        stats = {"requests": len(values), "errors": errors[endpoint], "throughput_rps": len(values) / elapsed}
+        for p in PERCENTILES:
+            stats[f"p{p}_ms"] = float(np.percentile(values_ms, p))
+        stats["max_ms"] = float(values_ms.max())
+        per_endpoint[endpoint] = stats
+
+    return {
+        "total_requests": sum(len(v) for v in latencies.values()),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": sum(len(v) for v in latencies.values()) / elapsed,
+        "endpoints": per_endpoint,
+    }
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_uvicorn(app):
+    """Serves app with uvicorn on a background thread; yields its base URL."""
+    import uvicorn
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join()
+
+
+async def run_in_process(app, **kwargs):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://loadtest") as client:
+        return await run_load(client, **kwargs)
+
+
+async def run_against_url(base_url, **kwargs):
+    limits = httpx.Limits(max_connections=kwargs["concurrency"])
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60.0) as client:
+        return await run_load(client, **kwargs)
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Load-test the recommendation API against temp-dir data.")
+    parser.add_argument("--transport", choices=["asgi", "uvicorn"], default="asgi")
+    parser.add_argument("--requests", type=int, default=DEFAULT_REQUESTS)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="e.g. 'recommendations=0.6,search=0.2,interactions=0.2'")
+    parser.add_argument("--users", type=int, default=DEFAULT_NUM_USERS)
+    parser.add_argument("--items", type=int, default=DEFAULT_NUM_ITEMS)
+    parser.add_argument("--output", help="Also write the JSON report to this file")
+    args = parser.parse_args()
+
+    original_dir = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="recsys_load_") as work_dir:
+        try:
+            # The app prints on every request; keep stdout for the JSON report only.
+            with contextlib.redirect_stdout(sys.stderr):
+                app, user_ids, item_ids = prepare_environment(work_dir, args.users, args.items)
+                load_kwargs = dict(mix=parse_mix(args.mix), total_requests=args.requests,
+                                   concurrency=args.concurrency, user_ids=user_ids, item_ids=item_ids)
+                if args.transport == "uvicorn":
+                    with local_uvicorn(app) as base_url:
+                        results = asyncio.run(run_against_url(base_url, **load_kwargs))
+                else:
+                    results = asyncio.run(run_in_process(app, **load_kwargs))
+        finally:
+            os.chdir(original_dir)
+
+    report = {"benchmark": "load_test", "transport": args.transport, "concurrency": args.concurrency,
+              "serving_backend": os.environ.get("SERVING_BACKEND", "keras"),
+              "mix": parse_mix(args.mix), **results}
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,124 @@
+# synthetic.py
+import json
+import sqlite3
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+DEFAULT_ZIPF_EXPONENT = 1.1
+DEFAULT_EVENT_TYPES = {"tap": 0.8, "cart": 0.2} # Event type -> share of events
+DEFAULT_CATEGORIES = ["Electronics", "Wearables", "Home", "Fashion", "Sports", "Books", "Toys", "Beauty"]
+DEFAULT_TAGS = ["sale", "new", "popular", "wireless", "eco", "premium", "budget", "gift", "bundle", "limited"]
+DEFAULT_START_TIMESTAMP = 1_700_000_000.0
+DEFAULT_TIME_SPAN_SECONDS = 90 * 24 * 3600
+
+
+def zipf_indices(rng, size, num_values, exponent=DEFAULT_ZIPF_EXPONENT):
+    """Indices in range(num_values) whose frequency follows a Zipf law (index 0 most popular)."""
+    ranks = np.arange(1, num_values + 1, dtype=np.float64)
+    probabilities = ranks ** -exponent
+    probabilities /= probabilities.sum()
+    return rng.choice(num_values, size=size, p=probabilities)
+
+
+def generate_interactions(num_users, num_items, num_events, zipf_exponent=DEFAULT_ZIPF_EXPONENT,
+                          event_types=None, seed=0):
+    """
+    Generates a synthetic interaction log with Zipf-distributed item (and user) activity.
+
+    Returns:
+        pd.DataFrame: Columns user_id, item_id, type, interaction_score, timestamp, i.e. the
+                      union of the training CSV format and the user_interactions table.
+    """
+    event_types = event_types or DEFAULT_EVENT_TYPES
+    rng = np.random.default_rng(seed)
+
+    # Shuffle the popularity ranks so popular items aren't just the lowest IDs
+    item_ids = np.array([f"item{i}" for i in rng.permutation(num_items)])
+    user_ids = np.array([f"user{u}" for u in range(num_users)])
+    type_names = np.array(list(event_types.keys()))
+    type_shares = np.array(list(event_types.values()), dtype=np.float64)
+
+    users = zipf_indices(rng, num_events, num_users, exponent=0.8)
+    items = zipf_indices(rng, num_events, num_items, exponent=zipf_exponent)
+    types = rng.choice(len(type_names), size=num_events, p=type_shares / type_shares.sum())
+    timestamps = np.sort(DEFAULT_START_TIMESTAMP + rng.random(num_events) * DEFAULT_TIME_SPAN_SECONDS)
+
+    return pd.DataFrame({
+        "user_id": user_ids[users],
+        "item_id": item_ids[items],
+        "type": type_names[types],
+        "interaction_score": 1,
+        "timestamp": timestamps,
+    })
+
+
+def generate_catalog(num_items, categories=None, tags=None, seed=0):
+    """
+    Generates product dicts in the products.json format for item0..item{num_items-1}.
+    """
+    categories = categories or DEFAULT_CATEGORIES
+    tags = tags or DEFAULT_TAGS
+    rng = np.random.default_rng(seed)
+    prices = np.round(rng.lognormal(mean=3.5, sigma=1.0, size=num_items), 2)
+    category_choice = rng.integers(0, len(categories), size=num_items)
+
+    products = []
+    for i in range(num_items):
+        category = categories[category_choice[i]]
+        product_tags = [str(t) for t in rng.choice(tags, size=3, replace=False)]
+        products.append({
+            "id": f"item{i}",
+            "name": f"{category} Product {i}",
+            "price": float(prices[i]),
+            "imageUrls": [f"https://via.placeholder.com/300x300?Text=item{i}"],
+            "category": category,
+            "tags": product_tags,
+        })
+    return products
+
+
+def write_catalog_db(products, db_path):
+    """Creates the products table at db_path and bulk-inserts the catalog."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS products (
+                id TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                price REAL NOT NULL,
+                category TEXT,
+                image_urls TEXT,
+                tags TEXT
+            )
+        ''')
+        conn.executemany(
+            "INSERT OR REPLACE INTO products (id, name, price, category, image_urls, tags) VALUES (?, ?, ?, ?, ?, ?)",
+            [(p["id"], p["name"], p["price"], p["category"], json.dumps(p["imageUrls"]), json.dumps(p["tags"]))
+             for p in products]
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_interactions_db(interactions_df, db_path):
+    """Creates the user_interactions table at db_path and bulk-inserts the events."""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS user_interactions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id TEXT NOT NULL,
+                item_id TEXT NOT NULL,
+                type TEXT NOT NULL,
+                timestamp REAL NOT NULL
+            )
+        ''')
+        conn.executemany(
+            "INSERT INTO user_interactions (user_id, item_id, type, timestamp) VALUES (?, ?, ?, ?)",
+            interactions_df[["user_id", "item_id", "type", "timestamp"]].itertuples(index=False, name=None)
+        )
+        conn.commit()
+    finally:
+        conn.close()
@@ -0,0 +1,7 @@
+# conftest.py
+import os
+import sys
+
+# The API modules import each other by bare name ("from train import ..."), as when run from
+# this directory; make that work for the tests next to them too.
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
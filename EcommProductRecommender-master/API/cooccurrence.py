@@ -0,0 +1,358 @@
+# cooccurrence.py
+import logging
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from logging_setup import get_logger, log_event
+from mappings import save_mappings
+from model_registry import artifact_checksums
+from popularity import compute_popularity, load_item_categories, save_popularity, popularity_path_for_model
+from session_scoring import INTERACTION_WEIGHTS
+
+# An item-item engine for tenants with little or very sparse data: no TensorFlow, built in
+# seconds, and updated in place as interactions arrive. Selected per key by the registry's
+# 'engine' column (ENGINE_NAME).
+
+# --- Configuration ---
+ENGINE_NAME = "cooccurrence"
+COOCCURRENCE_FILENAME = "cooccurrence.npz" # Stored in the key's model directory
+DEFAULT_TOP_K = 50 # Neighbors kept per item
+INTERACTIONS_DB_PATH = "user_interactions.db"
+CATCH_UP_BATCH_SIZE = 10000 # Logged interactions applied per update
+CAUGHT_UP_SUFFIX = ".caughtup.npz" # Model file + this: the API's caught-up copy, see save_caught_up_state
+
+logger = get_logger("cooccurrence")
+
+
+def interaction_weights(df):
+    """
+    Weight per interaction row: 'interaction_score' if present, else the INTERACTION_WEIGHTS
+    value of 'type', else 1.
+    """
+    if 'interaction_score' in df.columns:
+        return pd.to_numeric(df['interaction_score'], errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+    if 'type' in df.columns:
+        return df['type'].map(lambda t: INTERACTION_WEIGHTS.get(t, 1.0)).to_numpy(dtype=np.float64)
+    return np.ones(len(df), dtype=np.float64)
+
+
+class CooccurrenceModel:
+    """
+    Item-item recommender over a sparse user x item matrix X of summed interaction weights.
+
+    The co-occurrence matrix C = X^T X gives cosine similarities C_ij / sqrt(C_ii C_jj);
+    each item keeps its top_k neighbors in dense (num_items, top_k) arrays. A user's score
+    for an item is the weight-averaged similarity of their items to it.
+
+    predict() matches the Keras/NCFScorer interface, so the API serves it like any other
+    model. With a watermark (the last user_interactions id included), catch_up() folds
+    newer logged interactions in: X and C are patched for the affected users only, and
+    only neighbor lists those changes touch are recomputed.
+    """
+
+    def __init__(self, user_ids, item_ids, user_items, cooccurrence, top_k=DEFAULT_TOP_K,
+                 watermark=None, neighbors=None, scores=None):
+        self.user_ids = [str(user_id) for user_id in user_ids]
+        self.item_ids = [str(item_id) for item_id in item_ids]
+        self.user_map = {user_id: idx for idx, user_id in enumerate(self.user_ids)}
+        self.item_map = {item_id: idx for idx, item_id in enumerate(self.item_ids)}
+        self.idx_to_item_map = dict(enumerate(self.item_ids))
+        self.user_items = sparse.csr_matrix(user_items, dtype=np.float64)
+        self.cooccurrence = sparse.csr_matrix(cooccurrence, dtype=np.float64)
+        self.top_k = top_k
+        self.watermark = watermark
+        self._lock = threading.RLock()
+        if neighbors is None:
+            self.neighbors = np.full((len(self.item_ids), top_k), -1, dtype=np.int32)
+            self.scores = np.zeros((len(self.item_ids), top_k), dtype=np.float32)
+            self._update_neighbors(np.arange(len(self.item_ids)))
+        else:
+            self.neighbors, self.scores = neighbors, scores
+
+    @classmethod
+    def from_interactions(cls, user_ids, item_ids, weights, top_k=DEFAULT_TOP_K, watermark=None):
+        """
+        Builds the model from interaction rows; repeated (user, item) pairs are summed and
+        rows with a non-positive weight are ignored.
+        """
+        weights = np.broadcast_to(np.asarray(weights, dtype=np.float64), (len(user_ids),))
+        positive = weights > 0
+        user_codes, users = pd.factorize(pd.Series(np.asarray(user_ids)[positive]).astype(str))
+        item_codes, items = pd.factorize(pd.Series(np.asarray(item_ids)[positive]).astype(str))
+        user_items = sparse.csr_matrix((weights[positive], (user_codes, item_codes)), shape=(len(users), len(items)))
+        user_items.sum_duplicates()
+        return cls(users, items, user_items, (user_items.T @ user_items).tocsr(), top_k, watermark)
+
+    def copy(self):
+        """An independent copy, so catch-up can run on it while readers keep using this model."""
+        with self._lock:
+            return CooccurrenceModel(self.user_ids, self.item_ids, self.user_items.copy(), self.cooccurrence.copy(),
+                                     self.top_k, self.watermark, self.neighbors.copy(), self.scores.copy())
+
+    @property
+    def num_users(self):
+        return len(self.user_ids)
+
+    @property
+    def num_items(self):
+        return len(self.item_ids)
+
+    def _update_neighbors(self, rows):
+        """Recomputes the top_k cosine neighbors of the given items from C."""
+        norms = np.sqrt(self.cooccurrence.diagonal())
+        indptr, indices, data = self.cooccurrence.indptr, self.cooccurrence.indices, self.cooccurrence.data
+        for row in rows:
+            columns = indices[indptr[row]:indptr[row + 1]]
+            similarities = data[indptr[row]:indptr[row + 1]] / np.maximum(norms[row] * norms[columns], 1e-12)
+            others = columns != row
+            columns, similarities = columns[others], similarities[others]
+            if len(columns) > self.top_k:
+                top = np.argpartition(-similarities, self.top_k - 1)[:self.top_k]
+                columns, similarities = columns[top], similarities[top]
+            order = np.argsort(-similarities, kind="stable")
+            self.neighbors[row] = -1
+            self.scores[row] = 0.0
+            self.neighbors[row, :len(order)] = columns[order]
+            self.scores[row, :len(order)] = similarities[order]
+
+    def _grow(self, user_ids, item_ids):
+        """Adds unseen users/items; matrices and neighbor arrays are padded to the new sizes."""
+        for user_id in user_ids:
+            if user_id not in self.user_map:
+                self.user_map[user_id] = len(self.user_ids)
+                self.user_ids.append(user_id)
+        new_items = 0
+        for item_id in item_ids:
+            if item_id not in self.item_map:
+                self.item_map[item_id] = len(self.item_ids)
+                self.idx_to_item_map[len(self.item_ids)] = item_id
+                self.item_ids.append(item_id)
+                new_items += 1
+        if self.user_items.shape != (self.num_users, self.num_items):
+            self.user_items.resize((self.num_users, self.num_items))
+        if new_items:
+            self.cooccurrence.resize((self.num_items, self.num_items))
+            self.neighbors = np.vstack([self.neighbors, np.full((new_items, self.top_k), -1, dtype=np.int32)])
+            self.scores = np.vstack([self.scores, np.zeros((new_items, self.top_k), dtype=np.float32)])
+
+    def add_interactions(self, user_ids, item_ids, weights):
+        """
+        Folds new interactions into the model in place.
+
+        Returns:
+            int: Number of neighbor lists recomputed.
+        """
+        with self._lock:
+            user_ids = [str(user_id) for user_id in user_ids]
+            item_ids = [str(item_id) for item_id in item_ids]
+            weights = np.asarray(weights, dtype=np.float64)
+            keep = weights > 0
+            if not keep.any():
+                return 0
+            user_ids = [user_id for user_id, k in zip(user_ids, keep) if k]
+            item_ids = [item_id for item_id, k in zip(item_ids, keep) if k]
+            self._grow(user_ids, item_ids)
+
+            user_codes = np.array([self.user_map[user_id] for user_id in user_ids])
+            item_codes = np.array([self.item_map[item_id] for item_id in item_ids])
+            delta = sparse.csr_matrix((weights[keep], (user_codes, item_codes)), shape=self.user_items.shape)
+            affected_users = np.unique(user_codes)
+            before = self.user_items[affected_users]
+            self.user_items = (self.user_items + delta).tocsr()
+            after = self.user_items[affected_users]
+            # C = X^T X changes only in the affected users' contributions
+            self.cooccurrence = (self.cooccurrence - before.T @ before + after.T @ after).tocsr()
+
+            # Changed co-occurrences are among the affected users' items; changed norms (the
+            # items just interacted with) also shift every similarity in their rows of C
+            changed_items = np.unique(item_codes)
+            rows = np.union1d(np.unique(after.indices), np.unique(self.cooccurrence[changed_items].indices))
+            self._update_neighbors(rows)
+            return len(rows)
+
+    def catch_up(self, db_path=INTERACTIONS_DB_PATH, batch_size=CATCH_UP_BATCH_SIZE, max_rows=None):
+        """
+        Applies user_interactions rows logged after the watermark. No-op for models that
+        weren't built from the interaction log (watermark None).
+
+        Args:
+            max_rows (int): Applies at most this many rows and leaves the rest for later
+                            calls, bounding the time one call takes. None applies all of them.
+
+        Returns:
+            int: Number of interactions applied.
+        """
+        if self.watermark is None:
+            return 0
+        with self._lock:
+            applied = 0
+            conn = sqlite3.connect(db_path)
+            try:
+                while max_rows is None or applied < max_rows:
+                    limit = batch_size if max_rows is None else min(batch_size, max_rows - applied)
+                    rows = conn.execute(
+                        "SELECT id, user_id, item_id, type FROM user_interactions WHERE id > ? ORDER BY id LIMIT ?",
+                        (self.watermark, limit)
+                    ).fetchall()
+                    if not rows:
+                        break
+                    self.add_interactions([row[1] for row in rows], [row[2] for row in rows],
+                                          [INTERACTION_WEIGHTS.get(row[3], 1.0) for row in rows])
+                    self.watermark = rows[-1][0]
+                    applied += len(rows)
+            finally:
+                conn.close()
+            return applied
+
+    def has_new_interactions(self, db_path=INTERACTIONS_DB_PATH):
+        """Whether user_interactions has rows after the watermark (False without one)."""
+        if self.watermark is None:
+            return False
+        conn = sqlite3.connect(db_path)
+        try:
+            return conn.execute("SELECT 1 FROM user_interactions WHERE id > ? LIMIT 1", (self.watermark,)).fetchone() is not None
+        finally:
+            conn.close()
+
+    def score_user(self, user_idx):
+        """(num_items,) float32 scores: the user's weight-averaged similarity to each item."""
+        with self._lock:
+            start, end = self.user_items.indptr[user_idx], self.user_items.indptr[user_idx + 1]
+            history, weights = self.user_items.indices[start:end], self.user_items.data[start:end]
+            neighbors = self.neighbors[history]
+            valid = neighbors >= 0
+            contributions = (self.scores[history] * weights[:, None])[valid]
+            totals = np.bincount(neighbors[valid], weights=contributions, minlength=self.num_items)
+            return (totals / max(weights.sum(), 1e-12)).astype(np.float32)
+
+    def predict(self, inputs, batch_size=None, verbose=0):
+        """
+        Keras-compatible predict: inputs is [user_indices, item_indices].
+        Returns an (n, 1) array like model.predict does.
+        """
+        user_indices, item_indices = (np.asarray(x).reshape(-1) for x in inputs)
+        predictions = np.empty(len(user_indices), dtype=np.float32)
+        users, positions = np.unique(user_indices, return_inverse=True)
+        for position, user_idx in enumerate(users):
+            selected = positions == position
+            predictions[selected] = self.score_user(user_idx)[item_indices[selected]]
+        return predictions[:, None]
+
+    def similar(self, item_id, count=DEFAULT_TOP_K):
+        """[(item_id, cosine)] for the item's nearest neighbors, best first; None if the item is unknown."""
+        with self._lock:
+            row = self.item_map.get(item_id)
+            if row is None:
+                return None
+            neighbors = self.neighbors[row, :count]
+            valid = neighbors >= 0
+            return [(self.item_ids[idx], float(score))
+                    for idx, score in zip(neighbors[valid], self.scores[row, :count][valid])]
+
+    def save(self, path, base=None):
+        """
+        Writes the model atomically (X, C and the neighbor arrays in one .npz). base is an
+        optional int sequence stored alongside (see save_caught_up_state).
+        """
+        with self._lock:
+            temp_path = f"{path}.tmp.npz" # np.savez appends .npz to names without it
+            extra = {} if base is None else {"base": np.asarray(base, dtype=np.int64)}
+            np.savez(
+                temp_path, **extra,
+                user_ids=np.array(self.user_ids, dtype=str), item_ids=np.array(self.item_ids, dtype=str),
+                x_data=self.user_items.data, x_indices=self.user_items.indices, x_indptr=self.user_items.indptr,
+                c_data=self.cooccurrence.data, c_indices=self.cooccurrence.indices, c_indptr=self.cooccurrence.indptr,
+                neighbors=self.neighbors, scores=self.scores, top_k=self.top_k,
+                watermark=-1 if self.watermark is None else self.watermark,
+            )
+            os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            num_users, num_items = len(data["user_ids"]), len(data["item_ids"])
+            user_items = sparse.csr_matrix((data["x_data"], data["x_indices"], data["x_indptr"]),
+                                           shape=(num_users, num_items))
+            cooccurrence = sparse.csr_matrix((data["c_data"], data["c_indices"], data["c_indptr"]),
+                                             shape=(num_items, num_items))
+            watermark = int(data["watermark"])
+            return cls(data["user_ids"].tolist(), data["item_ids"].tolist(), user_items, cooccurrence,
+                       top_k=int(data["top_k"]), watermark=None if watermark < 0 else watermark,
+                       neighbors=data["neighbors"], scores=data["scores"])
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def caught_up_path_for_model(model_path):
+    return f"{model_path}{CAUGHT_UP_SUFFIX}"
+
+
+def save_caught_up_state(model, model_path):
+    """
+    Saves a model that catch_up() has advanced past the one at model_path next to it, tagged
+    with that file's mtime and size, so a restart resumes from its watermark instead of
+    replaying every interaction logged since training.
+    """
+    model.save(caught_up_path_for_model(model_path), base=_file_signature(model_path))
+
+
+def load_cooccurrence_model(model_path):
+    """
+    The caught-up state saved for model_path if it was derived from the file as it is now,
+    otherwise the model file itself (e.g. after a retrain replaced it).
+    """
+    state_path = caught_up_path_for_model(model_path)
+    if os.path.exists(state_path):
+        try:
+            with np.load(state_path) as data:
+                current = "base" in data.files and data["base"].tolist() == _file_signature(model_path)
+            if current:
+                return CooccurrenceModel.load(state_path)
+        except (OSError, ValueError, KeyError) as e:
+            log_event(logger, logging.WARNING, "cooccurrence_state_unreadable", "Ignoring unreadable co-occurrence state",
+                      path=state_path, error=str(e))
+    return CooccurrenceModel.load(model_path)
+
+
+def save_cooccurrence_model(model, model_save_path, mappings_save_path):
+    """Saves the model, its ID mappings (for the registry and shared tooling) and popularity lists."""
+    model.save(model_save_path)
+    save_mappings(model.user_map, model.item_map, mappings_save_path)
+    item_totals = np.asarray(model.user_items.sum(axis=0)).ravel()
+    popularity = compute_popularity(model.item_ids, item_totals, item_categories=load_item_categories())
+    save_popularity(popularity, popularity_path_for_model(model_save_path))
+
+
+def run_cooccurrence_job(csv_file_path, model_save_path, mappings_save_path, top_k=DEFAULT_TOP_K):
+    """
+    /v1/train job for engine=cooccurrence: builds the model from an uploaded interactions CSV
+    (user_id, item_id and optionally interaction_score or type). Same result shape as
+    train.run_training_job.
+    """
+    stage_seconds = {}
+    start = time.perf_counter()
+    df = pd.read_csv(csv_file_path)
+    if 'user_id' not in df.columns or 'item_id' not in df.columns:
+        raise ValueError("Training data needs 'user_id' and 'item_id' columns.")
+    model = CooccurrenceModel.from_interactions(df['user_id'], df['item_id'], interaction_weights(df), top_k)
+    if model.num_users == 0 or model.num_items == 0:
+        raise ValueError("Processed data is empty or no users/items found. Check data format and content.")
+    stage_seconds["build_cooccurrence"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    save_cooccurrence_model(model, model_save_path, mappings_save_path)
+    stage_seconds["save_model"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    checksums = artifact_checksums(model_save_path, mappings_save_path)
+    stage_seconds["checksum"] = time.perf_counter() - start
+    return {"num_users": model.num_users, "num_items": model.num_items, "checksums": checksums,
+            "stage_seconds": stage_seconds}
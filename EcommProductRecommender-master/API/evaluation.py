@@ -0,0 +1,144 @@
+# evaluation.py
+import time
+import numpy as np
+
+# --- Configuration ---
+DEFAULT_EVAL_K = 10
+DEFAULT_NUM_CANDIDATES = 100 # Sampled negatives per held-out item; None ranks against the full catalog
+DEFAULT_MAX_SCORES_PER_BATCH = 1 << 14 # (users x candidates) per model call; small chunks stay in cache
+
+
+def leave_last_out_split(user_idx, item_idx, timestamps, min_interactions=2):
+    """
+    Holds out each user's most recent interaction (ties broken by row order).
+    Users with fewer than min_interactions interactions stay entirely in training.
+
+    Returns:
+        tuple: (train_mask, test_users, test_items). train_mask is a boolean mask over
+               the input rows; test_users/test_items hold one row per evaluated user.
+    """
+    user_idx = np.asarray(user_idx, dtype=np.int64)
+    item_idx = np.asarray(item_idx, dtype=np.int64)
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+
+    order = np.lexsort((np.arange(len(user_idx)), timestamps, user_idx))
+    sorted_users = user_idx[order]
+    # Last row of each user's run in the (user, timestamp)-sorted order
+    is_last = np.ones(len(order), dtype=bool)
+    is_last[:-1] = sorted_users[:-1] != sorted_users[1:]
+    counts = np.bincount(user_idx)
+    held_out = order[is_last & (counts[sorted_users] >= min_interactions)]
+
+    train_mask = np.ones(len(user_idx), dtype=bool)
+    train_mask[held_out] = False
+    return train_mask, user_idx[held_out], item_idx[held_out]
+
+
+def _positive_keys(user_idx, item_idx, num_items):
+    return np.unique(np.asarray(user_idx, dtype=np.int64) * num_items + np.asarray(item_idx, dtype=np.int64))
+
+
+def _contains(sorted_keys, keys):
+    if sorted_keys.size == 0:
+        return np.zeros(keys.shape, dtype=bool)
+    positions = np.minimum(np.searchsorted(sorted_keys, keys), sorted_keys.size - 1)
+    return sorted_keys[positions] == keys
+
+
+def _sample_candidates(rng, test_users, test_items, num_items, num_candidates, positive_keys, max_rounds=10):
+    """(n, 1 + num_candidates) item matrix: the held-out item in column 0, then sampled non-positives."""
+    negatives = rng.integers(0, num_items, size=(len(test_users), num_candidates))
+    users = test_users[:, None]
+    for _ in range(max_rounds):
+        clash = _contains(positive_keys, users * num_items + negatives) | (negatives == test_items[:, None])
+        if not clash.any():
+            break
+        negatives[clash] = rng.integers(0, num_items, size=int(clash.sum()))
+    return np.concatenate([test_items[:, None], negatives], axis=1)
+
+
+def _score_matrix(model, users, candidates, max_scores_per_batch):
+    """Scores a (n, c) candidate matrix for n users in chunks of whole users."""
+    num_users, num_cols = candidates.shape
+    scores = np.empty((num_users, num_cols), dtype=np.float32)
+    rows_per_batch = max(1, max_scores_per_batch // max(num_cols, 1))
+    for start in range(0, num_users, rows_per_batch):
+        end = min(start + rows_per_batch, num_users)
+        if hasattr(model, "score_candidates"): # NCFScorer: factorized first layer, no per-pair gathers
+            scores[start:end] = model.score_candidates(users[start:end], candidates[start:end])
+            continue
+        batch_users = np.repeat(users[start:end], num_cols)
+        batch_items = candidates[start:end].reshape(-1)
+        predictions = model.predict([batch_users, batch_items], batch_size=max_scores_per_batch, verbose=0)
+        scores[start:end] = np.asarray(predictions, dtype=np.float32).reshape(end - start, num_cols)
+    return scores
+
+
+def evaluate_ranking(model, test_users, test_items, num_items, train_user_idx=None, train_item_idx=None,
+                     k=DEFAULT_EVAL_K, num_candidates=DEFAULT_NUM_CANDIDATES,
+                     max_scores_per_batch=DEFAULT_MAX_SCORES_PER_BATCH, seed=42):
+    """
+    Ranks each held-out item among candidates and computes HR@K, NDCG@K and catalog coverage.
+
+    Args:
+        model: An NCFScorer (fastest, uses score_candidates) or anything with a Keras-style
+               predict([users, items]).
+        test_users, test_items (np.ndarray): One held-out (user, item) pair per user.
+        num_items (int): Size of the item index space.
+        train_user_idx, train_item_idx (np.ndarray): Training positives; excluded from the candidates.
+        k (int): Cutoff for the metrics.
+        num_candidates (int or None): Sampled negatives per user, or None for the full catalog
+                                      (also used when the catalog is smaller than the sample).
+        max_scores_per_batch (int): Upper bound on scores computed per model call.
+        seed (int): Random seed for candidate sampling.
+
+    Returns:
+        dict: hit_rate, ndcg, coverage (share of items appearing in any top-K list),
+              users_evaluated, k, candidates and seconds.
+    """
+    start = time.perf_counter()
+    test_users = np.asarray(test_users, dtype=np.int64)
+    test_items = np.asarray(test_items, dtype=np.int64)
+    if test_users.size == 0:
+        return {"hit_rate": 0.0, "ndcg": 0.0, "coverage": 0.0, "users_evaluated": 0, "k": k,
+                "candidates": num_candidates or num_items, "seconds": 0.0}
+
+    if num_candidates and num_candidates >= num_items - 1:
+        num_candidates = None # Sampling can't beat ranking the whole (small) catalog
+
+    positive_keys = _positive_keys(train_user_idx if train_user_idx is not None else [],
+                                   train_item_idx if train_item_idx is not None else [], num_items)
+    if num_candidates:
+        candidates = _sample_candidates(np.random.default_rng(seed), test_users, test_items,
+                                        num_items, num_candidates, positive_keys)
+    else:
+        candidates = np.broadcast_to(np.arange(num_items), (len(test_users), num_items))
+
+    scores = _score_matrix(model, test_users, candidates, max_scores_per_batch)
+    if num_candidates:
+        target_scores = scores[:, 0]
+    else:
+        # Full catalog: training positives can't be recommended, so they don't compete
+        seen = _contains(positive_keys, test_users[:, None] * num_items + candidates)
+        seen[np.arange(len(test_users)), test_items] = False
+        scores[seen] = -np.inf
+        target_scores = scores[np.arange(len(test_users)), test_items]
+
+    # 0-based rank of the held-out item; ties count against it
+    ranks = (scores > target_scores[:, None]).sum(axis=1) + (scores == target_scores[:, None]).sum(axis=1) - 1
+    hits = ranks < k
+    ndcg = np.where(hits, 1.0 / np.log2(ranks + 2.0), 0.0)
+
+    top_k = min(k, candidates.shape[1])
+    top_columns = np.argpartition(-scores, top_k - 1, axis=1)[:, :top_k]
+    recommended = np.take_along_axis(candidates, top_columns, axis=1)
+
+    return {
+        "hit_rate": float(hits.mean()),
+        "ndcg": float(ndcg.mean()),
+        "coverage": float(np.unique(recommended).size / num_items),
+        "users_evaluated": int(len(test_users)),
+        "k": int(k),
+        "candidates": int(candidates.shape[1]),
+        "seconds": time.perf_counter() - start,
+    }
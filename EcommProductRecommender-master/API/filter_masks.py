@@ -0,0 +1,122 @@
+# filter_masks.py
+import json
+import os
+import sqlite3
+import numpy as np
+
+# --- Configuration ---
+PRODUCTS_DB_PATH = "ecommerce.db"
+
+
+def _normalize_label(label):
+    return str(label).strip().casefold()
+
+
+def catalog_signature(db_path=PRODUCTS_DB_PATH):
+    """
+    Changes whenever the products database is written, including WAL-mode writes that
+    haven't been checkpointed into the main file yet. None if the database doesn't exist.
+    """
+    signature = []
+    for path in (db_path, f"{db_path}-wal"):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            if path == db_path:
+                return None
+            continue
+        signature.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(signature)
+
+
+class CatalogMasks:
+    """
+    Catalog memberships aligned with a model's item index space: one packed bitset per
+    category and per tag, and a price per item (NaN when unknown). Filters combine with
+    vectorized ANDs, so constraining recommendations costs microseconds per request.
+    Category and tag names match case-insensitively.
+    """
+
+    def __init__(self, num_items, category_bits, tag_bits, prices):
+        self.num_items = num_items
+        self.category_bits = category_bits # casefolded category -> packed uint8 bitset
+        self.tag_bits = tag_bits # casefolded tag -> packed uint8 bitset
+        self.prices = prices # float32 per item index
+
+    @classmethod
+    def from_db(cls, item_map, db_path=PRODUCTS_DB_PATH):
+        """
+        Builds the masks for a model from the products table.
+
+        Args:
+            item_map (dict): The model's original item ID -> index mapping.
+            db_path (str): Products database. Items missing from it match no category or
+                           tag and have no price.
+        """
+        num_items = max(item_map.values()) + 1 if item_map else 0
+        categories, tags = {}, {}
+        prices = np.full(num_items, np.nan, dtype=np.float32)
+
+        rows = []
+        if os.path.exists(db_path):
+            conn = sqlite3.connect(db_path)
+            try:
+                rows = conn.execute("SELECT id, category, tags, price FROM products").fetchall()
+            finally:
+                conn.close()
+        for product_id, category, tags_json, price in rows:
+            item_idx = item_map.get(product_id)
+            if item_idx is None:
+                continue
+            if price is not None:
+                prices[item_idx] = price
+            if category:
+                categories.setdefault(_normalize_label(category), []).append(item_idx)
+            try:
+                product_tags = json.loads(tags_json) if tags_json else []
+            except json.JSONDecodeError:
+                product_tags = []
+            for tag in product_tags if isinstance(product_tags, list) else []:
+                tags.setdefault(_normalize_label(tag), []).append(item_idx)
+
+        def to_bits(groups):
+            packed = {}
+            for label, indices in groups.items():
+                members = np.zeros(num_items, dtype=bool)
+                members[indices] = True
+                packed[label] = np.packbits(members)
+            return packed
+
+        return cls(num_items, to_bits(categories), to_bits(tags), prices)
+
+    def _any_of(self, bitsets, labels):
+        """Packed union of the bitsets for labels; unknown labels contribute nothing."""
+        union = np.zeros((self.num_items + 7) // 8, dtype=np.uint8)
+        for label in labels:
+            bits = bitsets.get(_normalize_label(label))
+            if bits is not None:
+                union |= bits
+        return union
+
+    def mask(self, categories=None, tags=None, min_price=None, max_price=None):
+        """
+        Boolean mask over item indices for items in any of the categories, carrying any of
+        the tags, and priced within [min_price, max_price]. Unset filters don't constrain;
+        a price bound excludes items without a price.
+
+        Returns:
+            np.ndarray or None: (num_items,) bool mask, or None if no filter is set.
+        """
+        if not categories and not tags and min_price is None and max_price is None:
+            return None
+        packed = np.full((self.num_items + 7) // 8, 0xFF, dtype=np.uint8)
+        if categories:
+            packed &= self._any_of(self.category_bits, categories)
+        if tags:
+            packed &= self._any_of(self.tag_bits, tags)
+        selected = np.unpackbits(packed, count=self.num_items).astype(bool)
+        if min_price is not None:
+            selected &= self.prices >= min_price # NaN compares False
+        if max_price is not None:
+            selected &= self.prices <= max_price
+        return selected
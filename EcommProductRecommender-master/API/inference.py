@@ -0,0 +1,359 @@
+# inference.py
+import argparse
+import os
+import numpy as np
+
+# --- Configuration ---
+SUPPORTED_PRECISIONS = ("float32", "float16", "int8")
+DEFAULT_AGREEMENT_K = 10
+DEFAULT_AGREEMENT_USERS = 200
+INT8_MAX = 127.0
+WEIGHTS_FILENAME = "ncf_weights.npz" # Written next to ncf_model.h5 for TF-free serving
+PROJECTION_BLOCK_ROWS = 65536 # Items per block when precomputing the first MLP layer's item half
+
+EMBEDDING_LAYER_NAMES = (
+    "gmf_user_embedding",
+    "gmf_item_embedding",
+    "mlp_user_embedding",
+    "mlp_item_embedding",
+)
+
+
+def export_ncf_weights(model):
+    """
+    Extracts the weights of a model built by create_ncf_model into plain NumPy arrays.
+
+    Args:
+        model: A Keras model created by model.create_ncf_model (or loaded from its .h5 file).
+
+    Returns:
+        dict: Embedding tables keyed by layer name, plus 'mlp_kernels'/'mlp_biases'
+              (lists, in layer order) and 'output_kernel'/'output_bias'.
+    """
+    weights = {}
+    for name in EMBEDDING_LAYER_NAMES:
+        weights[name] = np.asarray(model.get_layer(name).get_weights()[0], dtype=np.float32)
+
+    mlp_kernels, mlp_biases = [], []
+    layer_index = 0
+    while True:
+        try:
+            layer = model.get_layer(f"mlp_dense_layer_{layer_index}")
+        except ValueError:
+            break
+        kernel, bias = layer.get_weights()
+        mlp_kernels.append(np.asarray(kernel, dtype=np.float32))
+        mlp_biases.append(np.asarray(bias, dtype=np.float32))
+        layer_index += 1
+
+    output_kernel, output_bias = model.get_layer("output_layer").get_weights()
+    weights["mlp_kernels"] = mlp_kernels
+    weights["mlp_biases"] = mlp_biases
+    weights["output_kernel"] = np.asarray(output_kernel, dtype=np.float32)
+    weights["output_bias"] = np.asarray(output_bias, dtype=np.float32)
+    return weights
+
+
+def weights_path_for_model(model_path):
+    """Where the NumPy weights exported for a Keras model file are stored."""
+    return os.path.join(os.path.dirname(model_path), WEIGHTS_FILENAME)
+
+
+def save_ncf_weights(weights, file_path):
+    """Saves export_ncf_weights() output as an uncompressed .npz (no TensorFlow needed to load)."""
+    arrays = {name: weights[name] for name in EMBEDDING_LAYER_NAMES}
+    for i, (kernel, bias) in enumerate(zip(weights["mlp_kernels"], weights["mlp_biases"])):
+        arrays[f"mlp_kernel_{i}"] = kernel
+        arrays[f"mlp_bias_{i}"] = bias
+    arrays["output_kernel"] = weights["output_kernel"]
+    arrays["output_bias"] = weights["output_bias"]
+    # Write-then-rename so a concurrent reader never sees a partial file
+    temp_path = file_path + ".tmp.npz"
+    np.savez(temp_path, **arrays)
+    os.replace(temp_path, file_path)
+
+
+def load_ncf_weights(file_path):
+    """Loads weights saved by save_ncf_weights into the export_ncf_weights() layout."""
+    with np.load(file_path) as data:
+        weights = {name: data[name] for name in EMBEDDING_LAYER_NAMES}
+        num_layers = sum(1 for key in data.files if key.startswith("mlp_kernel_"))
+        weights["mlp_kernels"] = [data[f"mlp_kernel_{i}"] for i in range(num_layers)]
+        weights["mlp_biases"] = [data[f"mlp_bias_{i}"] for i in range(num_layers)]
+        weights["output_kernel"] = data["output_kernel"]
+        weights["output_bias"] = data["output_bias"]
+    return weights
+
+
+class QuantizedEmbedding:
+    """
+    An embedding table stored as float32, float16, or per-row-scaled int8.
+    Rows are dequantized to float32 only when they are looked up.
+    """
+
+    def __init__(self, table, precision="float32"):
+        if precision not in SUPPORTED_PRECISIONS:
+            raise ValueError(f"Unsupported precision '{precision}'. Expected one of {SUPPORTED_PRECISIONS}.")
+        table = np.asarray(table, dtype=np.float32)
+        self.precision = precision
+        self.scales = None
+
+        if precision == "int8":
+            # Symmetric per-row quantization: each row keeps its own float32 scale.
+            max_abs = np.abs(table).max(axis=1)
+            scales = np.where(max_abs > 0, max_abs / INT8_MAX, 1.0).astype(np.float32)
+            self.values = np.clip(np.rint(table / scales[:, None]), -INT8_MAX, INT8_MAX).astype(np.int8)
+            self.scales = scales
+        elif precision == "float16":
+            self.values = table.astype(np.float16)
+        else:
+            self.values = table
+
+    @classmethod
+    def concatenate(cls, parts, precision, dim):
+        """Stacks tables quantized block by block (rows are scaled independently, so this is exact)."""
+        table = cls(np.empty((0, dim), dtype=np.float32), precision)
+        if parts:
+            table.values = np.concatenate([part.values for part in parts])
+            if precision == "int8":
+                table.scales = np.concatenate([part.scales for part in parts])
+        return table
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + (self.scales.nbytes if self.scales is not None else 0)
+
+    def lookup(self, indices):
+        """Returns the float32 rows for the given integer indices (any shape; rows on the last axis)."""
+        rows = self.values[indices].astype(np.float32)
+        if self.scales is not None:
+            rows *= self.scales[indices][..., None]
+        return rows
+
+    def dequantize(self):
+        """Returns the whole table as float32."""
+        return self.lookup(np.arange(self.values.shape[0]))
+
+
+class NCFScorer:
+    """
+    NumPy implementation of the NCF forward pass (GMF + MLP + NeuMF head).
+
+    Exposes a predict() compatible with the way the API calls Keras models,
+    so it can be used as a drop-in replacement in the scoring path.
+    """
+
+    def __init__(self, weights, precision="float32"):
+        self.precision = precision
+        self.gmf_user = QuantizedEmbedding(weights["gmf_user_embedding"], precision)
+        self.gmf_item = QuantizedEmbedding(weights["gmf_item_embedding"], precision)
+        self.mlp_user = QuantizedEmbedding(weights["mlp_user_embedding"], precision)
+        self.mlp_item = QuantizedEmbedding(weights["mlp_item_embedding"], precision)
+        self.mlp_kernels = [np.asarray(k, dtype=np.float32) for k in weights["mlp_kernels"]]
+        self.mlp_biases = [np.asarray(b, dtype=np.float32) for b in weights["mlp_biases"]]
+        self.output_kernel = np.asarray(weights["output_kernel"], dtype=np.float32)
+        self.output_bias = np.asarray(weights["output_bias"], dtype=np.float32)
+        self._item_projections = None # Built on first score_candidates call
+
+    @classmethod
+    def from_keras_model(cls, model, precision="float32"):
+        return cls(export_ncf_weights(model), precision=precision)
+
+    @property
+    def num_users(self):
+        return self.gmf_user.shape[0]
+
+    @property
+    def num_items(self):
+        return self.gmf_item.shape[0]
+
+    def embedding_nbytes(self):
+        """Total memory used by the four embedding tables."""
+        return sum(t.nbytes for t in (self.gmf_user, self.gmf_item, self.mlp_user, self.mlp_item))
+
+    def score_latent(self, gmf_user_latent, mlp_user_latent, item_indices):
+        """
+        Scores items against already-resolved user latent vectors.
+
+        Args:
+            gmf_user_latent (np.ndarray): (n, dim) or (dim,) GMF user vectors.
+            mlp_user_latent (np.ndarray): (n, dim) or (dim,) MLP user vectors.
+            item_indices (np.ndarray): (n,) item indices.
+
+        Returns:
+            np.ndarray: (n,) float32 scores in [0, 1].
+        """
+        item_indices = np.asarray(item_indices).reshape(-1)
+        gmf_vector = gmf_user_latent * self.gmf_item.lookup(item_indices)
+
+        mlp_item_latent = self.mlp_item.lookup(item_indices)
+        mlp_user_latent = np.broadcast_to(mlp_user_latent, mlp_item_latent.shape)
+        mlp_vector = np.concatenate([mlp_user_latent, mlp_item_latent], axis=1)
+        for kernel, bias in zip(self.mlp_kernels, self.mlp_biases):
+            mlp_vector = np.maximum(mlp_vector @ kernel + bias, 0.0)
+
+        logits = gmf_vector @ self.output_kernel[:gmf_vector.shape[1]] \
+            + mlp_vector @ self.output_kernel[gmf_vector.shape[1]:] + self.output_bias
+        return (1.0 / (1.0 + np.exp(-logits))).reshape(-1).astype(np.float32)
+
+    def score(self, user_indices, item_indices):
+        """Scores (user, item) pairs. Returns a flat float32 array."""
+        user_indices = np.asarray(user_indices).reshape(-1)
+        return self.score_latent(
+            self.gmf_user.lookup(user_indices),
+            self.mlp_user.lookup(user_indices),
+            item_indices,
+        )
+
+    def _get_item_projections(self):
+        """
+        Per-item GMF vectors and first-MLP-layer contributions. The GMF vectors are the item
+        table itself; the MLP contributions are computed once for the whole catalog (a block
+        of items at a time) and stored at the model's precision, so a quantized model keeps
+        no float32 copy of the catalog. Rows are dequantized per request for the candidates.
+        """
+        if self._item_projections is None:
+            dim = self.gmf_item.shape[1]
+            item_kernel = self.mlp_kernels[0][dim:]
+            item_mlp = QuantizedEmbedding.concatenate([
+                QuantizedEmbedding(self.mlp_item.lookup(np.arange(start, min(start + PROJECTION_BLOCK_ROWS, self.num_items)))
+                                   @ item_kernel, self.precision)
+                for start in range(0, self.num_items, PROJECTION_BLOCK_ROWS)
+            ], self.precision, item_kernel.shape[1])
+            self._item_projections = (self.gmf_item, item_mlp)
+        return self._item_projections
+
+    def score_candidates(self, user_indices, candidate_items):
+        """
+        Scores an (n, c) matrix of candidate items for n users. The first MLP layer is
+        split into its user and item halves, so it costs one add per (user, item) pair
+        instead of a full matmul; much faster than predict() for large candidate sets.
+
+        Returns:
+            np.ndarray: (n, c) float32 scores in [0, 1].
+        """
+        user_indices = np.asarray(user_indices).reshape(-1)
+        return self.score_latent_candidates(self.gmf_user.lookup(user_indices),
+                                            self.mlp_user.lookup(user_indices), candidate_items)
+
+    def score_latent_candidates(self, gmf_user_latent, mlp_user_latent, candidate_items):
+        """
+        score_candidates for already-resolved (n, dim) user latent vectors, e.g. a user
+        folded in from recent interactions (see session_scoring.py).
+
+        Returns:
+            np.ndarray: (n, c) float32 scores in [0, 1].
+        """
+        candidate_items = np.asarray(candidate_items)
+        gmf_user_latent = np.atleast_2d(np.asarray(gmf_user_latent, dtype=np.float32))
+        mlp_user_latent = np.atleast_2d(np.asarray(mlp_user_latent, dtype=np.float32))
+        dim = gmf_user_latent.shape[1]
+        output_weights = self.output_kernel[:, 0]
+        item_gmf, item_mlp = self._get_item_projections()
+
+        user_gmf = gmf_user_latent * output_weights[:dim]
+        logits = np.einsum("nd,ncd->nc", user_gmf, item_gmf.lookup(candidate_items))
+
+        user_mlp = mlp_user_latent @ self.mlp_kernels[0][:dim] + self.mlp_biases[0]
+        hidden = user_mlp[:, None, :] + item_mlp.lookup(candidate_items)
+        np.maximum(hidden, 0.0, out=hidden)
+        hidden = hidden.reshape(-1, hidden.shape[-1]) # 2-D so the remaining layers are plain GEMMs
+        for kernel, bias in zip(self.mlp_kernels[1:], self.mlp_biases[1:]):
+            hidden = hidden @ kernel
+            hidden += bias
+            np.maximum(hidden, 0.0, out=hidden)
+        logits += (hidden @ output_weights[dim:]).reshape(logits.shape) + self.output_bias[0]
+        return (1.0 / (1.0 + np.exp(-logits))).astype(np.float32)
+
+    def predict(self, inputs, batch_size=None, verbose=0):
+        """
+        Keras-compatible predict: inputs is [user_indices, item_indices].
+        Returns an (n, 1) array like model.predict does.
+        """
+        user_indices, item_indices = (np.asarray(x).reshape(-1) for x in inputs)
+        total = len(user_indices)
+        if not batch_size or batch_size >= total:
+            return self.score(user_indices, item_indices)[:, None]
+
+        scores = np.empty(total, dtype=np.float32)
+        for start in range(0, total, batch_size):
+            end = start + batch_size
+            scores[start:end] = self.score(user_indices[start:end], item_indices[start:end])
+        return scores[:, None]
+
+
+def check_ranking_agreement(reference_model, candidate_model, num_users, num_items,
+                            k=DEFAULT_AGREEMENT_K, num_sample_users=DEFAULT_AGREEMENT_USERS, seed=42):
+    """
+    Compares the top-K rankings produced by two models over the full item catalog.
+
+    Args:
+        reference_model: The full-precision model (Keras model or NCFScorer).
+        candidate_model: The model to validate (typically a quantized NCFScorer).
+        num_users (int): Number of users known to the models.
+        num_items (int): Number of items known to the models.
+        k (int): Size of the top-K lists to compare.
+        num_sample_users (int): How many users to evaluate (sampled without replacement).
+        seed (int): Random seed for the user sample.
+
+    Returns:
+        dict: Mean/min top-K overlap (fraction of shared items) and mean/max absolute score delta.
+    """
+    rng = np.random.default_rng(seed)
+    sample_size = min(num_sample_users, num_users)
+    users = rng.choice(num_users, size=sample_size, replace=False)
+    k = min(k, num_items)
+
+    all_items = np.arange(num_items)
+    user_array = np.repeat(users, num_items)
+    item_array = np.tile(all_items, sample_size)
+
+    reference_scores = np.asarray(reference_model.predict([user_array, item_array], batch_size=8192, verbose=0))
+    candidate_scores = np.asarray(candidate_model.predict([user_array, item_array], batch_size=8192, verbose=0))
+    reference_scores = reference_scores.reshape(sample_size, num_items)
+    candidate_scores = candidate_scores.reshape(sample_size, num_items)
+
+    reference_top = np.argpartition(-reference_scores, k - 1, axis=1)[:, :k]
+    candidate_top = np.argpartition(-candidate_scores, k - 1, axis=1)[:, :k]
+    overlaps = np.array([
+        len(np.intersect1d(ref_row, cand_row, assume_unique=True)) / k
+        for ref_row, cand_row in zip(reference_top, candidate_top)
+    ])
+    deltas = np.abs(reference_scores - candidate_scores)
+
+    return {
+        "k": int(k),
+        "users_evaluated": int(sample_size),
+        "mean_topk_overlap": float(overlaps.mean()),
+        "min_topk_overlap": float(overlaps.min()),
+        "mean_abs_score_delta": float(deltas.mean()),
+        "max_abs_score_delta": float(deltas.max()),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report ranking agreement between a Keras NCF model and its quantized version.")
+    parser.add_argument("model_path", help="Path to the trained ncf_model.h5")
+    parser.add_argument("--precision", choices=SUPPORTED_PRECISIONS[1:], default="int8")
+    parser.add_argument("--k", type=int, default=DEFAULT_AGREEMENT_K)
+    parser.add_argument("--users", type=int, default=DEFAULT_AGREEMENT_USERS)
+    args = parser.parse_args()
+
+    from tensorflow.keras.models import load_model
+
+    keras_model = load_model(args.model_path)
+    full_scorer = NCFScorer.from_keras_model(keras_model)
+    quantized_scorer = NCFScorer.from_keras_model(keras_model, precision=args.precision)
+
+    report = check_ranking_agreement(
+        keras_model, quantized_scorer, full_scorer.num_users, full_scorer.num_items,
+        k=args.k, num_sample_users=args.users
+    )
+    print(f"Embedding memory: {full_scorer.embedding_nbytes()} bytes (float32) -> "
+          f"{quantized_scorer.embedding_nbytes()} bytes ({args.precision})")
+    for name, value in report.items():
+        print(f"{name}: {value}")
@@ -43,7 +43,8 @@ def init_products_db():
             price REAL NOT NULL,
             category TEXT,
             image_urls TEXT, -- Store as JSON stringified list
-            tags TEXT         -- Store as JSON stringified list
+            tags TEXT,        -- Store as JSON stringified list
+            content_hash TEXT -- product_catalog.product_content_hash; lets loaders skip unchanged rows
         )
     ''')
 
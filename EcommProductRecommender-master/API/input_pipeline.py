@@ -0,0 +1,143 @@
+# input_pipeline.py
+import zlib
+import numpy as np
+import tensorflow as tf
+
+# --- Configuration ---
+DEFAULT_VALIDATION_FRACTION = 0.2
+DEFAULT_SHUFFLE_BUFFER = 100_000
+DEFAULT_SPLIT_SALT = 0x9E3779B97F4A7C15
+
+
+def hash_validation_mask(user_idx, item_idx, validation_fraction=DEFAULT_VALIDATION_FRACTION, salt=DEFAULT_SPLIT_SALT):
+    """
+    Deterministic train/validation split: a (user, item) pair always lands on
+    the same side, regardless of row order or how often the data is reloaded.
+
+    Returns:
+        np.ndarray: Boolean mask, True for validation rows.
+    """
+    keys = (np.asarray(user_idx).astype(np.uint64) << np.uint64(32)) ^ np.asarray(item_idx).astype(np.uint64)
+    # splitmix64 finalizer; uint64 arithmetic wraps around, which is what we want here.
+    h = keys ^ np.uint64(salt)
+    h = (h ^ (h >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    h = (h ^ (h >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    h = h ^ (h >> np.uint64(31))
+    return (h >> np.uint64(11)).astype(np.float64) / float(1 << 53) < validation_fraction
+
+
+def _row_batches(columns, rows, batch_size, shuffle_buffer=None, seed=None):
+    """
+    Batches of the given rows of columns. Only the row indices go into the pipeline; each
+    batch is gathered from the original arrays when it is needed, so the columns are never
+    copied per split (from_tensor_slices would copy them into constant tensors).
+    """
+    dtypes = [tf.as_dtype(column.dtype) for column in columns]
+
+    def gather(batch_rows):
+        return tuple(column[batch_rows] for column in columns)
+
+    def tf_gather(batch_rows):
+        batch = tf.numpy_function(gather, [batch_rows], dtypes)
+        for tensor in batch:
+            tensor.set_shape([None])
+        return tuple(batch)
+
+    dataset = tf.data.Dataset.from_tensor_slices(rows)
+    if shuffle_buffer:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+    return dataset.batch(batch_size).map(tf_gather, num_parallel_calls=tf.data.AUTOTUNE)
+
+
+def make_datasets(user_idx, item_idx, labels, batch_size,
+                  validation_fraction=DEFAULT_VALIDATION_FRACTION,
+                  shuffle_buffer=DEFAULT_SHUFFLE_BUFFER, seed=42, sample_weights=None):
+    """
+    Builds (train_ds, val_ds) yielding ((user, item), label) batches with a shuffle
+    buffer and prefetching, so data preparation overlaps with training steps.
+    With sample_weights, training batches are ((user, item), label, weight);
+    validation stays unweighted so its metrics are comparable across runs.
+    val_ds is None if no row lands in the validation split (e.g. tiny datasets).
+    """
+    validation_mask = hash_validation_mask(user_idx, item_idx, validation_fraction)
+    columns = (np.asarray(user_idx), np.asarray(item_idx), np.asarray(labels, dtype=np.float32))
+    if sample_weights is not None:
+        columns += (np.asarray(sample_weights, dtype=np.float32),)
+    validation_rows = np.flatnonzero(validation_mask)
+
+    # Named functions: AutoGraph warns when it cannot parse a lambda's source
+    def to_model_inputs(user, item, label, *weight):
+        return ((user, item), label) + weight
+
+    def to_unweighted_inputs(user, item, label, *weight):
+        return ((user, item), label)
+
+    train = (_row_batches(columns, np.flatnonzero(~validation_mask), batch_size, shuffle_buffer, seed)
+             .map(to_model_inputs, num_parallel_calls=tf.data.AUTOTUNE)
+             .prefetch(tf.data.AUTOTUNE))
+    val = None
+    if validation_rows.size:
+        val = (_row_batches(columns, validation_rows, batch_size)
+               .map(to_unweighted_inputs, num_parallel_calls=tf.data.AUTOTUNE)
+               .prefetch(tf.data.AUTOTUNE))
+    return train, val
+
+
+def make_sampled_datasets(user_idx, item_idx, negative_sampler, negative_samples, batch_size,
+                          validation_fraction=DEFAULT_VALIDATION_FRACTION,
+                          shuffle_buffer=DEFAULT_SHUFFLE_BUFFER, seed=42, sample_weights=None):
+    """
+    Like make_datasets, but over positives only: each training batch of positives is
+    extended with fresh negatives from negative_sampler (a sampling.NegativeSampler).
+    Validation negatives are drawn once so validation metrics are comparable across epochs.
+    sample_weights (one per positive) weight the training loss; negatives weigh 1.0.
+    val_ds is None if no positive lands in the validation split.
+
+    Batches are extended in parallel, so each one draws from its own generator seeded from
+    seed and the batch's positives: the seeded reshuffle makes those differ every epoch but
+    repeat across runs, so the negatives don't depend on thread scheduling.
+    """
+    user_idx = np.asarray(user_idx, dtype=np.int64)
+    item_idx = np.asarray(item_idx, dtype=np.int64)
+    validation_mask = hash_validation_mask(user_idx, item_idx, validation_fraction)
+    weights = (np.ones(len(user_idx), dtype=np.float32) if sample_weights is None
+               else np.asarray(sample_weights, dtype=np.float32))
+
+    def add_negatives(pos_users, pos_items, pos_weights=None):
+        rng = np.random.default_rng([seed, zlib.crc32(pos_users.tobytes()), zlib.crc32(pos_items.tobytes())])
+        neg_users, neg_items = negative_sampler.sample(pos_users, negative_samples, rng=rng)
+        users = np.concatenate([pos_users, neg_users])
+        items = np.concatenate([pos_items, neg_items])
+        labels = np.concatenate([np.ones(len(pos_users), dtype=np.float32),
+                                 np.zeros(len(neg_users), dtype=np.float32)])
+        if pos_weights is None:
+            return users, items, labels
+        weights = np.concatenate([pos_weights, np.ones(len(neg_users), dtype=np.float32)])
+        return users, items, labels, weights
+
+    def tf_add_negatives(pos_users, pos_items, pos_weights):
+        users, items, labels, weights = tf.numpy_function(
+            add_negatives, [pos_users, pos_items, pos_weights], [tf.int64, tf.int64, tf.float32, tf.float32]
+        )
+        users.set_shape([None])
+        items.set_shape([None])
+        labels.set_shape([None])
+        weights.set_shape([None])
+        if sample_weights is None:
+            return (users, items), labels
+        return (users, items), labels, weights
+
+    positives_per_batch = max(1, batch_size // (1 + negative_samples))
+    train = (_row_batches((user_idx, item_idx, weights), np.flatnonzero(~validation_mask),
+                          positives_per_batch, shuffle_buffer, seed)
+             .map(tf_add_negatives, num_parallel_calls=tf.data.AUTOTUNE)
+             .prefetch(tf.data.AUTOTUNE))
+
+    if not validation_mask.any():
+        return train, None
+    # Fixed negatives have to be materialized; this is the (small) validation split only
+    val_users, val_items, val_labels = add_negatives(user_idx[validation_mask], item_idx[validation_mask])
+    val = (tf.data.Dataset.from_tensor_slices(((val_users, val_items), val_labels))
+           .batch(batch_size)
+           .prefetch(tf.data.AUTOTUNE))
+    return train, val
@@ -0,0 +1,244 @@
+# interaction_archive.py
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+ARCHIVE_DIR = "interaction_archive"
+DATABASE_PATH = "user_interactions.db"
+DEFAULT_HOT_WINDOW_DAYS = 30 # Interactions newer than this stay in the SQLite table
+STATE_FILENAME = "_state.json"
+PART_META_FILENAME = "_meta.json"
+SECONDS_PER_DAY = 24 * 3600
+ARCHIVE_COLUMNS = ("id", "user_id", "item_id", "type", "timestamp")
+DICTIONARY_COLUMNS = ("user_id", "item_id", "type") # Stored as int32 codes + a sorted dictionary
+
+# Layout: <archive_dir>/day=YYYY-MM-DD/part-<id>/ with one .npy per column (codes and
+# <column>.dict.npy for dictionary-encoded columns) and _meta.json (rows, time range).
+# Readers only open the partitions and columns they need.
+
+
+def _day_name(day_number):
+    return "day=" + datetime.fromtimestamp(day_number * SECONDS_PER_DAY, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def _day_start(partition_name):
+    day = datetime.strptime(partition_name[len("day="):], "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    return day.timestamp()
+
+
+def _read_state(archive_dir):
+    try:
+        with open(os.path.join(archive_dir, STATE_FILENAME)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _write_state(archive_dir, state):
+    temp_path = os.path.join(archive_dir, STATE_FILENAME + ".tmp")
+    with open(temp_path, "w") as f:
+        json.dump(state, f)
+    os.replace(temp_path, os.path.join(archive_dir, STATE_FILENAME))
+
+
+def _write_part(archive_dir, day_number, frame):
+    """Writes one partition part; the directory is renamed into place only once complete."""
+    partition_dir = os.path.join(archive_dir, _day_name(day_number))
+    os.makedirs(partition_dir, exist_ok=True)
+    part_name = f"part-{int(frame['id'].min()):012d}-{int(frame['id'].max()):012d}"
+    final_dir = os.path.join(partition_dir, part_name)
+    if os.path.exists(final_dir):
+        return 0 # Written by an interrupted earlier run
+    temp_dir = os.path.join(partition_dir, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(temp_dir)
+    try:
+        np.save(os.path.join(temp_dir, "id.npy"), frame["id"].to_numpy(dtype=np.int64))
+        np.save(os.path.join(temp_dir, "timestamp.npy"), frame["timestamp"].to_numpy(dtype=np.float64))
+        for column in DICTIONARY_COLUMNS:
+            dictionary, codes = np.unique(frame[column].to_numpy().astype(str), return_inverse=True) # Fixed-width unicode, no pickling
+            np.save(os.path.join(temp_dir, f"{column}.npy"), codes.astype(np.int32))
+            np.save(os.path.join(temp_dir, f"{column}.dict.npy"), dictionary)
+        with open(os.path.join(temp_dir, PART_META_FILENAME), "w") as f:
+            json.dump({"rows": len(frame), "min_timestamp": float(frame["timestamp"].min()),
+                       "max_timestamp": float(frame["timestamp"].max())}, f)
+        os.rename(temp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+    return len(frame)
+
+
+def _archive_snapshot(conn, archive_dir, max_id, cutoff):
+    """
+    Writes the rows selected by a (max_id, cutoff) snapshot to day partitions, then deletes
+    them from SQLite. The same snapshot always selects the same rows (ids only grow), so it
+    yields the same part names and can be replayed after a crash; parts that already exist
+    are skipped.
+
+    Returns:
+        tuple: (rows_archived, partitions_written, rows_deleted).
+    """
+    frame = pd.read_sql_query(
+        "SELECT id, user_id, item_id, type, timestamp FROM user_interactions WHERE id <= ? AND timestamp < ? ORDER BY id",
+        conn, params=(max_id, cutoff)
+    )
+    rows_archived, partitions = 0, 0
+    if not frame.empty:
+        day_numbers = np.floor(frame["timestamp"].to_numpy() / SECONDS_PER_DAY).astype(np.int64)
+        for day_number, day_frame in frame.groupby(day_numbers, sort=True):
+            rows_archived += _write_part(archive_dir, int(day_number), day_frame)
+            partitions += 1
+    deleted = conn.execute("DELETE FROM user_interactions WHERE id <= ? AND timestamp < ?", (max_id, cutoff)).rowcount
+    conn.commit()
+    return rows_archived, partitions, deleted
+
+
+def compact_interactions(db_path=DATABASE_PATH, archive_dir=ARCHIVE_DIR, hot_window_days=DEFAULT_HOT_WINDOW_DAYS,
+                         now=None, vacuum=False):
+    """
+    Moves interactions older than the hot window from SQLite into day partitions.
+
+    Crash-safe: the (max_id, cutoff) snapshot is recorded before any part is written, and
+    the next run first replays exactly that snapshot (see _archive_snapshot), so an
+    interrupted run is finished without duplicating or losing rows even if the cutoff
+    has moved since.
+
+    Returns:
+        dict: rows_archived, rows_deleted, partitions_written and seconds.
+    """
+    start = time.perf_counter()
+    os.makedirs(archive_dir, exist_ok=True)
+    conn = sqlite3.connect(db_path)
+    try:
+        state = _read_state(archive_dir)
+        rows_archived, partitions, deleted = 0, 0, 0
+        if state.get("pending"):
+            # A previous run was interrupted somewhere between recording its snapshot and finishing
+            pending = state["pending"]
+            rows_archived, partitions, deleted = _archive_snapshot(conn, archive_dir, pending["max_id"], pending["cutoff"])
+            state = {**state, "pending": None}
+            _write_state(archive_dir, state)
+
+        cutoff = (now if now is not None else time.time()) - hot_window_days * SECONDS_PER_DAY
+        max_id = conn.execute("SELECT MAX(id) FROM user_interactions").fetchone()[0]
+        if max_id is None:
+            return {"rows_archived": rows_archived, "rows_deleted": deleted, "partitions_written": partitions,
+                    "seconds": time.perf_counter() - start}
+
+        _write_state(archive_dir, {**state, "pending": {"max_id": int(max_id), "cutoff": cutoff}})
+        archived_now, partitions_now, deleted_now = _archive_snapshot(conn, archive_dir, int(max_id), cutoff)
+        rows_archived, partitions, deleted = rows_archived + archived_now, partitions + partitions_now, deleted + deleted_now
+        _write_state(archive_dir, {"pending": None, "last_compaction": {"max_id": int(max_id), "cutoff": cutoff,
+                                                                        "rows_archived": rows_archived,
+                                                                        "finished_at": time.time()}})
+        if vacuum:
+            conn.execute("VACUUM") # Returns freed pages to the OS; needs an exclusive lock
+    finally:
+        conn.close()
+    return {"rows_archived": rows_archived, "rows_deleted": deleted, "partitions_written": partitions,
+            "seconds": time.perf_counter() - start}
+
+
+def list_partitions(archive_dir=ARCHIVE_DIR, start_time=None, end_time=None):
+    """Partition directories overlapping [start_time, end_time), oldest first (partition pruning)."""
+    if not os.path.isdir(archive_dir):
+        return []
+    partitions = []
+    for name in sorted(os.listdir(archive_dir)):
+        if not name.startswith("day="):
+            continue
+        day_start = _day_start(name)
+        if start_time is not None and day_start + SECONDS_PER_DAY <= start_time:
+            continue
+        if end_time is not None and day_start >= end_time:
+            continue
+        partitions.append(os.path.join(archive_dir, name))
+    return partitions
+
+
+def _read_part(part_dir, columns):
+    data = {}
+    for column in columns:
+        values = np.load(os.path.join(part_dir, f"{column}.npy"), mmap_mode="r")
+        if column in DICTIONARY_COLUMNS:
+            dictionary = np.load(os.path.join(part_dir, f"{column}.dict.npy"))
+            values = dictionary[values]
+        data[column] = np.asarray(values)
+    return data
+
+
+def read_archive(archive_dir=ARCHIVE_DIR, columns=("user_id", "item_id", "type", "timestamp"),
+                 start_time=None, end_time=None):
+    """
+    Reads archived interactions as a DataFrame, opening only the partitions overlapping
+    [start_time, end_time) and only the requested columns.
+    """
+    columns = list(columns)
+    unknown = set(columns) - set(ARCHIVE_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown archive columns: {sorted(unknown)}")
+    needs_time_filter = start_time is not None or end_time is not None
+    load_columns = columns + (["timestamp"] if needs_time_filter and "timestamp" not in columns else [])
+
+    chunks = []
+    for partition_dir in list_partitions(archive_dir, start_time, end_time):
+        for part_name in sorted(os.listdir(partition_dir)):
+            if not part_name.startswith("part-"):
+                continue
+            part_dir = os.path.join(partition_dir, part_name)
+            data = _read_part(part_dir, load_columns)
+            if needs_time_filter:
+                keep = np.ones(len(data["timestamp"]), dtype=bool)
+                if start_time is not None:
+                    keep &= data["timestamp"] >= start_time
+                if end_time is not None:
+                    keep &= data["timestamp"] < end_time
+                data = {column: values[keep] for column, values in data.items()}
+            chunks.append(pd.DataFrame({column: data[column] for column in columns}))
+
+    if not chunks:
+        return pd.DataFrame({column: pd.Series(dtype="float64" if column == "timestamp" else "object")
+                             for column in columns})
+    frame = pd.concat(chunks, ignore_index=True)
+    for column in DICTIONARY_COLUMNS:
+        if column in frame:
+            frame[column] = frame[column].astype(object)
+    return frame
+
+
+def read_interactions(db_path=DATABASE_PATH, archive_dir=ARCHIVE_DIR,
+                      columns=("user_id", "item_id", "type", "timestamp"), start_time=None):
+    """All interactions (archived partitions plus the hot SQLite table) since start_time."""
+    columns = list(columns)
+    archived = read_archive(archive_dir, columns, start_time=start_time)
+    conn = sqlite3.connect(db_path)
+    try:
+        query = f"SELECT {', '.join(columns)} FROM user_interactions"
+        params = ()
+        if start_time is not None:
+            query += " WHERE timestamp >= ?"
+            params = (start_time,)
+        hot = pd.read_sql_query(query, conn, params=params)
+    finally:
+        conn.close()
+    if archived.empty:
+        return hot
+    return pd.concat([archived, hot], ignore_index=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move interactions older than the hot window into the columnar archive.")
+    parser.add_argument("--db", default=DATABASE_PATH)
+    parser.add_argument("--archive-dir", default=ARCHIVE_DIR)
+    parser.add_argument("--hot-days", type=float, default=DEFAULT_HOT_WINDOW_DAYS)
+    parser.add_argument("--vacuum", action="store_true", help="VACUUM the database afterwards to shrink the file")
+    args = parser.parse_args()
+    print(json.dumps(compact_interactions(args.db, args.archive_dir, args.hot_days, vacuum=args.vacuum)))
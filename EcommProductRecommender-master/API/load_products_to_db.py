@@ -1,70 +1,129 @@
 # load_products_to_db.py
+import argparse
 import sqlite3
 import json
 import os
+import time
+from itertools import islice
+
+from product_catalog import (
+    PRODUCT_COLUMNS, ProductValidationError, normalize_product, product_content_hash,
+    ensure_content_hash_column, fetch_content_hashes, iter_json_records
+)
 
 # --- Configuration ---
 DATABASE_PATH = "ecommerce.db"
-PRODUCTS_JSON_PATH = "products.json" # Path to your existing products.json file
+PRODUCTS_JSON_PATH = "products.json" # Path to your existing products.json file (JSON array or JSONL)
+DEFAULT_BATCH_SIZE = 5000 # Products validated, diffed and written per transaction
+
+INSERT_SQL = f'''
+    INSERT INTO products ({", ".join(PRODUCT_COLUMNS)}, content_hash)
+    VALUES ({", ".join("?" * (len(PRODUCT_COLUMNS) + 1))})
+'''
+UPDATE_SQL = f'''
+    UPDATE products SET {", ".join(f"{column} = ?" for column in PRODUCT_COLUMNS[1:])}, content_hash = ?
+    WHERE id = ?
+'''
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
 
-def load_products_to_database():
+def load_products_to_database(products_path=PRODUCTS_JSON_PATH, db_path=DATABASE_PATH,
+                              batch_size=DEFAULT_BATCH_SIZE, delete_missing=False):
     """
-    Reads products from products.json and inserts/updates them in the SQLite database.
+    Streams products from a JSON array or JSONL file into the products table.
+
+    Each batch is validated, hashed and compared with the stored content_hash; only new
+    and changed rows are written (executemany, one transaction per batch). With
+    delete_missing, products absent from the file are deleted afterwards, but only if
+    the whole file parsed.
+
+    Returns:
+        dict or None: inserted, updated, unchanged, invalid and deleted counts, seconds
+                      and rows_per_second; None if the file couldn't be read.
     """
-    if not os.path.exists(PRODUCTS_JSON_PATH):
-        print(f"Error: Products file {PRODUCTS_JSON_PATH} not found.")
+    if not os.path.exists(products_path):
+        print(f"Error: Products file {products_path} not found.")
         return
 
+    start = time.perf_counter()
+    stats = {"inserted": 0, "updated": 0, "unchanged": 0, "invalid": 0, "deleted": 0}
+    conn = None
     try:
-        with open(PRODUCTS_JSON_PATH, 'r') as f:
-            products_data = json.load(f)
+        conn = sqlite3.connect(db_path)
+        ensure_content_hash_column(conn)
+        if delete_missing:
+            conn.execute("CREATE TEMP TABLE seen_product_ids (id TEXT PRIMARY KEY)")
+
+        for batch in _batches(iter_json_records(products_path), batch_size):
+            rows = {} # id -> (row, hash); a later duplicate in the batch wins
+            for product in batch:
+                try:
+                    row = normalize_product(product)
+                except ProductValidationError as e:
+                    print(f"Skipping invalid product data: {e}")
+                    stats["invalid"] += 1
+                    if delete_missing and isinstance(product, dict) and product.get('id'):
+                        rows.setdefault(str(product['id']), None) # Keep it rather than delete it
+                    continue
+                rows[row[0]] = (row, product_content_hash(row))
+
+            valid = {product_id: entry for product_id, entry in rows.items() if entry is not None}
+            stored = fetch_content_hashes(conn, valid)
+            inserts = [row + (row_hash,) for product_id, (row, row_hash) in valid.items() if product_id not in stored]
+            updates = [row[1:] + (row_hash, product_id) for product_id, (row, row_hash) in valid.items()
+                       if product_id in stored and stored[product_id] != row_hash]
+            with conn: # One transaction per batch
+                conn.executemany(INSERT_SQL, inserts)
+                conn.executemany(UPDATE_SQL, updates)
+                if delete_missing:
+                    conn.executemany("INSERT OR IGNORE INTO seen_product_ids (id) VALUES (?)", [(i,) for i in rows])
+            stats["inserted"] += len(inserts)
+            stats["updated"] += len(updates)
+            stats["unchanged"] += len(valid) - len(inserts) - len(updates)
+
+        if delete_missing:
+            with conn:
+                stats["deleted"] = conn.execute(
+                    "DELETE FROM products WHERE id NOT IN (SELECT id FROM seen_product_ids)"
+                ).rowcount
+
     except json.JSONDecodeError as e:
-        print(f"Error decoding JSON from {PRODUCTS_JSON_PATH}: {e}")
+        print(f"Error decoding JSON from {products_path}: {e}")
+        print("Batches before the error were applied; no products were deleted.")
         return
-    except Exception as e:
-        print(f"Unexpected error reading {PRODUCTS_JSON_PATH}: {e}")
+    except sqlite3.Error as e:
+        print(f"Database error while loading products: {e}")
         return
-
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        c = conn.cursor()
-
-        inserted_or_updated_count = 0
-
-        for product in products_data:
-            product_id = product.get('id')
-            name = product.get('name')
-            price = product.get('price')
-            category = product.get('category')
-            # Convert lists to JSON strings for storage in TEXT columns
-            image_urls_json = json.dumps(product.get('imageUrls', []))
-            tags_json = json.dumps(product.get('tags', []))
-
-            if not all([product_id, name, price is not None]): # Basic validation (price can be 0)
-                print(f"Skipping invalid product data: {product}")
-                continue
-
-            # Use INSERT OR REPLACE to handle existing products
-            # This will INSERT if the ID is new, or UPDATE if the ID already exists
-            try:
-                c.execute('''
-                    INSERT OR REPLACE INTO products (id, name, price, category, image_urls, tags)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                ''', (product_id, name, price, category, image_urls_json, tags_json))
-                inserted_or_updated_count += 1
-
-            except sqlite3.Error as e:
-                print(f"Database error inserting/updating product {product_id}: {e}")
-
-        conn.commit()
-        print(f"Finished loading products. Processed {inserted_or_updated_count} products (including updates).")
-
     except Exception as e:
         print(f"Unexpected error during database operation: {e}")
+        return
     finally:
         if conn:
             conn.close()
 
+    stats["seconds"] = time.perf_counter() - start
+    processed = stats["inserted"] + stats["updated"] + stats["unchanged"] + stats["invalid"]
+    stats["rows_per_second"] = processed / stats["seconds"] if stats["seconds"] > 0 else 0.0
+    print(f"Finished loading products: {stats['inserted']} inserted, {stats['updated']} updated, "
+          f"{stats['unchanged']} unchanged, {stats['invalid']} invalid, {stats['deleted']} deleted "
+          f"in {stats['seconds']:.2f}s ({stats['rows_per_second']:.0f} rows/s).")
+    return stats
+
+
 if __name__ == "__main__":
-    load_products_to_database()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Load a product catalog (JSON array or JSONL) into the products table.")
+    parser.add_argument("path", nargs="?", default=PRODUCTS_JSON_PATH)
+    parser.add_argument("--db", default=DATABASE_PATH)
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--delete-missing", action="store_true",
+                        help="Delete products that aren't in the file")
+    args = parser.parse_args()
+    load_products_to_database(args.path, args.db, args.batch_size, args.delete_missing)
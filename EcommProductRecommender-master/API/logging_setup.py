@@ -0,0 +1,134 @@
+# logging_setup.py
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+
+# --- Configuration ---
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json") # 'json' or 'text'
+ROOT_LOGGER_NAME = "recsys"
+
+# Fraction of records kept per event type; events not listed are always kept.
+# Override with e.g. LOG_SAMPLE_RATES="interaction_stored=0.01,search_received=0.1"
+DEFAULT_SAMPLE_RATES = {
+    "interaction_stored": 0.1,
+    "search_received": 0.1,
+    "search_results": 0.1,
+    "recommendation_served": 0.1,
+}
+
+
+def parse_sample_rates(value):
+    rates = {}
+    for part in (value or "").split(","):
+        if "=" in part:
+            event, _, rate = part.partition("=")
+            rates[event.strip()] = float(rate)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Drops a configurable fraction of records per 'event' before they are queued."""
+
+    def __init__(self, sample_rates):
+        super().__init__()
+        self.sample_rates = sample_rates
+
+    def filter(self, record):
+        rate = self.sample_rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1.0:
+            return True
+        record.sample_rate = rate
+        return random.random() < rate
+
+
+class StructuredFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event, message and any extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 6),
+            "level": record.levelname,
+            "logger": record.name,
+            "event": getattr(record, "event", None),
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if getattr(record, "sample_rate", None) is not None:
+            entry["sample_rate"] = record.sample_rate
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class _EnqueueOnlyHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler that skips formatting in the calling thread; the background
+    listener formats and writes, so request handlers only pay for a queue put.
+    """
+
+    def prepare(self, record):
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        return record
+
+
+_listener = None
+
+
+def setup_logging(level=LOG_LEVEL, sample_rates=None, stream=None):
+    """
+    Routes the 'recsys' logger hierarchy through an unbounded queue to a background
+    writer thread. Safe to call more than once; later calls only update level/sampling.
+    """
+    global _listener
+    root = logging.getLogger(ROOT_LOGGER_NAME)
+    root.setLevel(level)
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    rates.update(sample_rates if sample_rates is not None else parse_sample_rates(os.environ.get("LOG_SAMPLE_RATES")))
+
+    if _listener is not None:
+        for handler in root.handlers:
+            for log_filter in handler.filters:
+                if isinstance(log_filter, SamplingFilter):
+                    log_filter.sample_rates = rates
+        return root
+
+    log_queue = queue.SimpleQueue()
+    queue_handler = _EnqueueOnlyHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(rates))
+    root.addHandler(queue_handler)
+    root.propagate = False
+
+    stream_handler = logging.StreamHandler(stream or sys.stdout)
+    if LOG_FORMAT == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream_handler.setFormatter(StructuredFormatter())
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return root
+
+
+def shutdown_logging():
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def get_logger(name):
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+def log_event(logger, level, event, message, **fields):
+    """Logs message tagged with an event type (used for sampling) and structured fields."""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"event": event, "fields": fields})
@@ -3,39 +3,131 @@ import os
 import json
 import shutil
 import uuid
-import pandas as pd
 import numpy as np
 import sqlite3
-from fastapi import FastAPI, File, UploadFile, HTTPException, Security, Depends, Body
+from fastapi import FastAPI, File, UploadFile, HTTPException, Security, Depends, Body, Header
 from fastapi.security.api_key import APIKeyHeader, APIKey
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, JSONResponse
 from pydantic import BaseModel
 from typing import List, Dict, Optional
 from enum import Enum
-import tensorflow as tf
-from tensorflow.keras.models import load_model
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
 import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-# Assuming train.py and model.py are in the same src directory
-from train import load_and_preprocess_data, train_model, save_mappings, load_mappings
+# TensorFlow and the training stack (train.py, model.py) are only imported inside
+# training workers or, for the keras backend, on first model load.
+from mappings import save_mappings, load_mappings
+from inference import NCFScorer, SUPPORTED_PRECISIONS, load_ncf_weights, weights_path_for_model
+from model_registry import ModelRegistry, REGISTRY_FILENAME, artifact_checksums
+from serving_bundle import CURRENT_FILENAME, BundleError, bundle_path_for_model, load_bundle, verify_bundle
+from popularity import normalize_category, popularity_path_for_model, load_popularity
+from session_scoring import recent_interactions, session_latents
+from filter_masks import CatalogMasks, catalog_signature
+from similar_items import ItemNeighbors, neighbors_path_for_model
+from cooccurrence import (
+    ENGINE_NAME as COOCCURRENCE_ENGINE, COOCCURRENCE_FILENAME, CooccurrenceModel, load_cooccurrence_model, save_caught_up_state
+)
+from scheduler import TrainingScheduler
+from metrics import REGISTRY, PROMETHEUS_CONTENT_TYPE, MetricsMiddleware, api_key_label, record_stage, stage_timer
+from profiling import PROFILE_HEADER, PROFILE_STORE, is_profile_requested, request_profiler
+from logging_setup import setup_logging, get_logger, log_event
 
 # --- Configuration & Globals ---
+# Non-blocking logging: handlers only enqueue, a background thread writes (see logging_setup.py)
+setup_logging()
+logger = get_logger("api")
+
 API_KEY_NAME = "X-API-Key"
 MODELS_BASE_DIR = "models_store"
 INTERACTIONS_DB_PATH = "user_interactions.db"
 PRODUCTS_DB_PATH = "ecommerce.db"  # Path for the SQLite products database file
+# Keys allowed to request per-request profiles (X-Profile header) and read /v1/profiles
+ADMIN_API_KEYS = {k.strip() for k in os.environ.get("ADMIN_API_KEYS", "").split(",") if k.strip()}
+# 'keras' loads ncf_model.h5 (imports TensorFlow on first load); 'numpy' serves the
+# memory-mapped serving bundle (or, for older models, ncf_weights.npz) through NCFScorer
+# and never imports TensorFlow.
+SERVING_BACKEND = os.environ.get("SERVING_BACKEND", "keras")
+# Serving-bundle loads always check array sizes, shapes and dtypes against the manifest.
+# SHA-256 checksums read every byte, so by default ('background') each newly loaded bundle
+# version is hashed once in a background thread and, if corrupt, evicted and refused from
+# then on. '1' hashes before serving (slow loads); '0' never hashes.
+VERIFY_BUNDLE_CHECKSUMS = os.environ.get("VERIFY_BUNDLE_CHECKSUMS", "background").strip().lower()
+# PRELOAD_MODELS=1 loads and warms up every registered model at startup;
+# /ready reports 503 until that finishes.
+PRELOAD_MODELS = os.environ.get("PRELOAD_MODELS", "0").strip().lower() in ("1", "true", "yes", "on")
+PRELOAD_MAX_WORKERS = int(os.environ.get("PRELOAD_MAX_WORKERS", "4"))
+# Users missing from a key's model get its precomputed popularity lists (popularity.json,
+# written by training and retraining) with fallback=true instead of a 404.
+POPULARITY_FALLBACK = os.environ.get("POPULARITY_FALLBACK", "1").strip().lower() in ("1", "true", "yes", "on")
+# Interactions logged since the model was trained are folded into the user vector at request
+# time (session_scoring.py), so new users get personalized results before the next retrain.
+# SESSION_BLEND is how far a known user's trained vector moves towards the session (0..1).
+SESSION_SCORING = os.environ.get("SESSION_SCORING", "1").strip().lower() in ("1", "true", "yes", "on")
+SESSION_BLEND = float(os.environ.get("SESSION_BLEND", "0.5"))
+# Co-occurrence models built from the interaction log (engine=cooccurrence via /retrain) apply
+# newly logged interactions at most this often. Requests only schedule the catch-up: it runs on
+# a background thread against a copy of the model, which then replaces the served one.
+COOCCURRENCE_REFRESH_SECONDS = float(os.environ.get("COOCCURRENCE_REFRESH_SECONDS", "1.0"))
+# Interactions applied per refresh; a larger backlog is worked off over several refreshes.
+COOCCURRENCE_REFRESH_MAX_ROWS = int(os.environ.get("COOCCURRENCE_REFRESH_MAX_ROWS", "1000"))
+# The caught-up model is saved next to the model file at most this often (and at shutdown), so a
+# restart resumes from its watermark instead of replaying everything since the last retrain.
+COOCCURRENCE_SAVE_SECONDS = float(os.environ.get("COOCCURRENCE_SAVE_SECONDS", "60"))
+MODEL_FILENAME = "ncf_model.h5"
+MAPPINGS_FILENAME = "ncf_mappings.json"
+RETRAIN_API_KEY = "testkey123"  # Key whose model /retrain rebuilds (see retrain_model.API_KEY_TO_UPDATE)
 
 # Fix the API_KEYS_DB model path that was cut off
+# In-memory view of the key registry (models_store/registry.db), filled at startup by
+# load_registered_models(); get_api_key only ever does a dict lookup here.
+# Optional per-key "quantization": "float16" or "int8" serves the model through the
+# NumPy NCFScorer with reduced-precision embedding tables (validate first with inference.py).
+# Optional per-key "weights_path" overrides where the numpy backend looks for ncf_weights.npz.
 API_KEYS_DB = {
     "testkey123": {
-        "model_path": os.path.join(MODELS_BASE_DIR, "testkey123", "ncf_model.h5"),
-        "mappings_path": os.path.join(MODELS_BASE_DIR, "testkey123", "ncf_mappings.json"),
+        "model_path": os.path.join(MODELS_BASE_DIR, "testkey123", MODEL_FILENAME),
+        "mappings_path": os.path.join(MODELS_BASE_DIR, "testkey123", MAPPINGS_FILENAME),
     }
 }
 
+# Loaded (model, user_map, item_map, idx_to_item_map, num_users, num_items) per API key,
+# reused until the model or mappings file changes on disk (e.g. after /retrain).
+MODEL_CACHE = {}
+_model_cache_lock = threading.Lock()
+_model_load_locks = {} # api_key -> Lock, so concurrent cold requests load a model only once
+
+# Bundle version directories already hashed (see VERIFY_BUNDLE_CHECKSUMS), and those that failed
+VERIFIED_BUNDLES = set()
+CORRUPT_BUNDLES = set()
+_bundle_verifier = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bundle-verify")
+
+# Last catch-up with user_interactions per co-occurrence API key (time.monotonic())
+COOCCURRENCE_REFRESHED = {}
+COOCCURRENCE_REFRESHING = set() # Keys with a catch-up queued or running
+COOCCURRENCE_SAVED = {} # api_key -> (time.monotonic(), watermark) of the last saved caught-up state
+_cooccurrence_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="cooccurrence-refresh")
+
+# NCFScorer built from a Keras model for session scoring: api_key -> (keras model, scorer)
+SESSION_SCORERS = {}
+
+# Category/tag/price masks per API key: (item_map they're aligned with, (catalog signature, item count), CatalogMasks)
+FILTER_MASK_CACHE = {}
+
+# Item-neighbor tables per API key: (file mtime_ns, ItemNeighbors)
+NEIGHBORS_CACHE = {}
+
+# Popularity lists per API key: (file mtime_ns, lists as ready-made RecommendationItems)
+POPULARITY_CACHE = {}
+
+# Startup preload/warmup progress, reported by /ready
+READINESS = {"ready": False, "phase": "starting", "models": {}, "failed": {}, "seconds": None}
+
 os.makedirs(MODELS_BASE_DIR, exist_ok=True)
+MODEL_REGISTRY = ModelRegistry(os.path.join(MODELS_BASE_DIR, REGISTRY_FILENAME))
 
 # --- Database Initialization Function ---
 def init_databases():
@@ -54,9 +146,11 @@ def init_databases():
             timestamp REAL NOT NULL
         )
     ''')
+    # Session scoring reads a user's latest interactions on every recommendation request
+    c_int.execute('CREATE INDEX IF NOT EXISTS idx_user_interactions_user_time ON user_interactions (user_id, timestamp)')
     conn_int.commit()
     conn_int.close()
-    print(f"Interactions database initialized at {INTERACTIONS_DB_PATH}")
+    logger.info(f"Interactions database initialized at {INTERACTIONS_DB_PATH}")
 
     # Initialize products DB
     conn_prod = sqlite3.connect(PRODUCTS_DB_PATH)
@@ -68,14 +162,13 @@ def init_databases():
             price REAL NOT NULL,
             category TEXT,
             image_urls TEXT,
-            tags TEXT
+            tags TEXT,
+            content_hash TEXT
         )
     ''')
     conn_prod.commit()
     conn_prod.close()
-    print(f"Products database initialized at {PRODUCTS_DB_PATH}")
-
-init_databases()
+    logger.info(f"Products database initialized at {PRODUCTS_DB_PATH}")
 
 # Create FastAPI app
 app = FastAPI(title="E-commerce Recommendation System API", version="0.1.0")
@@ -89,6 +182,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Request counts/latency per endpoint and API key, exposed at /metrics
+app.add_middleware(MetricsMiddleware, api_key_header=API_KEY_NAME, is_known_key=lambda key: key in API_KEYS_DB)
+
 # --- API Key Authentication ---
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=True)
 
@@ -98,6 +194,22 @@ async def get_api_key(key: str = Security(api_key_header)):
     else:
         raise HTTPException(status_code=403, detail="Could not validate credentials")
 
+async def get_admin_api_key(key: str = Security(api_key_header)):
+    if key in API_KEYS_DB and key in ADMIN_API_KEYS:
+        return key
+    raise HTTPException(status_code=403, detail="Admin API key required")
+
+async def profiling_requested(
+    x_profile: Optional[str] = Header(None, alias=PROFILE_HEADER),
+    x_api_key: Optional[str] = Header(None, alias=API_KEY_NAME)
+) -> bool:
+    """True if the caller asked for a profile of this request; only admin keys may."""
+    if not is_profile_requested(x_profile):
+        return False
+    if x_api_key not in ADMIN_API_KEYS or x_api_key not in API_KEYS_DB:
+        raise HTTPException(status_code=403, detail="Request profiling is restricted to admin API keys")
+    return True
+
 # --- Pydantic Models for Request/Response ---
 class TrainResponse(BaseModel):
     message: str
@@ -109,6 +221,12 @@ class RecommendationRequest(BaseModel):
     user_id: str
     count: int = 10
     search_query: str = ""
+    category: Optional[str] = None # Restricts results to this category (also picks the fallback popularity list)
+    # Structured filters: items in any of the categories, with any of the tags, within the price range
+    categories: Optional[List[str]] = None
+    tags: Optional[List[str]] = None
+    min_price: Optional[float] = None
+    max_price: Optional[float] = None
 
 class RecommendationItem(BaseModel):
     item_id: str
@@ -117,6 +235,20 @@ class RecommendationItem(BaseModel):
 class RecommendationResponse(BaseModel):
     recommendations: List[RecommendationItem]
     user_id: str
+    fallback: bool = False # True when the user is unknown and these are popularity results
+
+class TrainingEngine(str, Enum):
+    ncf = "ncf"
+    cooccurrence = COOCCURRENCE_ENGINE
+
+class ServingPrecision(str, Enum):
+    float32 = "float32" # Full precision (the default)
+    float16 = "float16"
+    int8 = "int8"
+
+class QuantizationResponse(BaseModel):
+    api_key: str
+    quantization: ServingPrecision
 
 class InteractionType(str, Enum):
     tap = "tap"
@@ -143,29 +275,463 @@ class Product(BaseModel):
 class SearchResponse(BaseModel):
     products: List[Product]
 
+class SimilarItemsResponse(BaseModel):
+    item_id: str
+    similar: List[RecommendationItem] # Score is the cosine similarity of the learned item vectors
+
 # --- Helper Functions ---
+def _model_artifact_path(model_data):
+    """
+    The file the configured serving backend loads: the .h5 model, or for the numpy backend
+    the bundle's CURRENT pointer (falling back to exported NumPy weights for older models).
+    Co-occurrence keys always load their cooccurrence.npz.
+    """
+    if model_data.get("engine") == COOCCURRENCE_ENGINE:
+        return model_data.get("model_path", "")
+    if SERVING_BACKEND == "numpy":
+        bundle_current = os.path.join(bundle_path_for_model(model_data.get("model_path", "")), CURRENT_FILENAME)
+        if os.path.exists(bundle_current):
+            return bundle_current
+        return model_data.get("weights_path") or weights_path_for_model(model_data.get("model_path", ""))
+    return model_data.get("model_path", "")
+
+def _serving_precision(model_data):
+    precision = model_data.get("quantization")
+    if precision and precision not in SUPPORTED_PRECISIONS:
+        raise ValueError(f"Unsupported quantization '{precision}' configured for this API key.")
+    return precision
+
+def _load_serving_model(model_data, artifact_path):
+    precision = _serving_precision(model_data)
+    if SERVING_BACKEND == "numpy":
+        return NCFScorer(load_ncf_weights(artifact_path), precision=precision or "float32")
+
+    from tensorflow.keras.models import load_model # Deferred: importing TensorFlow takes seconds
+    model = load_model(artifact_path)
+    if precision:
+        model = NCFScorer.from_keras_model(model, precision=precision)
+    return model
+
+def _model_files_signature(model_data):
+    artifact_path = _model_artifact_path(model_data)
+    mappings_path = model_data["mappings_path"]
+    return (artifact_path, os.stat(artifact_path).st_mtime_ns, os.stat(mappings_path).st_mtime_ns,
+            model_data.get("quantization"))
+
+def _verify_bundle_in_background(bundle_dir, artifact_path):
+    """Hashes a loaded bundle version; a corrupt one is evicted from MODEL_CACHE and refused on reload."""
+    try:
+        verify_bundle(bundle_dir)
+    except BundleError as e:
+        CORRUPT_BUNDLES.add(bundle_dir)
+        with _model_cache_lock:
+            for api_key in [key for key, (signature, _) in MODEL_CACHE.items() if signature[0] == artifact_path]:
+                MODEL_CACHE.pop(api_key, None)
+        log_event(logger, logging.ERROR, "bundle_corrupt", "Serving bundle failed checksum verification; evicted",
+                  bundle_dir=bundle_dir, error=str(e))
+
+def _load_model_and_mappings(model_data, artifact_path):
+    """
+    Returns the cache entry (model, user_map, item_map, idx_to_item_map, num_users, num_items)
+    and the bundle version directory still to be hashed in the background, or None.
+    """
+    if model_data.get("engine") == COOCCURRENCE_ENGINE:
+        # The model owns its ID maps; catch-up adds users and items to them in place
+        model = load_cooccurrence_model(artifact_path) # Resumes from the saved caught-up state, if current
+        return (model, model.user_map, model.item_map, model.idx_to_item_map, model.num_users, model.num_items), None
+    unverified_dir = None
+    if os.path.basename(artifact_path) == CURRENT_FILENAME:
+        # Serving bundle: mmap'd weights and binary ID tables, integrity-checked against its manifest
+        bundle = load_bundle(os.path.dirname(artifact_path), verify=VERIFY_BUNDLE_CHECKSUMS in ("1", "true", "yes", "on"))
+        if bundle.bundle_dir in CORRUPT_BUNDLES:
+            raise BundleError(f"Serving bundle {bundle.bundle_dir} failed checksum verification")
+        if VERIFY_BUNDLE_CHECKSUMS == "background" and bundle.bundle_dir not in VERIFIED_BUNDLES:
+            unverified_dir = bundle.bundle_dir
+        model = NCFScorer(bundle.weights, precision=_serving_precision(model_data) or "float32")
+        user_map, item_map = bundle.mappings()
+    else:
+        model = _load_serving_model(model_data, artifact_path)
+        user_map, item_map = load_mappings(model_data["mappings_path"])
+    idx_to_item_map = {idx: item_id for item_id, idx in item_map.items()}
+    return (model, user_map, item_map, idx_to_item_map, model_data.get("num_users"), model_data.get("num_items")), unverified_dir
+
 def get_model_and_mappings_for_key(api_key: str):
     if api_key not in API_KEYS_DB or \
-       not os.path.exists(API_KEYS_DB[api_key].get("model_path", "")) or \
+       not os.path.exists(_model_artifact_path(API_KEYS_DB[api_key])) or \
        not os.path.exists(API_KEYS_DB[api_key].get("mappings_path", "")):
         raise HTTPException(status_code=404, detail="Model or mappings not found for this API key. Ensure the model is trained or paths are correct.")
 
     model_data = API_KEYS_DB[api_key]
     try:
-        if not os.path.exists(model_data["model_path"]):
-            raise HTTPException(status_code=404, detail=f"Model file not found at {model_data['model_path']}")
+        artifact_path = _model_artifact_path(model_data)
+        if not os.path.exists(artifact_path):
+            raise HTTPException(status_code=404, detail=f"Model file not found at {artifact_path}")
         if not os.path.exists(model_data["mappings_path"]):
             raise HTTPException(status_code=404, detail=f"Mappings file not found at {model_data['mappings_path']}")
 
-        model = load_model(model_data["model_path"])
-        user_map, item_map = load_mappings(model_data["mappings_path"])
-        idx_to_item_map = {idx: item_id for item_id, idx in item_map.items()}
-        return model, user_map, item_map, idx_to_item_map, model_data.get("num_users"), model_data.get("num_items")
+        signature = _model_files_signature(model_data)
+        cached = MODEL_CACHE.get(api_key)
+        if cached is not None and cached[0] == signature:
+            return cached[1]
+
+        with _model_cache_lock:
+            load_lock = _model_load_locks.setdefault(api_key, threading.Lock())
+        with load_lock:
+            cached = MODEL_CACHE.get(api_key)
+            if cached is not None and cached[0] == signature:
+                return cached[1] # Loaded by a concurrent request while we waited
+            loaded, unverified_dir = _load_model_and_mappings(model_data, artifact_path)
+            MODEL_CACHE[api_key] = (signature, loaded)
+            if unverified_dir is not None:
+                # Submitted only once cached, so a corrupt version is always found and evicted
+                VERIFIED_BUNDLES.add(unverified_dir)
+                _bundle_verifier.submit(_verify_bundle_in_background, unverified_dir, artifact_path)
+            return loaded
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading model/mappings: {str(e)}")
 
+def get_popularity_for_key(api_key: str):
+    """
+    The key's popularity lists, reloaded only when popularity.json changes. Returns None
+    if the key has none. Lists are stored as RecommendationItems so serving only slices.
+    """
+    model_data = API_KEYS_DB.get(api_key)
+    if not model_data or not model_data.get("model_path"):
+        return None
+    path = popularity_path_for_model(model_data["model_path"])
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = POPULARITY_CACHE.get(api_key)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+
+    popularity = load_popularity(path)
+    to_items = lambda ranked: [RecommendationItem(item_id=item_id, score=score) for item_id, score in ranked]
+    loaded = {
+        "global": to_items(popularity["global"]),
+        # Files written before categories were casefolded may still have mixed-case keys
+        "categories": {normalize_category(category): to_items(ranked) for category, ranked in popularity["categories"].items()},
+        # Older files only have scores for the global list
+        "scores": popularity.get("scores") or {item_id: score for item_id, score in popularity["global"]},
+        "score_vector": None, # (item_map, len(item_map), scores by item index), see _popularity_score_vector
+    }
+    POPULARITY_CACHE[api_key] = (mtime_ns, loaded)
+    return loaded
+
+def refresh_cooccurrence_model(api_key: str, model):
+    """
+    Schedules a catch-up of the co-occurrence model with interactions logged since its
+    watermark, at most every COOCCURRENCE_REFRESH_SECONDS; never blocks the caller.
+    """
+    now = time.monotonic()
+    if model.watermark is None or api_key in COOCCURRENCE_REFRESHING or \
+       now - COOCCURRENCE_REFRESHED.get(api_key, float("-inf")) < COOCCURRENCE_REFRESH_SECONDS:
+        return
+    COOCCURRENCE_REFRESHED[api_key] = now
+    COOCCURRENCE_REFRESHING.add(api_key)
+    _cooccurrence_refresher.submit(_catch_up_cooccurrence_model, api_key, model)
+
+def _catch_up_cooccurrence_model(api_key, model):
+    """
+    Applies up to COOCCURRENCE_REFRESH_MAX_ROWS new interactions to a copy of the served model
+    and publishes the copy, so requests never wait for (or see half of) an update.
+    """
+    try:
+        if not model.has_new_interactions(INTERACTIONS_DB_PATH):
+            return
+        updated = model.copy()
+        applied = updated.catch_up(INTERACTIONS_DB_PATH, max_rows=COOCCURRENCE_REFRESH_MAX_ROWS)
+        with _model_cache_lock:
+            cached = MODEL_CACHE.get(api_key)
+            if cached is None or cached[1][0] is not model:
+                return # Reloaded (e.g. retrained) meanwhile; the update is stale
+            MODEL_CACHE[api_key] = (cached[0], (updated, updated.user_map, updated.item_map, updated.idx_to_item_map,
+                                                updated.num_users, updated.num_items))
+        _carry_over_item_caches(api_key, model.item_map, updated.item_map)
+        log_event(logger, logging.DEBUG, "cooccurrence_updated", "Applied new interactions to the co-occurrence model",
+                  api_key=api_key, interactions=applied, watermark=updated.watermark)
+        last_saved = COOCCURRENCE_SAVED.get(api_key, (float("-inf"), None))[0]
+        if COOCCURRENCE_SAVE_SECONDS > 0 and time.monotonic() - last_saved >= COOCCURRENCE_SAVE_SECONDS:
+            _save_cooccurrence_state(api_key, updated, cached[0][0])
+    except (sqlite3.Error, OSError) as e:
+        logger.warning(f"Could not update co-occurrence model for {api_key}: {e}")
+    finally:
+        COOCCURRENCE_REFRESHING.discard(api_key)
+
+def _save_cooccurrence_state(api_key, model, artifact_path):
+    save_caught_up_state(model, artifact_path)
+    COOCCURRENCE_SAVED[api_key] = (time.monotonic(), model.watermark)
+
+def _carry_over_item_caches(api_key, old_item_map, new_item_map):
+    """
+    Item-index-aligned caches are keyed by the item_map object; a catch-up that added no
+    items keeps every index, so they are moved to the published copy instead of rebuilt.
+    """
+    if len(new_item_map) != len(old_item_map):
+        return
+    cached = FILTER_MASK_CACHE.get(api_key)
+    if cached is not None and cached[0] is old_item_map:
+        FILTER_MASK_CACHE[api_key] = (new_item_map,) + cached[1:]
+    popularity = POPULARITY_CACHE.get(api_key)
+    vector = popularity[1]["score_vector"] if popularity is not None else None
+    if vector is not None and vector[0] is old_item_map:
+        popularity[1]["score_vector"] = (new_item_map,) + vector[1:]
+
+def save_cooccurrence_states():
+    """Saves caught-up co-occurrence models not saved since their last update (at shutdown)."""
+    for api_key, (signature, loaded) in list(MODEL_CACHE.items()):
+        model = loaded[0]
+        if isinstance(model, CooccurrenceModel) and model.watermark is not None and \
+           COOCCURRENCE_SAVED.get(api_key, (None, None))[1] != model.watermark:
+            try:
+                _save_cooccurrence_state(api_key, model, signature[0])
+            except OSError as e:
+                logger.warning(f"Could not save co-occurrence state for {api_key}: {e}")
+
+def get_filter_masks_for_key(api_key: str, item_map):
+    """
+    The key's CatalogMasks, rebuilt when the model's item mapping or the products table changes.
+    Co-occurrence models add items to their mapping in place, so its size is part of the key.
+    """
+    signature = (catalog_signature(PRODUCTS_DB_PATH), len(item_map))
+    cached = FILTER_MASK_CACHE.get(api_key)
+    if cached is not None and cached[0] is item_map and cached[1] == signature:
+        return cached[2]
+    masks = CatalogMasks.from_db(item_map, PRODUCTS_DB_PATH)
+    FILTER_MASK_CACHE[api_key] = (item_map, signature, masks)
+    return masks
+
+def request_item_mask(request: RecommendationRequest, api_key: str, item_map):
+    """Boolean mask over the model's item indices for the request's filters; None if it has none."""
+    categories = list(request.categories or [])
+    if request.category:
+        categories.append(request.category)
+    if not categories and not request.tags and request.min_price is None and request.max_price is None:
+        return None
+    return get_filter_masks_for_key(api_key, item_map).mask(
+        categories=categories, tags=request.tags, min_price=request.min_price, max_price=request.max_price
+    )
+
+def get_item_neighbors_for_key(api_key: str):
+    """
+    The key's precomputed item neighbors, reloaded only when item_neighbors.npz changes; None if
+    it has none. Co-occurrence keys answer from the model's own neighbor lists.
+    """
+    model_data = API_KEYS_DB.get(api_key)
+    if not model_data or not model_data.get("model_path"):
+        return None
+    if model_data.get("engine") == COOCCURRENCE_ENGINE:
+        model = get_model_and_mappings_for_key(api_key)[0]
+        refresh_cooccurrence_model(api_key, model)
+        return model
+    path = neighbors_path_for_model(model_data["model_path"])
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    cached = NEIGHBORS_CACHE.get(api_key)
+    if cached is not None and cached[0] == mtime_ns:
+        return cached[1]
+    loaded = ItemNeighbors.load(path)
+    NEIGHBORS_CACHE[api_key] = (mtime_ns, loaded)
+    return loaded
+
+def _popularity_score_vector(popularity, item_map):
+    """Popularity scores indexed like the model's items (0 for unscored ones), cached per item_map size."""
+    cached = popularity["score_vector"]
+    if cached is not None and cached[0] is item_map and cached[1] == len(item_map):
+        return cached[2]
+    scores = popularity["scores"]
+    vector = np.zeros(max(item_map.values(), default=-1) + 1, dtype=np.float64)
+    for item_id, idx in list(item_map.items()):
+        vector[idx] = scores.get(item_id, 0.0)
+    popularity["score_vector"] = (item_map, len(item_map), vector)
+    return vector
+
+def popularity_recommendations(request: RecommendationRequest, api_key: str,
+                               item_map=None, item_mask=None, idx_to_item_map=None) -> Optional[RecommendationResponse]:
+    """
+    Cold-start response for a user the model doesn't know: the top of the request's
+    category list (or the global list), or with a search_query the DB matches ordered by
+    popularity. With an item_mask, the items it selects are ranked by popularity instead,
+    so filters narrower than the precomputed lists still fill the response. None if the
+    key has no popularity lists.
+    """
+    popularity = get_popularity_for_key(api_key) if POPULARITY_FALLBACK else None
+    if popularity is None:
+        return None
+    category = request.category
+    if not category and request.categories and len(request.categories) == 1:
+        category = request.categories[0]
+    ranked = popularity["categories"].get(normalize_category(category)) if category else None
+    if ranked is None:
+        ranked = popularity["global"]
+    allowed = lambda item_id: True
+    if item_mask is not None:
+        allowed = lambda item_id: item_map.get(item_id) is not None and bool(item_mask[item_map[item_id]])
+        scores = _popularity_score_vector(popularity, item_map)
+        candidates = np.flatnonzero(item_mask[:len(scores)])
+        candidate_scores = scores[candidates]
+        if candidates.size > request.count:
+            top = np.argpartition(-candidate_scores, request.count - 1)[:request.count]
+            candidates, candidate_scores = candidates[top], candidate_scores[top]
+        order = np.lexsort((candidates, -candidate_scores)) # Best first, ties by item index
+        ranked = [RecommendationItem(item_id=idx_to_item_map[idx], score=score)
+                  for idx, score in zip(candidates[order].tolist(), candidate_scores[order].tolist())]
+
+    if request.search_query and request.search_query.strip():
+        db_search_results = [p for p in search_products_in_db(request.search_query) if allowed(p.id)]
+        if db_search_results:
+            scores = popularity["scores"]
+            ordered = sorted(enumerate(db_search_results), key=lambda pair: (-scores.get(pair[1].id, 0.0), pair[0]))
+            ranked = [RecommendationItem(item_id=p.id, score=scores.get(p.id, 0.0)) for _, p in ordered[:request.count]]
+
+    log_event(logger, logging.DEBUG, "recommendation_fallback", "Unknown user; returning popularity results",
+              user_id=request.user_id, category=request.category, search_query=request.search_query)
+    return RecommendationResponse(recommendations=ranked[:request.count], user_id=request.user_id, fallback=True)
+
+def _session_scorer(api_key, model):
+    """The NCFScorer for a loaded model; Keras models are converted once per loaded version."""
+    if isinstance(model, NCFScorer):
+        return model
+    cached = SESSION_SCORERS.get(api_key)
+    if cached is not None and cached[0] is model:
+        return cached[1]
+    scorer = NCFScorer.from_keras_model(model)
+    SESSION_SCORERS[api_key] = (model, scorer)
+    return scorer
+
+def session_user_latents(api_key, model, item_map, user_id, user_idx=None):
+    """
+    User latents folded in from the user's recent interactions, or None if session scoring
+    is off or there is nothing to fold in. Known users only use interactions logged after
+    their model was registered; those before are already in the trained embedding.
+
+    user_interactions has no tenant column (/interactions is unauthenticated) and is the
+    training data of RETRAIN_API_KEY's model, so only that key's requests read it; other
+    keys' user IDs could otherwise pick up another tenant's interactions.
+    """
+    if not SESSION_SCORING or api_key != RETRAIN_API_KEY:
+        return None
+    since = None
+    if user_idx is not None:
+        since = API_KEYS_DB.get(api_key, {}).get("updated_at")
+        if since is None:
+            return None # Can't tell which interactions the model already saw
+    try:
+        interactions = recent_interactions(INTERACTIONS_DB_PATH, user_id, since=since)
+    except sqlite3.Error as e:
+        logger.warning(f"Could not read recent interactions for session scoring: {e}")
+        return None
+    if not interactions:
+        return None
+    latents = session_latents(_session_scorer(api_key, model), item_map, interactions,
+                              user_idx=user_idx, blend=SESSION_BLEND)
+    if latents is not None:
+        log_event(logger, logging.DEBUG, "session_folded_in", "Scoring with recent interactions",
+                  user_id=user_id, interactions=len(interactions), known_user=user_idx is not None)
+    return latents
+
+def discover_models():
+    """
+    One-off migration for stores that predate the registry: registers every
+    models_store/<api_key>/ directory holding a model and its mappings (the layout
+    /v1/train writes) that isn't registered yet. Returns the newly registered keys.
+    """
+    registered = MODEL_REGISTRY.load_all()
+    discovered = []
+    for api_key in sorted(os.listdir(MODELS_BASE_DIR)):
+        model_dir = os.path.join(MODELS_BASE_DIR, api_key)
+        if api_key in registered or not os.path.isdir(model_dir):
+            continue
+        model_data = API_KEYS_DB.get(api_key) or {
+            "model_path": os.path.join(model_dir, MODEL_FILENAME),
+            "mappings_path": os.path.join(model_dir, MAPPINGS_FILENAME),
+        }
+        if not (os.path.exists(_model_artifact_path(model_data)) and os.path.exists(model_data["mappings_path"])):
+            continue
+        user_map, item_map = load_mappings(model_data["mappings_path"])
+        weights_path = model_data.get("weights_path") or weights_path_for_model(model_data["model_path"])
+        API_KEYS_DB[api_key] = {**model_data, **MODEL_REGISTRY.register(
+            api_key, model_data["model_path"], model_data["mappings_path"], len(user_map), len(item_map),
+            checksums=artifact_checksums(model_data["model_path"], model_data["mappings_path"], weights_path),
+            weights_path=weights_path, quantization=model_data.get("quantization"),
+        )}
+        discovered.append(api_key)
+    return discovered
+
+def load_registered_models():
+    """Fills API_KEYS_DB from the registry (one query); scans models_store only while the registry is empty."""
+    entries = MODEL_REGISTRY.load_all()
+    for api_key, entry in entries.items():
+        API_KEYS_DB[api_key] = {**API_KEYS_DB.get(api_key, {}), **entry}
+    if not entries:
+        discovered = discover_models()
+        if discovered:
+            logger.info(f"Registered {len(discovered)} existing model(s) found under {MODELS_BASE_DIR}")
+    return len(API_KEYS_DB)
+
+def register_model(api_key, model_path, mappings_path, num_users, num_items, checksums=None, engine=None,
+                   quantization=None):
+    """Records a newly trained model in the registry and makes it servable."""
+    current = API_KEYS_DB.get(api_key, {})
+    if checksums and current.get("checksums") == checksums:
+        return current # Already recorded (coalesced /retrain requests share one job result)
+    entry = MODEL_REGISTRY.register(
+        api_key, model_path, mappings_path, num_users, num_items, checksums=checksums,
+        weights_path=None if engine == COOCCURRENCE_ENGINE else weights_path_for_model(model_path), engine=engine,
+        quantization=quantization,
+    )
+    API_KEYS_DB[api_key] = {**API_KEYS_DB.get(api_key, {}), **entry}
+    return entry
+
+def warmup_model(api_key):
+    """Loads the key's model into MODEL_CACHE and scores one user against the full catalog."""
+    model, user_map, item_map, _, _, _ = get_model_and_mappings_for_key(api_key)
+    item_indices = np.array(list(item_map.values()))
+    if user_map and item_indices.size:
+        user_idx = next(iter(user_map.values()))
+        model.predict([np.full(len(item_indices), user_idx), item_indices], batch_size=512, verbose=0)
+
+def preload_models(max_workers=PRELOAD_MAX_WORKERS):
+    """Loads and warms up every registered model in parallel, then marks the worker ready."""
+    start = time.perf_counter()
+    READINESS.update(phase="preloading", models={}, failed={})
+    api_keys = [key for key, model_data in list(API_KEYS_DB.items())
+                if os.path.exists(_model_artifact_path(model_data)) and os.path.exists(model_data.get("mappings_path", ""))]
+
+    def load_one(api_key):
+        key_start = time.perf_counter()
+        try:
+            warmup_model(api_key)
+        except Exception as e:
+            detail = e.detail if isinstance(e, HTTPException) else str(e)
+            READINESS["failed"][api_key] = detail
+            logger.error(f"Preloading model for API key {api_key} failed: {detail}")
+            return
+        elapsed = time.perf_counter() - key_start
+        READINESS["models"][api_key] = round(elapsed, 3)
+        record_stage("preload", elapsed, endpoint="startup", api_key=api_key)
+
+    if api_keys:
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(api_keys))), thread_name_prefix="preload") as pool:
+            list(pool.map(load_one, api_keys))
+
+    READINESS.update(ready=True, phase="ready", seconds=round(time.perf_counter() - start, 3))
+    log_event(logger, logging.INFO, "models_preloaded", f"Preloaded {len(READINESS['models'])} model(s)",
+              models=len(READINESS["models"]), failed=len(READINESS["failed"]), seconds=READINESS["seconds"])
+
 # --- NEW: Helper function to search products in the database ---
 def search_products_in_db(query_term: str):
+    """
+    Timed wrapper around _query_products_db (stage 'db_search').
+    """
+    with stage_timer("db_search"):
+        return _query_products_db(query_term)
+
+def _query_products_db(query_term: str):
     """
     Searches for products in the SQLite database based on name, category, or tags.
     Args:
@@ -198,7 +764,7 @@ def search_products_in_db(query_term: str):
                     image_urls = json.loads(image_urls_json) if image_urls_json else []
                     tags = json.loads(tags_json) if tags_json else []
                 except json.JSONDecodeError:
-                    print(f"Warning: Could not decode JSON for product {product_id}. Using empty lists.")
+                    logger.warning(f"Could not decode JSON for product {product_id}. Using empty lists.")
                     image_urls = []
                     tags = []
                 all_products.append(Product(
@@ -211,7 +777,7 @@ def search_products_in_db(query_term: str):
                 ))
             return all_products
         except sqlite3.Error as e:
-            print(f"Database error fetching all products: {e}")
+            logger.error(f"Database error fetching all products: {e}")
             return []
         finally:
             if conn_all:
@@ -248,7 +814,7 @@ def search_products_in_db(query_term: str):
                 image_urls = json.loads(image_urls_json) if image_urls_json else []
                 tags = json.loads(tags_json) if tags_json else []
             except json.JSONDecodeError:
-                print(f"Warning: Could not decode JSON for product {product_id}. Using empty lists.")
+                logger.warning(f"Could not decode JSON for product {product_id}. Using empty lists.")
                 image_urls = []
                 tags = []
 
@@ -264,7 +830,7 @@ def search_products_in_db(query_term: str):
         return search_results
 
     except sqlite3.Error as e:
-        print(f"Database error during search: {e}")
+        logger.error(f"Database error during search: {e}")
         return []
     finally:
         if conn:
@@ -272,7 +838,16 @@ def search_products_in_db(query_term: str):
 
 # --- API Endpoints ---
 @app.post("/v1/train", response_model=TrainResponse)
-async def train_new_model(training_data: UploadFile = File(...)):
+async def train_new_model(training_data: UploadFile = File(...), engine: TrainingEngine = TrainingEngine.ncf,
+                          quantization: ServingPrecision = ServingPrecision.float32):
+    """
+    Trains a model for a new API key from an interactions CSV. engine=cooccurrence builds the
+    item-item co-occurrence engine instead of NCF: seconds to build, no TensorFlow, and
+    better suited to tiny or very sparse datasets. quantization=float16|int8 serves the NCF
+    model with reduced-precision embeddings (see PUT /v1/model/quantization).
+    """
+    if engine == TrainingEngine.cooccurrence and quantization != ServingPrecision.float32:
+        raise HTTPException(status_code=400, detail="quantization only applies to the ncf engine.")
     temp_file_path = None
     new_api_key_generated = None
     try:
@@ -282,33 +857,34 @@ async def train_new_model(training_data: UploadFile = File(...)):
         model_dir = os.path.join(MODELS_BASE_DIR, new_api_key)
         os.makedirs(model_dir, exist_ok=True)
 
-        model_save_path = os.path.join(model_dir, "ncf_model.h5")
-        mappings_save_path = os.path.join(model_dir, "ncf_mappings.json")
+        model_filename = COOCCURRENCE_FILENAME if engine == TrainingEngine.cooccurrence else MODEL_FILENAME
+        model_save_path = os.path.join(model_dir, model_filename)
+        mappings_save_path = os.path.join(model_dir, MAPPINGS_FILENAME)
 
         temp_file_path = f"temp_{new_api_key}_{training_data.filename}"
         with open(temp_file_path, "wb") as buffer:
             shutil.copyfileobj(training_data.file, buffer)
 
-        print(f"Training data saved to {temp_file_path}")
-
-        df_processed, user_map, item_map, num_users, num_items = load_and_preprocess_data(temp_file_path)
+        logger.info(f"Training data saved to {temp_file_path}")
 
-        if df_processed.empty or num_users == 0 or num_items == 0:
-            raise HTTPException(status_code=400, detail="Processed data is empty or no users/items found. Check data format and content.")
-
-        trained_model, training_history = train_model(
-            df_processed, num_users, num_items,
-            model_save_path=model_save_path
+        # Train in a scheduler worker process; smaller uploads are dispatched first.
+        job = training_scheduler.submit(
+            "train", new_api_key,
+            "cooccurrence:run_cooccurrence_job" if engine == TrainingEngine.cooccurrence else "train:run_training_job",
+            args=(temp_file_path, model_save_path, mappings_save_path),
+            size=os.path.getsize(temp_file_path)
         )
+        try:
+            job_result = await asyncio.wrap_future(job.future)
+        except ValueError as ve:
+            raise HTTPException(status_code=400, detail=str(ve))
+        num_users, num_items = job_result["num_users"], job_result["num_items"]
+        for stage, seconds in job_result.get("stage_seconds", {}).items():
+            record_stage(stage, seconds, endpoint="training:train", api_key=new_api_key)
 
-        save_mappings(user_map, item_map, mappings_save_path)
-
-        API_KEYS_DB[new_api_key] = {
-            "model_path": model_save_path,
-            "mappings_path": mappings_save_path,
-            "num_users": num_users,
-            "num_items": num_items
-        }
+        register_model(new_api_key, model_save_path, mappings_save_path, num_users, num_items,
+                       checksums=job_result.get("checksums"), engine=engine.value,
+                       quantization=None if quantization == ServingPrecision.float32 else quantization.value)
 
         return TrainResponse(
             message="Model training initiated and completed successfully.",
@@ -317,9 +893,11 @@ async def train_new_model(training_data: UploadFile = File(...)):
             mappings_path=mappings_save_path
         )
     except HTTPException as he:
+        if new_api_key_generated and os.path.exists(os.path.join(MODELS_BASE_DIR, new_api_key_generated)):
+             shutil.rmtree(os.path.join(MODELS_BASE_DIR, new_api_key_generated), ignore_errors=True)
         raise he
     except Exception as e:
-        print(f"An unexpected error occurred during training: {e}")
+        logger.exception(f"An unexpected error occurred during training: {e}")
         if new_api_key_generated and os.path.exists(os.path.join(MODELS_BASE_DIR, new_api_key_generated)):
              shutil.rmtree(os.path.join(MODELS_BASE_DIR, new_api_key_generated), ignore_errors=True)
         raise HTTPException(status_code=500, detail=f"An error occurred during training: {str(e)}")
@@ -330,173 +908,211 @@ async def train_new_model(training_data: UploadFile = File(...)):
             await training_data.close()
 
 
-# Replace the /recommend endpoint in your main.py with this:
-
-@app.post("/recommend", response_model=RecommendationResponse)
-async def get_recommendations_legacy(
-    request: RecommendationRequest,
-    api_key: APIKey = Depends(get_api_key)
-):
+def generate_recommendations(request: RecommendationRequest, api_key: str) -> RecommendationResponse:
     """
-    Hybrid recommendation endpoint:
+    Hybrid recommendation logic shared by /recommend and /v1/recommendations:
     1. Generates NCF recommendations based on user behavior
     2. If search_query provided, returns all DB-matching products ordered by NCF score
     3. Falls back to top-N NCF recommendations if DB search returns nothing
+    Category/tag/price filters restrict the candidates through precomputed masks (filter_masks.py).
+    Recent interactions are folded into the user vector (session_scoring.py); users missing
+    from the model with no usable session get popularity results instead (fallback=true).
+    Each stage is timed via metrics.stage_timer.
     """
-    model, user_map, item_map, idx_to_item_map, num_users, num_items = get_model_and_mappings_for_key(api_key)
+    with stage_timer("model_load"):
+        model, user_map, item_map, idx_to_item_map, num_users, num_items = get_model_and_mappings_for_key(api_key)
 
-    if request.user_id not in user_map:
+    latents = None
+    if isinstance(model, CooccurrenceModel):
+        # Logged interactions update the model itself, so there is no separate session vector
+        with stage_timer("cooccurrence_refresh"):
+            refresh_cooccurrence_model(api_key, model)
+        user_idx = user_map.get(request.user_id)
+    else:
+        user_idx = user_map.get(request.user_id)
+        with stage_timer("session_lookup"):
+            latents = session_user_latents(api_key, model, item_map, request.user_id, user_idx)
+
+    with stage_timer("filter_mask"):
+        item_mask = request_item_mask(request, api_key, item_map)
+
+    if user_idx is None and latents is None:
+        with stage_timer("popularity_fallback"):
+            fallback = popularity_recommendations(request, api_key, item_map, item_mask, idx_to_item_map)
+        if fallback is not None:
+            return fallback
         raise HTTPException(status_code=404, detail=f"User ID '{request.user_id}' not found in the model's user mapping.")
 
-    user_idx = user_map[request.user_id]
-    all_item_indices = np.array(list(item_map.values()))
-
-    if num_users is None or num_items == 0:
-         raise HTTPException(status_code=500, detail="Number of items not available for model, cannot generate candidates.")
-
-    candidate_item_indices = all_item_indices
-
-    if candidate_item_indices.size == 0:
-         raise HTTPException(status_code=404, detail="No candidate items found for recommendation.")
+    with stage_timer("id_mapping"):
+        all_item_indices = np.array(list(item_map.values()))
 
-    user_array = np.full(len(candidate_item_indices), user_idx)
-    predictions = model.predict([user_array, candidate_item_indices], batch_size=512)
+        if num_items is None or num_items == 0:
+             raise HTTPException(status_code=500, detail="Number of items not available for model, cannot generate candidates.")
 
-    # Generate NCF recommendations (scores for all candidates)
-    results = []
-    for i, item_idx_val in enumerate(candidate_item_indices):
-        original_item_id = idx_to_item_map.get(item_idx_val)
-        if original_item_id:
-             results.append({"item_id": original_item_id, "score": float(predictions[i][0])})
+        if all_item_indices.size == 0:
+             raise HTTPException(status_code=404, detail="No candidate items found for recommendation.")
 
-    # Keep a global results list sorted by score (descending)
-    results.sort(key=lambda x: x["score"], reverse=True)
-    top_n_recommendations = results[:request.count]
+        candidate_item_indices = all_item_indices
+        if item_mask is not None:
+            candidate_item_indices = all_item_indices[item_mask[all_item_indices]]
+            if candidate_item_indices.size == 0:
+                return RecommendationResponse(recommendations=[], user_id=request.user_id) # Nothing matches the filters
+
+    with stage_timer("predict"):
+        if latents is not None:
+            scorer = _session_scorer(api_key, model)
+            predictions = scorer.score_latent_candidates(*latents, candidate_item_indices[None, :])[0][:, None]
+        else:
+            user_array = np.full(len(candidate_item_indices), user_idx)
+            predictions = model.predict([user_array, candidate_item_indices], batch_size=512, verbose=0)
+
+    with stage_timer("ranking"):
+        scores = np.asarray(predictions, dtype=np.float32).reshape(-1)
+        # Top-K by score (descending, ties in candidate order) without sorting the whole catalog
+        if 0 < request.count < len(scores):
+            top = np.argpartition(-scores, request.count - 1)[:request.count]
+            top = top[np.lexsort((top, -scores[top]))]
+        else:
+            top = np.argsort(-scores, kind="stable")[:request.count]
+        top_n_recommendations = []
+        for i in top:
+            original_item_id = idx_to_item_map.get(candidate_item_indices[i])
+            if original_item_id:
+                top_n_recommendations.append({"item_id": original_item_id, "score": float(scores[i])})
 
     # HYBRID LOGIC: If search_query provided, return all DB-matching products,
     # ordered by their NCF score (score 0.0 if the model didn't score that product).
     if request.search_query and request.search_query.strip():
-        print(f"Search query provided: '{request.search_query}'. Applying hybrid ordering (DB matches ordered by NCF score)...")
         db_search_results = search_products_in_db(request.search_query)
-        print(f"DB search returned {len(db_search_results)} products")
+        if item_mask is not None:
+            db_search_results = [p for p in db_search_results
+                                 if item_map.get(p.id) is not None and item_mask[item_map[p.id]]]
 
         if db_search_results:
-            # Build a score map from all NCF results
-            score_map = {rec["item_id"]: rec["score"] for rec in results}
-            # Combine DB search results with NCF scores (default 0.0 when missing)
-            combined = []
-            for idx, p in enumerate(db_search_results):
-                s = float(score_map.get(p.id, 0.0))
-                combined.append({"item_id": p.id, "score": s, "db_index": idx})
-
-            # Sort by score desc, tiebreaker by original DB order (db_index) to preserve DB relevance for ties
-            combined.sort(key=lambda x: (-x["score"], x["db_index"]))
-            # Use top 'count' from combined list
-            top_n_recommendations = [{"item_id": c["item_id"], "score": c["score"]} for c in combined[: request.count]]
-            print(f"Returning {len(top_n_recommendations)} DB-matching products ordered by NCF score.")
-        else:
-            # DB returned nothing -> fallback to top-N NCF recommendations
-            print("DB search returned no matching products; falling back to top-N NCF recommendations.")
-            top_n_recommendations = results[: request.count]
+            with stage_timer("search_merge"):
+                # Build a score map from all NCF results
+                score_map = {idx_to_item_map.get(idx): score
+                             for idx, score in zip(candidate_item_indices.tolist(), scores.tolist())}
+                # Combine DB search results with NCF scores (default 0.0 when missing)
+                combined = []
+                for idx, p in enumerate(db_search_results):
+                    s = float(score_map.get(p.id, 0.0))
+                    combined.append({"item_id": p.id, "score": s, "db_index": idx})
+
+                # Sort by score desc, tiebreaker by original DB order (db_index) to preserve DB relevance for ties
+                combined.sort(key=lambda x: (-x["score"], x["db_index"]))
+                # Use top 'count' from combined list
+                top_n_recommendations = [{"item_id": c["item_id"], "score": c["score"]} for c in combined[: request.count]]
+        # else: DB returned nothing -> keep the top-N NCF recommendations
+        log_event(logger, logging.DEBUG, "recommendation_served",
+                  "Hybrid ordering: DB matches ordered by NCF score" if db_search_results else
+                  "DB search returned no matching products; falling back to top-N NCF recommendations",
+                  user_id=request.user_id, search_query=request.search_query,
+                  db_matches=len(db_search_results), returned=len(top_n_recommendations))
     else:
-        print("No search query provided. Returning top-N NCF recommendations.")
+        log_event(logger, logging.DEBUG, "recommendation_served", "Returning top-N NCF recommendations",
+                  user_id=request.user_id, returned=len(top_n_recommendations))
+
+    with stage_timer("serialization"):
+        return RecommendationResponse(
+            recommendations=[RecommendationItem(**item) for item in top_n_recommendations],
+            user_id=request.user_id
+        )
 
-    return RecommendationResponse(
-        recommendations=[RecommendationItem(**item) for item in top_n_recommendations],
-        user_id=request.user_id
-    )
 
+@app.post("/recommend", response_model=RecommendationResponse)
+async def get_recommendations_legacy(
+    request: RecommendationRequest,
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Hybrid recommendation endpoint (legacy path, same logic as /v1/recommendations).
+    """
+    return generate_recommendations(request, api_key)
 
-# Also update /v1/recommendations endpoint with the same logic:
 
 @app.post("/v1/recommendations", response_model=RecommendationResponse)
 async def get_recommendations(
     request: RecommendationRequest,
-    api_key: APIKey = Depends(get_api_key)
+    response: Response,
+    api_key: APIKey = Depends(get_api_key),
+    profile: bool = Depends(profiling_requested)
 ):
     """
     Hybrid recommendation endpoint (v1):
     Generates item recommendations for a given user_id with optional search filtering.
+    Admin keys can send 'X-Profile: 1' to get a timing breakdown (see /v1/profiles).
     """
     try:
-        model, user_map, item_map, idx_to_item_map, num_users, num_items = get_model_and_mappings_for_key(api_key)
-
-        if request.user_id not in user_map:
-            raise HTTPException(status_code=404, detail=f"User ID '{request.user_id}' not found in the model's user mapping.")
-
-        user_idx = user_map[request.user_id]
-        all_item_indices = np.array(list(item_map.values()))
-
-        if num_items is None or num_items == 0:
-             raise HTTPException(status_code=500, detail="Number of items not available for model, cannot generate candidates.")
-
-        candidate_item_indices = all_item_indices
-
-        if candidate_item_indices.size == 0:
-             raise HTTPException(status_code=404, detail="No candidate items found for recommendation.")
-
-        user_array = np.full(len(candidate_item_indices), user_idx)
-        predictions = model.predict([user_array, candidate_item_indices], batch_size=512)
-
-        # Generate NCF recommendations (scores for all candidates)
-        results = []
-        for i, item_idx_val in enumerate(candidate_item_indices):
-            original_item_id = idx_to_item_map.get(item_idx_val)
-            if original_item_id:
-                 results.append({"item_id": original_item_id, "score": float(predictions[i][0])})
-
-        results.sort(key=lambda x: x["score"], reverse=True)
-        top_n_recommendations = results[:request.count]
-
-        # HYBRID LOGIC: If search_query provided, return all DB-matching products,
-        # ordered by their NCF score (score 0.0 if the model didn't score that product).
-        if request.search_query and request.search_query.strip():
-            print(f"Search query provided: '{request.search_query}'. Applying hybrid ordering (DB matches ordered by NCF score)...")
-            db_search_results = search_products_in_db(request.search_query)
-            print(f"DB search returned {len(db_search_results)} products")
-
-            if db_search_results:
-                score_map = {rec["item_id"]: rec["score"] for rec in results}
-                combined = []
-                for idx, p in enumerate(db_search_results):
-                    s = float(score_map.get(p.id, 0.0))
-                    combined.append({"item_id": p.id, "score": s, "db_index": idx})
-
-                combined.sort(key=lambda x: (-x["score"], x["db_index"]))
-                top_n_recommendations = [{"item_id": c["item_id"], "score": c["score"]} for c in combined[: request.count]]
-                print(f"Returning {len(top_n_recommendations)} DB-matching products ordered by NCF score.")
-            else:
-                print("DB search returned no matching products; falling back to top-N NCF recommendations.")
-                top_n_recommendations = results[: request.count]
-        else:
-            print("No search query provided. Returning top-N NCF recommendations.")
-
-        return RecommendationResponse(
-            recommendations=[RecommendationItem(**item) for item in top_n_recommendations],
-            user_id=request.user_id
-        )
+        with request_profiler(profile, response, "/v1/recommendations", api_key):
+            return generate_recommendations(request, api_key)
     except HTTPException as he:
         raise he
     except Exception as e:
-        print(f"An unexpected error occurred during recommendation: {e}")
+        logger.exception(f"An unexpected error occurred during recommendation: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred during recommendation: {str(e)}")
 
+@app.get("/v1/items/{item_id}/similar", response_model=SimilarItemsResponse)
+async def get_similar_items(
+    item_id: str,
+    count: int = 10,
+    api_key: APIKey = Depends(get_api_key)
+):
+    """
+    Items most similar to item_id according to the key's model, from the neighbor table
+    computed after training (similar_items.py). At most similar_items.DEFAULT_TOP_K results.
+    """
+    with stage_timer("neighbors_load"):
+        neighbors = get_item_neighbors_for_key(api_key)
+    if neighbors is None:
+        raise HTTPException(status_code=404, detail="No similar-items table for this API key. Retrain the model to build it.")
+    with stage_timer("lookup"):
+        similar = neighbors.similar(item_id, max(count, 0))
+    if similar is None:
+        raise HTTPException(status_code=404, detail=f"Item ID '{item_id}' not found in the model's item mapping.")
+    with stage_timer("serialization"):
+        return SimilarItemsResponse(
+            item_id=item_id,
+            similar=[RecommendationItem(item_id=similar_id, score=score) for similar_id, score in similar]
+        )
+
+@app.put("/v1/model/quantization", response_model=QuantizationResponse)
+async def set_model_quantization(quantization: ServingPrecision, api_key: APIKey = Depends(get_api_key)):
+    """
+    Serves the calling key's NCF model with float16 or int8 embedding tables (float32 restores
+    full precision). Takes effect on the next request; check ranking agreement first with
+    inference.py.
+    """
+    if API_KEYS_DB[api_key].get("engine") == COOCCURRENCE_ENGINE:
+        raise HTTPException(status_code=400, detail="quantization only applies to the ncf engine.")
+    entry = MODEL_REGISTRY.set_quantization(api_key, None if quantization == ServingPrecision.float32 else quantization.value)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="This API key has no registered model.")
+    API_KEYS_DB[api_key] = {**API_KEYS_DB[api_key], **entry, "quantization": entry.get("quantization")}
+    log_event(logger, logging.INFO, "quantization_changed", "Changed serving precision",
+              api_key=api_key_label(api_key), quantization=quantization.value)
+    return QuantizationResponse(api_key=api_key, quantization=quantization)
+
 # --- Search Endpoint ---
 @app.post("/search", response_model=SearchResponse)
 async def search_products_endpoint(
-    query: str = Body(..., embed=True)
+    response: Response,
+    query: str = Body(..., embed=True),
+    profile: bool = Depends(profiling_requested)
 ):
     """
     Searches for products based on name, category, or tags.
     Queries the SQLite database (ecommerce.db) for results.
     This is separate from the NCF recommendation logic.
     """
-    print(f"Received search query: '{query}'")
+    log_event(logger, logging.INFO, "search_received", "Received search query", query=query)
 
-    search_results_list = search_products_in_db(query)
+    with request_profiler(profile, response, "/search", None):
+        search_results_list = search_products_in_db(query)
 
-    print(f"Returning {len(search_results_list)} search results.")
-    return SearchResponse(products=search_results_list)
+        log_event(logger, logging.INFO, "search_results", "Returning search results", query=query, results=len(search_results_list))
+        with stage_timer("serialization"):
+            return SearchResponse(products=search_results_list)
 
 # --- Interaction Tracking Endpoint ---
 @app.post("/interactions", response_model=InteractionResponse)
@@ -506,44 +1122,119 @@ async def log_interaction(
     interaction_timestamp = interaction.timestamp or time.time()
 
     try:
-        conn = sqlite3.connect(INTERACTIONS_DB_PATH)
-        c = conn.cursor()
-        c.execute('''
-            INSERT INTO user_interactions (user_id, item_id, type, timestamp)
-            VALUES (?, ?, ?, ?)
-        ''', (interaction.user_id, interaction.item_id, interaction.type, interaction_timestamp))
-        conn.commit()
-        conn.close()
-        print(f"Interaction stored in DB: User '{interaction.user_id}' performed '{interaction.type}' on item '{interaction.item_id}' at {interaction_timestamp}")
+        with stage_timer("db_insert"):
+            conn = sqlite3.connect(INTERACTIONS_DB_PATH)
+            c = conn.cursor()
+            c.execute('''
+                INSERT INTO user_interactions (user_id, item_id, type, timestamp)
+                VALUES (?, ?, ?, ?)
+            ''', (interaction.user_id, interaction.item_id, interaction.type, interaction_timestamp))
+            conn.commit()
+            conn.close()
+        log_event(logger, logging.INFO, "interaction_stored", "Interaction stored in DB",
+                  user_id=interaction.user_id, item_id=interaction.item_id,
+                  type=interaction.type.value, timestamp=interaction_timestamp)
     except sqlite3.Error as e:
-        print(f"Database error storing interaction: {e}")
+        logger.error(f"Database error storing interaction: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to store interaction in database: {str(e)}")
 
     return InteractionResponse(message="Interaction logged successfully", success=True)
 
 # --- Retrain Model Endpoint ---
-executor = ThreadPoolExecutor(max_workers=1)
-
-from retrain_model import retrain_model_with_new_data
+training_scheduler = TrainingScheduler()
 
 @app.post("/retrain", dependencies=[Depends(get_api_key)])
-async def trigger_retrain():
-    print("Retrain endpoint called. Initiating retraining in background thread...")
+async def trigger_retrain(engine: Optional[TrainingEngine] = None):
+    """
+    Rebuilds RETRAIN_API_KEY's model from the interaction log with the engine recorded for it
+    in the registry; passing engine switches the key to that engine.
+    """
+    logger.info("Retrain endpoint called. Queueing retraining job...")
 
     try:
-        loop = asyncio.get_event_loop()
-        await loop.run_in_executor(executor, retrain_model_with_new_data)
-
-        print("Retraining process initiated/completed in background thread.")
-        return {"message": "Model retraining process initiated successfully.", "status": "started"}
+        # Concurrent retrain requests for the same engine are coalesced into one queued job for the key.
+        size = sum(os.path.getsize(p) for p in (INTERACTIONS_DB_PATH,) if os.path.exists(p))
+        engine = engine.value if engine else API_KEYS_DB.get(RETRAIN_API_KEY, {}).get("engine", TrainingEngine.ncf.value)
+        job = training_scheduler.submit(
+            "retrain", RETRAIN_API_KEY, "retrain_model:retrain_model_with_new_data",
+            args=(engine,), size=size, coalesce=True
+        )
+        result = await asyncio.wrap_future(job.future)
+        if result and result.get("accepted", True):
+            entry = register_model(result["api_key"], result["model_path"], result["mappings_path"],
+                                   result["num_users"], result["num_items"], checksums=result["checksums"],
+                                   engine=result.get("engine"))
+            logger.info(f"Registered retrained model for API key {result['api_key']} as version {entry['version']}")
+        elif result:
+            log_event(logger, logging.WARNING, "retrain_rejected", "Retrained model failed the ranking gate; keeping the current model",
+                      api_key=result["api_key"], **result["evaluation"])
+
+        logger.info("Retraining process initiated/completed in background worker.")
+        return {"message": "Model retraining process initiated successfully.", "status": "started", "job_id": job.job_id,
+                "accepted": result.get("accepted") if result else None,
+                "evaluation": result.get("evaluation") if result else None}
     except Exception as e:
-        print(f"Error initiating retraining process: {e}")
+        logger.error(f"Error initiating retraining process: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to start retraining: {str(e)}")
 
+@app.get("/v1/jobs", dependencies=[Depends(get_admin_api_key)])
+async def get_training_jobs():
+    """Training scheduler status: queue depth, running jobs and job wall-times. Admin keys only."""
+    return training_scheduler.stats()
+
+@app.get("/v1/jobs/{job_id}")
+async def get_training_job(job_id: str, api_key: APIKey = Depends(get_api_key)):
+    """One job's status, for the key it trains (its owner) or an admin key."""
+    job = training_scheduler.get_job(job_id)
+    if job is None or (job.api_key != api_key and api_key not in ADMIN_API_KEYS):
+        # Other tenants' jobs are reported as missing rather than forbidden
+        raise HTTPException(status_code=404, detail=f"Job '{job_id}' not found.")
+    return job.to_dict()
+
+@app.on_event("startup")
+async def startup_event():
+    init_databases()
+    load_registered_models()
+    if PRELOAD_MODELS:
+        # In the background so the server can answer /ready (503) while models load
+        threading.Thread(target=preload_models, name="model-preload", daemon=True).start()
+    else:
+        READINESS.update(ready=True, phase="ready")
+
+@app.get("/ready")
+async def readiness():
+    """Readiness probe: 200 once startup (and model preload/warmup, if enabled) has finished."""
+    status_code = 200 if READINESS["ready"] else 503
+    return JSONResponse(status_code=status_code, content={
+        "status": "ready" if READINESS["ready"] else "not_ready",
+        "phase": READINESS["phase"],
+        "models_loaded": len(READINESS["models"]),
+        "models_failed": len(READINESS["failed"]), # Keyed by API key; details are only logged
+        "preload_seconds": READINESS["seconds"],
+    })
+
 @app.on_event("shutdown")
 async def shutdown_event():
-    executor.shutdown(wait=True)
-    print("ThreadPoolExecutor for retraining shut down.")
+    training_scheduler.shutdown(wait=True)
+    _cooccurrence_refresher.submit(lambda: None).result() # Let a running catch-up publish first
+    save_cooccurrence_states()
+    logger.info("Training scheduler shut down.")
+
+@app.get("/v1/profiles/{profile_id}")
+async def get_profile(profile_id: str, api_key: APIKey = Depends(get_admin_api_key)):
+    """Returns a stored per-request profile (stage breakdown and hottest functions)."""
+    report = PROFILE_STORE.get(profile_id)
+    if report is None:
+        raise HTTPException(status_code=404, detail=f"Profile '{profile_id}' not found or expired.")
+    return report
+
+@app.get("/metrics", dependencies=[Depends(get_admin_api_key)])
+async def get_metrics():
+    """
+    Request, stage and training-job latency histograms in Prometheus text format. Admin keys
+    only; tenants appear as opaque metrics.api_key_label values.
+    """
+    return Response(content=REGISTRY.render(), media_type=PROMETHEUS_CONTENT_TYPE)
 
 @app.get("/")
 async def root():
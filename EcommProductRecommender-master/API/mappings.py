@@ -0,0 +1,24 @@
+# mappings.py
+import json
+import logging
+
+# Kept free of TensorFlow/pandas imports so the serving path can load mappings cheaply.
+from logging_setup import get_logger, log_event
+
+logger = get_logger("mappings")
+
+def save_mappings(user_map, item_map, file_path):
+    mappings = {
+        'user_map': user_map,
+        'item_map': item_map
+    }
+    with open(file_path, 'w') as f:
+        json.dump(mappings, f)
+    log_event(logger, logging.INFO, "mappings_saved", "Mappings saved",
+              path=file_path, users=len(user_map), items=len(item_map))
+
+def load_mappings(file_path):
+    with open(file_path, 'r') as f:
+        mappings = json.load(f)
+    log_event(logger, logging.DEBUG, "mappings_loaded", "Mappings loaded", path=file_path)
+    return mappings['user_map'], mappings['item_map']
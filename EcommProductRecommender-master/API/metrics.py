@@ -0,0 +1,208 @@
+# metrics.py
+import bisect
+import contextvars
+import functools
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+# --- Configuration ---
+DEFAULT_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                           1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0, 1800.0)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+UNKNOWN_API_KEY_LABEL = "unknown"
+API_KEY_LABEL_HEX_DIGITS = 12 # Truncated SHA-256 of the key; enough to tell tenants apart
+
+
+def _escape_label_value(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labelnames, labelvalues, extra=()):
+    pairs = list(zip(labelnames, labelvalues)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape_label_value(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labelvalues=(), amount=1.0):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0.0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labelvalues, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labelvalues)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {} # labelvalues -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, labelvalues=()):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labelvalues)
+            if series is None:
+                series = self._series[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((k, list(v)) for k, v in self._series.items())
+        for labelvalues, series in snapshot:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = bound if bound == "+Inf" else repr(float(bound))
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, [('le', le)])} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {series[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_LATENCY_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+REQUESTS_TOTAL = REGISTRY.counter(
+    "recsys_requests_total", "HTTP requests handled.", ("endpoint", "api_key", "status"))
+REQUEST_DURATION = REGISTRY.histogram(
+    "recsys_request_duration_seconds", "End-to-end HTTP request latency.", ("endpoint", "api_key"))
+STAGE_DURATION = REGISTRY.histogram(
+    "recsys_stage_duration_seconds", "Latency of individual request and training stages.", ("endpoint", "stage", "api_key"))
+
+
+@functools.lru_cache(maxsize=4096)
+def api_key_label(api_key):
+    """
+    The metrics label for an API key: an opaque truncated SHA-256, never the key itself
+    (the keys are the tenants' credentials). Empty and the unknown-key label pass through.
+    """
+    if not api_key or api_key == UNKNOWN_API_KEY_LABEL:
+        return api_key or ""
+    return "key-" + hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:API_KEY_LABEL_HEX_DIGITS]
+
+
+class RequestContext:
+    """Per-request labels plus the stage timings accumulated while handling it."""
+
+    def __init__(self, scope, api_key):
+        self.scope = scope
+        self.api_key = api_key
+        self.stages = {}
+
+    @property
+    def endpoint(self):
+        # The router stores the matched route in the scope; use its template, never the raw path.
+        route = self.scope.get("route")
+        return getattr(route, "path", "unmatched")
+
+
+_current_request = contextvars.ContextVar("metrics_current_request", default=None)
+
+
+def current_request():
+    return _current_request.get()
+
+
+def record_stage(stage, seconds, endpoint=None, api_key=None):
+    context = _current_request.get()
+    if context is not None:
+        context.stages[stage] = context.stages.get(stage, 0.0) + seconds
+        endpoint = endpoint or context.endpoint
+        api_key = api_key_label(api_key) if api_key is not None else context.api_key
+    else:
+        api_key = api_key_label(api_key)
+    STAGE_DURATION.observe(seconds, (endpoint or "none", stage, api_key or ""))
+
+
+@contextmanager
+def stage_timer(stage, endpoint=None, api_key=None):
+    """Times the enclosed block as one stage of the current request (or of endpoint, if given)."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - start, endpoint, api_key)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording request counts and latency per endpoint and API key.
+    Only keys accepted by is_known_key are labelled (by api_key_label), so invalid keys
+    can't blow up the number of series.
+    """
+
+    def __init__(self, app, api_key_header, is_known_key):
+        self.app = app
+        self.api_key_header = api_key_header.lower().encode("latin-1")
+        self.is_known_key = is_known_key
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        api_key = ""
+        for name, value in scope.get("headers", ()):
+            if name == self.api_key_header:
+                key = value.decode("latin-1")
+                api_key = api_key_label(key) if self.is_known_key(key) else UNKNOWN_API_KEY_LABEL
+                break
+
+        context = RequestContext(scope, api_key)
+        token = _current_request.set(context)
+        status = [500]
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current_request.reset(token)
+            REQUEST_DURATION.observe(elapsed, (context.endpoint, api_key))
+            REQUESTS_TOTAL.inc((context.endpoint, api_key, str(status[0])))
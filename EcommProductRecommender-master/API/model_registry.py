@@ -0,0 +1,178 @@
+# model_registry.py
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+# --- Configuration ---
+REGISTRY_FILENAME = "registry.db" # Stored inside MODELS_BASE_DIR
+DEFAULT_ENGINE = "ncf" # Recommendation engine of keys registered without one ('ncf' or 'cooccurrence')
+CHECKSUM_CHUNK_SIZE = 1 << 20
+
+
+def file_sha256(path):
+    """Hex SHA-256 of a file, or None if it doesn't exist."""
+    if not path or not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def artifact_checksums(model_path, mappings_path, weights_path=None):
+    """Checksums in the shape ModelRegistry.register expects. Cheap enough to run in the training worker."""
+    return {
+        "model": file_sha256(model_path),
+        "mappings": file_sha256(mappings_path),
+        "weights": file_sha256(weights_path),
+    }
+
+
+class ModelRegistry:
+    """
+    Persistent record of each API key's current model: version, engine, file paths,
+    user/item counts and artifact checksums. The API reads every row once at startup (one indexed
+    table scan, no per-tenant file parsing) and writes a row whenever a model changes.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._init_db()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _init_db(self):
+        conn = self._connect()
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS models (
+                api_key TEXT PRIMARY KEY,
+                version INTEGER NOT NULL,
+                model_path TEXT NOT NULL,
+                mappings_path TEXT NOT NULL,
+                weights_path TEXT,
+                num_users INTEGER NOT NULL,
+                num_items INTEGER NOT NULL,
+                quantization TEXT,
+                model_sha256 TEXT,
+                mappings_sha256 TEXT,
+                weights_sha256 TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                engine TEXT NOT NULL DEFAULT 'ncf'
+            )
+        ''')
+        # Registries created before per-key engines existed
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(models)")}
+        if "engine" not in columns:
+            conn.execute(f"ALTER TABLE models ADD COLUMN engine TEXT NOT NULL DEFAULT '{DEFAULT_ENGINE}'")
+        conn.commit()
+        conn.close()
+
+    @staticmethod
+    def _row_to_entry(row):
+        """Converts a row to the API_KEYS_DB entry format used by main.py."""
+        entry = {
+            "model_path": row["model_path"],
+            "mappings_path": row["mappings_path"],
+            "num_users": row["num_users"],
+            "num_items": row["num_items"],
+            "version": row["version"],
+            "engine": row["engine"],
+            "checksums": {
+                "model": row["model_sha256"],
+                "mappings": row["mappings_sha256"],
+                "weights": row["weights_sha256"],
+            },
+            "updated_at": row["updated_at"],
+        }
+        if row["weights_path"]:
+            entry["weights_path"] = row["weights_path"]
+        if row["quantization"]:
+            entry["quantization"] = row["quantization"]
+        return entry
+
+    def load_all(self):
+        """Returns {api_key: entry} for every registered key."""
+        conn = self._connect()
+        try:
+            rows = conn.execute("SELECT * FROM models").fetchall()
+        finally:
+            conn.close()
+        return {row["api_key"]: self._row_to_entry(row) for row in rows}
+
+    def get(self, api_key):
+        conn = self._connect()
+        try:
+            row = conn.execute("SELECT * FROM models WHERE api_key = ?", (api_key,)).fetchone()
+        finally:
+            conn.close()
+        return self._row_to_entry(row) if row else None
+
+    def register(self, api_key, model_path, mappings_path, num_users, num_items,
+                 checksums=None, weights_path=None, quantization=None, engine=None):
+        """
+        Inserts the key at version 1, or bumps its version and replaces paths, counts and
+        checksums. Existing quantization and engine settings are kept unless new ones are
+        given (new keys default to DEFAULT_ENGINE). Returns the stored entry.
+        """
+        checksums = checksums or {}
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute('''
+                    INSERT INTO models (api_key, version, model_path, mappings_path, weights_path,
+                                        num_users, num_items, quantization,
+                                        model_sha256, mappings_sha256, weights_sha256, created_at, updated_at, engine)
+                    VALUES (?, 1, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, COALESCE(?, ?))
+                    ON CONFLICT(api_key) DO UPDATE SET
+                        version = models.version + 1,
+                        model_path = excluded.model_path,
+                        mappings_path = excluded.mappings_path,
+                        weights_path = excluded.weights_path,
+                        num_users = excluded.num_users,
+                        num_items = excluded.num_items,
+                        quantization = COALESCE(excluded.quantization, models.quantization),
+                        model_sha256 = excluded.model_sha256,
+                        mappings_sha256 = excluded.mappings_sha256,
+                        weights_sha256 = excluded.weights_sha256,
+                        updated_at = excluded.updated_at,
+                        engine = COALESCE(?, models.engine)
+                ''', (api_key, model_path, mappings_path, weights_path, int(num_users), int(num_items), quantization,
+                      checksums.get("model"), checksums.get("mappings"), checksums.get("weights"), now, now,
+                      engine, DEFAULT_ENGINE, engine))
+                conn.commit()
+            finally:
+                conn.close()
+        return self.get(api_key)
+
+    def set_quantization(self, api_key, quantization):
+        """
+        Sets the precision the key's NCF model is served at (None = full precision) without
+        bumping its version. Returns the updated entry, or None if the key isn't registered.
+        """
+        with self._lock:
+            conn = self._connect()
+            try:
+                # updated_at is left alone: it marks when the model was trained (see session scoring)
+                conn.execute("UPDATE models SET quantization = ? WHERE api_key = ?", (quantization, api_key))
+                conn.commit()
+            finally:
+                conn.close()
+        return self.get(api_key)
+
+    def delete(self, api_key):
+        with self._lock:
+            conn = self._connect()
+            try:
+                conn.execute("DELETE FROM models WHERE api_key = ?", (api_key,))
+                conn.commit()
+            finally:
+                conn.close()
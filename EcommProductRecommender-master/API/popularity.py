@@ -0,0 +1,91 @@
+# popularity.py
+import json
+import os
+import sqlite3
+import time
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+POPULARITY_FILENAME = "popularity.json" # Stored next to the key's model
+DEFAULT_POPULARITY_TOP_N = 100 # Items kept per list (global and per category)
+PRODUCTS_DB_PATH = "ecommerce.db"
+
+
+def popularity_path_for_model(model_path):
+    """Where the popularity lists for a Keras model file are stored."""
+    return os.path.join(os.path.dirname(model_path), POPULARITY_FILENAME)
+
+
+def normalize_category(category):
+    """Category key as stored and looked up: matching is case-insensitive, like filter_masks."""
+    return str(category).strip().casefold()
+
+
+def load_item_categories(db_path=PRODUCTS_DB_PATH):
+    """{item_id: normalized category} from the products table; empty if the database isn't there."""
+    if not os.path.exists(db_path):
+        return {}
+    conn = sqlite3.connect(db_path)
+    try:
+        rows = conn.execute("SELECT id, category FROM products WHERE category IS NOT NULL AND category != ''")
+        return {item_id: normalize_category(category) for item_id, category in rows}
+    except sqlite3.Error:
+        return {}
+    finally:
+        conn.close()
+
+
+def _top_n(scores, top_n):
+    if len(scores) > top_n:
+        scores = scores.nlargest(top_n)
+    scores = scores.sort_values(ascending=False, kind="stable")
+    return [[str(item_id), float(score)] for item_id, score in scores.items()]
+
+
+def compute_popularity(item_ids, weights, item_categories=None, top_n=DEFAULT_POPULARITY_TOP_N):
+    """
+    Ranks items by their summed interaction weight, globally and within each category.
+
+    Args:
+        item_ids (array-like): Item ID per interaction (or per aggregated (user, item) row).
+        weights (array-like or float): Weight per row, e.g. the type-weighted, time-decayed
+                                       'weight' from train.aggregate_interactions.
+        item_categories (dict): Optional {item_id: category}; uncategorized items are only
+                                ranked globally. Categories are keyed by normalize_category.
+        top_n (int): Items kept per list.
+
+    Returns:
+        dict: 'global' and 'categories' ({category: list}) lists of [item_id, score],
+              best first, 'scores' ({item_id: score} for every item, so filtered requests
+              can rank beyond the lists), plus 'top_n' and 'computed_at'.
+    """
+    item_ids = pd.Series(np.asarray(item_ids)).astype(str)
+    weights = pd.Series(np.broadcast_to(np.asarray(weights, dtype=np.float64), (len(item_ids),)))
+    scores = weights.groupby(item_ids.to_numpy(), sort=False).sum()
+    scores = scores[scores > 0]
+
+    categories = {}
+    if item_categories:
+        category_of = scores.index.map(
+            lambda item_id: normalize_category(item_categories[item_id]) if item_categories.get(item_id) else ""
+        )
+        for category, category_scores in scores.groupby(np.asarray(category_of, dtype=object), sort=False):
+            if category:
+                categories[category] = _top_n(category_scores, top_n)
+    return {"global": _top_n(scores, top_n), "categories": categories,
+            "scores": {str(item_id): float(score) for item_id, score in scores.items()},
+            "top_n": top_n, "computed_at": time.time()}
+
+
+def save_popularity(popularity, path):
+    """Writes the lists atomically so the API never reads a partial file."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        json.dump(popularity, f)
+    os.replace(temp_path, path)
+
+
+def load_popularity(path):
+    with open(path) as f:
+        return json.load(f)
@@ -0,0 +1,132 @@
+# preprocess_cache.py
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+import pandas as pd
+
+from model_registry import CHECKSUM_CHUNK_SIZE
+
+# --- Configuration ---
+CACHE_FORMAT_VERSION = 1 # Bump when load_and_preprocess_data's output changes
+PREPROCESS_CACHE_DIR = os.environ.get("PREPROCESS_CACHE_DIR", os.path.join("models_store", ".preprocess_cache"))
+PREPROCESS_CACHE_MAX_MB = float(os.environ.get("PREPROCESS_CACHE_MAX_MB", "1024")) # 0 disables the cache
+META_FILENAME = "meta.json"
+USER_IDS_FILENAME = "user_ids.npy"
+ITEM_IDS_FILENAME = "item_ids.npy"
+
+
+def _id_array(index_map):
+    """{id: index} (insertion order == index order) -> array of ids, or None if not cacheable."""
+    ids = np.asarray(list(index_map.keys()))
+    if ids.dtype == object:
+        return None # Mixed or non-scalar ids; would need pickling
+    return ids
+
+
+class PreprocessCache:
+    """
+    On-disk cache of load_and_preprocess_data results, keyed by a fingerprint of the input
+    data plus the preprocessing parameters. Each entry is a directory of .npy columns
+    (user_idx, item_idx, label, ...) and the ordered user/item ID tables. Entries are
+    evicted least-recently-used first once the cache exceeds max_bytes.
+    """
+
+    def __init__(self, cache_dir=PREPROCESS_CACHE_DIR, max_bytes=int(PREPROCESS_CACHE_MAX_MB * 1024 * 1024)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def fingerprint(data, **params):
+        """
+        SHA-256 over the input content and params. A str is treated as a file path and
+        hashed by content (not name or mtime), so re-uploads of the same CSV still hit.
+        """
+        digest = hashlib.sha256()
+        digest.update(json.dumps({"format": CACHE_FORMAT_VERSION, **params}, sort_keys=True).encode())
+        if isinstance(data, str):
+            digest.update(b"csv:")
+            with open(data, "rb") as f:
+                for chunk in iter(lambda: f.read(CHECKSUM_CHUNK_SIZE), b""):
+                    digest.update(chunk)
+        else:
+            frame = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+            digest.update(b"frame:" + json.dumps([[str(c), str(t)] for c, t in frame.dtypes.items()]).encode())
+            digest.update(pd.util.hash_pandas_object(frame, index=False).to_numpy().tobytes())
+        return digest.hexdigest()
+
+    def _entry_dir(self, key):
+        return os.path.join(self.cache_dir, key)
+
+    def get(self, key):
+        """The cached (df_processed, user_map, item_map, num_users, num_items) tuple, or None."""
+        entry_dir = self._entry_dir(key)
+        try:
+            with open(os.path.join(entry_dir, META_FILENAME)) as f:
+                meta = json.load(f)
+            columns = {column: np.load(os.path.join(entry_dir, f"{column}.npy")) for column in meta["columns"]}
+            user_ids = np.load(os.path.join(entry_dir, USER_IDS_FILENAME)).tolist()
+            item_ids = np.load(os.path.join(entry_dir, ITEM_IDS_FILENAME)).tolist()
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(entry_dir) # Marks the entry as recently used
+        user_map = {user_id: idx for idx, user_id in enumerate(user_ids)}
+        item_map = {item_id: idx for idx, item_id in enumerate(item_ids)}
+        return pd.DataFrame(columns), user_map, item_map, meta["num_users"], meta["num_items"]
+
+    def put(self, key, result):
+        """Stores a load_and_preprocess_data result and evicts old entries. Returns False if not cacheable."""
+        df_processed, user_map, item_map, num_users, num_items = result
+        user_ids, item_ids = _id_array(user_map), _id_array(item_map)
+        columns = {str(column): df_processed[column].to_numpy() for column in df_processed.columns}
+        if user_ids is None or item_ids is None or self.max_bytes <= 0 or \
+                any(values.dtype == object for values in columns.values()):
+            return False
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entry_dir = self._entry_dir(key)
+        if os.path.isdir(entry_dir):
+            return True
+        temp_dir = os.path.join(self.cache_dir, f".tmp-{uuid.uuid4().hex}")
+        os.makedirs(temp_dir)
+        try:
+            for column, values in columns.items():
+                np.save(os.path.join(temp_dir, f"{column}.npy"), values)
+            np.save(os.path.join(temp_dir, USER_IDS_FILENAME), user_ids)
+            np.save(os.path.join(temp_dir, ITEM_IDS_FILENAME), item_ids)
+            with open(os.path.join(temp_dir, META_FILENAME), "w") as f:
+                json.dump({"columns": list(columns), "num_users": int(num_users),
+                           "num_items": int(num_items), "created_at": time.time()}, f)
+            os.rename(temp_dir, entry_dir)
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors=True) # Includes losing a race with another writer
+            return os.path.isdir(entry_dir)
+        self.evict(keep=key)
+        return True
+
+    def evict(self, keep=None):
+        """Deletes least-recently-used entries until the cache fits in max_bytes."""
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            size = sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+            entries.append((os.stat(path).st_mtime, name, size))
+        total = sum(size for _, _, size in entries)
+        for _, name, size in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            if name == keep:
+                continue
+            shutil.rmtree(os.path.join(self.cache_dir, name), ignore_errors=True)
+            total -= size
+
+
+def default_preprocess_cache():
+    """The cache configured by PREPROCESS_CACHE_DIR / PREPROCESS_CACHE_MAX_MB, or None if disabled."""
+    if PREPROCESS_CACHE_MAX_MB <= 0:
+        return None
+    return PreprocessCache()
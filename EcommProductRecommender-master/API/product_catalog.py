@@ -0,0 +1,123 @@
+# product_catalog.py
+import hashlib
+import json
+
+# --- Configuration ---
+PRODUCT_COLUMNS = ("id", "name", "price", "category", "image_urls", "tags")
+READ_SIZE = 1 << 20 # Characters read per refill when streaming a JSON/JSONL file
+SQLITE_MAX_PARAMS = 500 # Ids per "IN (...)" lookup; well below SQLite's variable limit
+_ENCODER = json.JSONEncoder() # Reused: json.dumps builds a new encoder per call with non-default args
+
+
+class ProductValidationError(ValueError):
+    """Raised when a product record is missing required fields or has invalid values."""
+
+
+def normalize_product(product):
+    """
+    Validates a product dict and converts it to a products-table row (tuple in
+    PRODUCT_COLUMNS order, with image URLs and tags JSON-encoded). Accepts the
+    products.json spelling 'imageUrls' as well as 'image_urls'.
+
+    Raises:
+        ProductValidationError: If id or name is empty, or price is missing, invalid or negative.
+    """
+    if not isinstance(product, dict):
+        raise ProductValidationError(f"Expected a JSON object, got {type(product).__name__}")
+    product_id = product.get('id')
+    name = product.get('name')
+    price = product.get('price')
+    if not product_id or not name or price is None or price == "": # Price can be 0
+        raise ProductValidationError(f"Product needs id, name and price: {product}")
+    try:
+        price = float(price)
+    except (TypeError, ValueError):
+        raise ProductValidationError(f"Invalid price {price!r} for product {product_id}")
+    if price < 0:
+        raise ProductValidationError(f"Negative price {price} for product {product_id}")
+    image_urls = product.get('imageUrls', product.get('image_urls')) or []
+    tags = product.get('tags') or []
+    return (str(product_id), str(name), price, product.get('category'), _ENCODER.encode(image_urls), _ENCODER.encode(tags))
+
+
+def product_content_hash(row):
+    """Stable hash of a normalized product row; equal hashes mean nothing to write."""
+    # Fields are already strings/JSON except price and category; \x1f can't appear in JSON text
+    product_id, name, price, category, image_urls_json, tags_json = row
+    key = "\x1f".join((product_id, name, repr(price), "\x00" if category is None else str(category),
+                       image_urls_json, tags_json))
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def ensure_content_hash_column(conn):
+    """Adds products.content_hash to databases created before the column existed."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(products)")}
+    if "content_hash" not in columns:
+        conn.execute("ALTER TABLE products ADD COLUMN content_hash TEXT")
+        conn.commit()
+
+
+def fetch_content_hashes(conn, product_ids):
+    """{id: content_hash} for the given ids that exist (hash is None for rows never hashed)."""
+    hashes = {}
+    product_ids = list(product_ids)
+    for start in range(0, len(product_ids), SQLITE_MAX_PARAMS):
+        chunk = product_ids[start:start + SQLITE_MAX_PARAMS]
+        placeholders = ",".join("?" * len(chunk))
+        hashes.update(conn.execute(f"SELECT id, content_hash FROM products WHERE id IN ({placeholders})", chunk))
+    return hashes
+
+
+def iter_json_records(path, read_size=READ_SIZE):
+    """
+    Streams the objects of a JSON array file or a JSONL/concatenated-JSON file without
+    loading the whole file, using JSONDecoder.raw_decode over a sliding buffer.
+
+    Raises:
+        json.JSONDecodeError: On malformed input.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, 'r', encoding='utf-8') as f:
+        buffer, pos, eof = "", 0, False
+        in_array = None # Decided by the first non-whitespace character
+
+        def refill():
+            nonlocal buffer, pos, eof
+            chunk = f.read(read_size)
+            if not chunk:
+                eof = True
+            buffer = buffer[pos:] + chunk
+            pos = 0
+
+        while True:
+            # Skip whitespace (and separators inside a top-level array)
+            while True:
+                while pos < len(buffer) and (buffer[pos].isspace() or (in_array and buffer[pos] == ',')):
+                    pos += 1
+                if pos < len(buffer) or eof:
+                    break
+                refill()
+            if pos >= len(buffer):
+                if in_array:
+                    raise json.JSONDecodeError("Unterminated top-level array", buffer, pos)
+                return
+            if in_array is None:
+                in_array = buffer[pos] == '['
+                if in_array:
+                    pos += 1
+                    continue
+            if in_array and buffer[pos] == ']':
+                return
+
+            try:
+                record, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                refill() # The record may continue past the end of the buffer
+                continue
+            if end == len(buffer) and not eof and not isinstance(record, (dict, list)):
+                refill() # A bare scalar could be cut off mid-token
+                continue
+            pos = end
+            yield record
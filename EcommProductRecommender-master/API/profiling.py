@@ -0,0 +1,97 @@
+# profiling.py
+import cProfile
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from metrics import api_key_label, current_request
+
+# --- Configuration ---
+PROFILE_HEADER = "X-Profile"
+PROFILE_ID_HEADER = "X-Profile-Id"
+PROFILE_SUMMARY_HEADER = "X-Profile-Summary"
+PROFILE_STORE_SIZE = 100 # Most recent profiles kept for /v1/profiles/{profile_id}
+PROFILE_TOP_FUNCTIONS = 25
+
+
+class ProfileStore:
+    """Bounded, thread-safe store of recent profile reports, oldest evicted first."""
+
+    def __init__(self, max_size=PROFILE_STORE_SIZE):
+        self.max_size = max_size
+        self._reports = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, profile_id, report):
+        with self._lock:
+            self._reports[profile_id] = report
+            while len(self._reports) > self.max_size:
+                self._reports.popitem(last=False)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._reports.get(profile_id)
+
+
+PROFILE_STORE = ProfileStore()
+
+
+def is_profile_requested(header_value):
+    return bool(header_value) and header_value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _top_functions(profiler, limit=PROFILE_TOP_FUNCTIONS):
+    stats = pstats.Stats(profiler)
+    rows = []
+    for (filename, line, func), (_, calls, total, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{filename}:{line}({func})",
+            "calls": calls,
+            "total_ms": total * 1000.0,
+            "cumulative_ms": cumulative * 1000.0,
+        })
+    rows.sort(key=lambda r: r["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def _summary_header(total_ms, stages_ms):
+    parts = [f"total={total_ms:.2f}ms"] + [f"{stage}={ms:.2f}ms" for stage, ms in stages_ms.items()]
+    return ";".join(parts)
+
+
+@contextmanager
+def request_profiler(enabled, response, endpoint, api_key):
+    """
+    Profiles the enclosed block with cProfile when enabled. The report (total time,
+    per-stage breakdown from metrics.stage_timer, hottest functions) is stored in
+    PROFILE_STORE; its ID and a compact stage summary are set as response headers.
+    """
+    if not enabled:
+        yield
+        return
+
+    profile_id = str(uuid.uuid4())
+    profiler = cProfile.Profile()
+    start = time.perf_counter()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        total_ms = (time.perf_counter() - start) * 1000.0
+        context = current_request()
+        stages_ms = {stage: seconds * 1000.0 for stage, seconds in (context.stages if context else {}).items()}
+        PROFILE_STORE.put(profile_id, {
+            "profile_id": profile_id,
+            "endpoint": endpoint,
+            "api_key": api_key_label(api_key), # Readable by every admin key; never the key itself
+            "created_at": time.time(),
+            "total_ms": total_ms,
+            "stages_ms": stages_ms,
+            "top_functions": _top_functions(profiler),
+        })
+        response.headers[PROFILE_ID_HEADER] = profile_id
+        response.headers[PROFILE_SUMMARY_HEADER] = _summary_header(total_ms, stages_ms)
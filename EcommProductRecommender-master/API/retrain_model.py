@@ -1,51 +1,85 @@
 # retrain_model.py
 import pandas as pd
-import sqlite3
 import os
+import time
 import numpy as np  # Import numpy for negative sampling logic if needed
 
 # --- NEW: Absolute imports for train.py functions ---
-from train import load_and_preprocess_data, train_model, save_mappings, load_mappings
+from train import load_and_preprocess_data, load_interactions_csv, train_model, save_mappings, load_mappings, make_negative_sampler, aggregate_interactions
+from inference import NCFScorer, export_ncf_weights, save_ncf_weights, weights_path_for_model
+from model_registry import artifact_checksums
+from serving_bundle import write_bundle, bundle_path_for_model
+from evaluation import leave_last_out_split, evaluate_ranking
+from preprocess_cache import default_preprocess_cache
+from session_scoring import INTERACTION_WEIGHTS # Shared with real-time session scoring in the API
+from popularity import compute_popularity, load_item_categories, save_popularity, popularity_path_for_model
+from similar_items import build_item_neighbors, neighbors_path_for_model
+from interaction_archive import ARCHIVE_DIR, compact_interactions, read_interactions
+from cooccurrence import ENGINE_NAME as COOCCURRENCE_ENGINE, COOCCURRENCE_FILENAME, CooccurrenceModel, save_cooccurrence_model
 
 # --- Configuration ---
 ORIGINAL_DATA_PATH = "dummy_interactions.csv"
 DATABASE_PATH = "user_interactions.db"
+PRODUCTS_DB_PATH = "ecommerce.db" # Item categories for the per-category popularity lists
 MODELS_BASE_DIR = "models_store"
 API_KEY_TO_UPDATE = "testkey123"  # The API key whose model we want to update
+# Ranking gate (0 = off): the model is trained without each user's most recent interaction, evaluated
+# on it (leave-last-out) and only replaces the served model if HR@K reaches this value. Ranking the
+# held-out item among 100 sampled candidates at random scores about K/101 (~0.10 for K=10), so the
+# default rejects models that are not clearly better than chance. Lower it when evaluating against
+# the full catalog (RETRAIN_EVAL_CANDIDATES=0).
+RETRAIN_MIN_HIT_RATE = float(os.environ.get("RETRAIN_MIN_HIT_RATE", "0.15"))
+RETRAIN_EVAL_K = int(os.environ.get("RETRAIN_EVAL_K", "10"))
+RETRAIN_EVAL_CANDIDATES = int(os.environ.get("RETRAIN_EVAL_CANDIDATES", "100")) # 0 = full catalog
+# A model that passes the gate is served as is, so it has not learned from each user's single
+# latest interaction (until the next retrain). RETRAIN_FULL_DATA=1 instead retrains on every
+# interaction before saving, which doubles training time.
+RETRAIN_FULL_DATA = os.environ.get("RETRAIN_FULL_DATA", "0").strip().lower() in ("1", "true", "yes", "on")
+# Repeated events are collapsed to one weighted row per (user, item); older events count less.
+RETRAIN_DECAY_HALF_LIFE_DAYS = float(os.environ.get("RETRAIN_DECAY_HALF_LIFE_DAYS", "30")) # 0 = no decay
+# Interactions older than the hot window are moved to the columnar archive before each retrain,
+# keeping the SQLite table small; retraining reads both. 0 disables compaction.
+INTERACTION_HOT_WINDOW_DAYS = float(os.environ.get("INTERACTION_HOT_WINDOW_DAYS", "30"))
+RETRAIN_LOOKBACK_DAYS = float(os.environ.get("RETRAIN_LOOKBACK_DAYS", "0")) # 0 = all history; otherwise prunes old partitions
 
-# --- NEW: Define Interaction Weights ---
-INTERACTION_WEIGHTS = {
-    "tap": 1.0,      # Basic interest
-    "cart": 2.5,     # Stronger intent to purchase
-    # "view": 0.5,    # Passive view (example)
-    # "like": 1.5,    # Positive sentiment (example)
-    # "purchase": 5.0 # Definitive action (if tracked)
-}
-
-def retrain_model_with_new_data():
+def retrain_model_with_new_data(engine="ncf"):
     """
     Reads new interactions from the database, combines with original data (if available),
     assigns weighted scores, and retrains the NCF model for the specified API key.
     The model and mappings are always saved to the SAME paths that the API expects.
+    With engine='cooccurrence' the key's co-occurrence model is rebuilt instead (no ranking
+    gate); it records the last interaction id read, so the API applies newer ones itself.
+
+    Returns:
+        dict or None: The retrained key's paths, counts and artifact checksums (recorded
+                      in the model registry by the API) plus its leave-last-out 'evaluation';
+                      'accepted' is False if the model failed the RETRAIN_MIN_HIT_RATE gate.
+                      None if retraining was skipped.
     """
     print("Starting model retraining process...")
 
-    # --- 1. Read New Interactions from Database ---
+    # --- 1. Read Interactions (archived partitions + hot database table) ---
     print(f"Reading new interactions from {DATABASE_PATH}...")
     if not os.path.exists(DATABASE_PATH):
         print(f"Database file {DATABASE_PATH} not found. Skipping retraining.")
         return
 
-    conn = sqlite3.connect(DATABASE_PATH)
-    query = "SELECT user_id, item_id, type, timestamp FROM user_interactions"
+    if INTERACTION_HOT_WINDOW_DAYS > 0:
+        try:
+            compaction = compact_interactions(DATABASE_PATH, ARCHIVE_DIR, INTERACTION_HOT_WINDOW_DAYS)
+            print(f"Archived {compaction['rows_archived']} interactions older than {INTERACTION_HOT_WINDOW_DAYS:g} days "
+                  f"into {compaction['partitions_written']} partitions.")
+        except Exception as e:
+            # Not fatal: the rows stay in the hot table and are still read below
+            print(f"Error compacting interactions: {e}")
+
+    start_time = time.time() - RETRAIN_LOOKBACK_DAYS * 24 * 3600 if RETRAIN_LOOKBACK_DAYS > 0 else None
     try:
-        new_interactions_df = pd.read_sql_query(query, conn)
+        new_interactions_df = read_interactions(DATABASE_PATH, ARCHIVE_DIR, start_time=start_time,
+                                                columns=("id", "user_id", "item_id", "type", "timestamp"))
     except Exception as e:
-        print(f"Error reading from database: {e}")
-        conn.close()
+        print(f"Error reading interactions: {e}")
         return
-    finally:
-        conn.close()
 
     print(f"Found {len(new_interactions_df)} new interactions.")
 
@@ -59,14 +93,15 @@ def retrain_model_with_new_data():
     )
     print(f"Assigned weighted scores to new interactions based on type: {INTERACTION_WEIGHTS}")
 
-    new_interactions_df_renamed = new_interactions_df[['user_id', 'item_id', 'interaction_score']].copy()
+    # Timestamps are kept for the leave-last-out evaluation split
+    new_interactions_df_renamed = new_interactions_df[['user_id', 'item_id', 'interaction_score', 'timestamp']].copy()
 
     # --- 3. LOAD AND COMBINE WITH ORIGINAL DATA ---
     original_interactions_df = pd.DataFrame()
     if os.path.exists(ORIGINAL_DATA_PATH):
         print(f"Loading original data from {ORIGINAL_DATA_PATH}...")
         try:
-            original_interactions_df = pd.read_csv(ORIGINAL_DATA_PATH)
+            original_interactions_df = load_interactions_csv(ORIGINAL_DATA_PATH) # Parsed once, then cached as .npz
             print(f"Loaded {len(original_interactions_df)} original interactions.")
         except Exception as e:
             print(f"Error loading original data from {ORIGINAL_DATA_PATH}: {e}")
@@ -77,7 +112,11 @@ def retrain_model_with_new_data():
         print("         Model might forget initial patterns if original data isn't included.")
 
     # --- 4. COMBINE DATASETS ---
-    temp_csv_path = "temp_combined_interactions_for_training.csv"
+    # IDs are compared as strings: the CSV may parse numeric-looking IDs as integers
+    for frame in (original_interactions_df, new_interactions_df_renamed):
+        for column in ('user_id', 'item_id'):
+            if column in frame:
+                frame[column] = frame[column].astype(str)
     try:
         if original_interactions_df.empty:
             combined_df = new_interactions_df_renamed
@@ -88,42 +127,142 @@ def retrain_model_with_new_data():
             combined_df = pd.concat([original_interactions_df_reset, new_interactions_df_reset], ignore_index=True, sort=False)
             print(f"Combined dataset created with {len(combined_df)} total interactions ({len(original_interactions_df_reset)} original + {len(new_interactions_df_reset)} new).")
 
-        # --- 5. Preprocess Combined Data ---
+        # --- 5. Aggregate to one row per (user, item): type weights x time decay ---
+        raw_rows = len(combined_df)
+        # Ages are measured from now, not the newest event: after a quiet period logged events
+        # must weigh less against the undecayed (timestamp-less) original data, not the same.
+        combined_df = aggregate_interactions(combined_df, half_life_days=RETRAIN_DECAY_HALF_LIFE_DAYS,
+                                             reference_time=time.time())
+        print(f"Aggregated {raw_rows} interactions into {len(combined_df)} (user, item) rows "
+              f"(decay half-life: {RETRAIN_DECAY_HALF_LIFE_DAYS} days).")
+
+        if engine == COOCCURRENCE_ENGINE:
+            return _rebuild_cooccurrence_model(combined_df, watermark=int(new_interactions_df['id'].max()))
+
+        # --- 6. Preprocess Combined Data ---
         print("Preprocessing combined data...")
-        combined_df.to_csv(temp_csv_path, index=False)
-        df_processed, user_map, item_map, num_users, num_items = load_and_preprocess_data(temp_csv_path)
+        df_processed, user_map, item_map, num_users, num_items = load_and_preprocess_data(
+            combined_df, negative_samples=0, cache=default_preprocess_cache()
+        )
 
         # --- Crucial: Save to the SAME paths used by the API ---
         model_save_path = os.path.join(MODELS_BASE_DIR, API_KEY_TO_UPDATE, "ncf_model.h5")
         mappings_save_path = os.path.join(MODELS_BASE_DIR, API_KEY_TO_UPDATE, "ncf_mappings.json")
 
-        print(f"Training new model using combined data with weighted interaction scores...")
-        trained_model, training_history = train_model(
-            df_processed, num_users, num_items,
-            model_save_path=model_save_path
-        )
+        # Popularity fallback for unknown users: the aggregated weights are already type-weighted
+        # and time-decayed. Refreshed even if the model below fails the ranking gate.
+        os.makedirs(os.path.dirname(model_save_path), exist_ok=True)
+        popularity = compute_popularity(combined_df['item_id'], combined_df['weight'],
+                                        item_categories=load_item_categories(PRODUCTS_DB_PATH))
+        save_popularity(popularity, popularity_path_for_model(model_save_path))
+        print(f"Saved popularity lists ({len(popularity['global'])} global, {len(popularity['categories'])} categories).")
 
-        # Overwrite the old model file and mappings so API picks up new ones
-        trained_model.save(model_save_path)
+        evaluation = None
+        if RETRAIN_MIN_HIT_RATE > 0:
+            # --- 7. Hold out each user's latest interaction for the ranking gate ---
+            # Rows without a timestamp (e.g. original CSV data) count as older than any logged interaction.
+            timestamps = df_processed['timestamp'].fillna(-np.inf).values if 'timestamp' in df_processed else np.zeros(len(df_processed))
+            train_mask, test_users, test_items = leave_last_out_split(
+                df_processed['user_idx'].values, df_processed['item_idx'].values, timestamps
+            )
+            df_train = df_processed[train_mask].reset_index(drop=True)
+
+            # Trained into a candidate file; the served model is only replaced if the gate passes.
+            candidate_model_path = os.path.join(MODELS_BASE_DIR, API_KEY_TO_UPDATE, "ncf_model.candidate.h5")
+            print(f"Training candidate model for the ranking gate "
+                  f"({len(test_users)} interactions held out for evaluation)...")
+            candidate_model, candidate_history = train_model(
+                df_train, num_users, num_items,
+                model_save_path=candidate_model_path,
+                negative_sampler=make_negative_sampler(df_train, num_items)
+            )
+
+            evaluation = evaluate_ranking(
+                NCFScorer.from_keras_model(candidate_model), test_users, test_items, num_items,
+                train_user_idx=df_train['user_idx'].values, train_item_idx=df_train['item_idx'].values,
+                k=RETRAIN_EVAL_K, num_candidates=RETRAIN_EVAL_CANDIDATES or None
+            )
+            print(f"Evaluation: HR@{evaluation['k']}={evaluation['hit_rate']:.4f} NDCG@{evaluation['k']}={evaluation['ndcg']:.4f} "
+                  f"coverage={evaluation['coverage']:.4f} over {evaluation['users_evaluated']} users in {evaluation['seconds']:.2f}s")
+            if evaluation['users_evaluated'] and evaluation['hit_rate'] < RETRAIN_MIN_HIT_RATE:
+                os.remove(candidate_model_path)
+                print(f"HR@{evaluation['k']} below RETRAIN_MIN_HIT_RATE={RETRAIN_MIN_HIT_RATE}; keeping the current model.")
+                return {"api_key": API_KEY_TO_UPDATE, "accepted": False, "evaluation": evaluation}
+
+        if evaluation is not None and not RETRAIN_FULL_DATA:
+            # The evaluated candidate becomes the served model; no second training run
+            os.replace(candidate_model_path, model_save_path)
+            trained_model, training_history = candidate_model, candidate_history
+        else:
+            if evaluation is not None:
+                os.remove(candidate_model_path)
+            # The served model learns from every interaction, including any held out above
+            print("Training new model using combined data with weighted interaction scores...")
+            trained_model, training_history = train_model(
+                df_processed, num_users, num_items,
+                model_save_path=model_save_path,
+                negative_sampler=make_negative_sampler(df_processed, num_items)
+            )
+
+        # train_model saved the model over the old file; the mappings follow so the API picks up both
         save_mappings(user_map, item_map, mappings_save_path)
+        weights = export_ncf_weights(trained_model)
+        save_ncf_weights(weights, weights_path_for_model(model_save_path))
+        write_bundle(bundle_path_for_model(model_save_path), weights, user_map, item_map)
+        # Only items whose embeddings moved (and their neighbors) are recomputed
+        neighbor_stats = build_item_neighbors(weights, item_map, neighbors_path_for_model(model_save_path))
+        print(f"Updated similar items: {neighbor_stats['recomputed']} of {neighbor_stats['items']} items recomputed "
+              f"in {neighbor_stats['seconds']:.2f}s.")
 
         print(f"Model training completed. Saved to {model_save_path}")
         print(f"Retrained model saved to {model_save_path}")
         print(f"Retrained mappings saved to {mappings_save_path}")
 
         print(f"Updated model for API key '{API_KEY_TO_UPDATE}' with {num_users} users and {num_items} items.")
+        weights_save_path = weights_path_for_model(model_save_path)
+        result = {
+            "api_key": API_KEY_TO_UPDATE,
+            "engine": "ncf",
+            "model_path": model_save_path,
+            "mappings_path": mappings_save_path,
+            "weights_path": weights_save_path,
+            "num_users": num_users,
+            "num_items": num_items,
+            "checksums": artifact_checksums(model_save_path, mappings_save_path, weights_save_path),
+            "accepted": True,
+            "evaluation": evaluation,
+        }
 
     except Exception as e:
         print(f"Error during data combination, preprocessing, or training: {e}")
         return
-    finally:
-        if 'temp_csv_path' in locals() and os.path.exists(temp_csv_path):
-            try:
-                os.remove(temp_csv_path)
-            except OSError as e:
-                print(f"Warning: Could not remove temporary file {temp_csv_path}: {e}")
 
     print("Model retraining process finished successfully!")
+    return result
+
+
+def _rebuild_cooccurrence_model(aggregated_df, watermark):
+    """Builds and saves the co-occurrence model from aggregated (user, item, weight) rows."""
+    model_save_path = os.path.join(MODELS_BASE_DIR, API_KEY_TO_UPDATE, COOCCURRENCE_FILENAME)
+    mappings_save_path = os.path.join(MODELS_BASE_DIR, API_KEY_TO_UPDATE, "ncf_mappings.json")
+    os.makedirs(os.path.dirname(model_save_path), exist_ok=True)
+    model = CooccurrenceModel.from_interactions(
+        aggregated_df['user_id'], aggregated_df['item_id'], aggregated_df['weight'], watermark=watermark
+    )
+    save_cooccurrence_model(model, model_save_path, mappings_save_path)
+    print(f"Rebuilt co-occurrence model for API key '{API_KEY_TO_UPDATE}' with {model.num_users} users and "
+          f"{model.num_items} items (interactions up to id {watermark}).")
+    return {
+        "api_key": API_KEY_TO_UPDATE,
+        "engine": COOCCURRENCE_ENGINE,
+        "model_path": model_save_path,
+        "mappings_path": mappings_save_path,
+        "num_users": model.num_users,
+        "num_items": model.num_items,
+        "checksums": artifact_checksums(model_save_path, mappings_save_path),
+        "accepted": True,
+        "evaluation": None,
+    }
 
 # --- Entry Point ---
 if __name__ == "__main__":
@@ -0,0 +1,169 @@
+# sampling.py
+import numpy as np
+import tensorflow as tf
+
+# --- Configuration ---
+DEFAULT_POPULARITY_EXPONENT = 0.75 # Smooths popularity so the head doesn't dominate the negatives
+DEFAULT_MAX_RESAMPLE_ROUNDS = 5    # Rounds spent replacing negatives that hit a known positive
+
+
+class AliasTable:
+    """
+    Vose's alias method: O(n) construction, O(1) vectorized sampling from a
+    discrete distribution over range(n).
+    """
+
+    def __init__(self, probabilities):
+        probabilities = np.asarray(probabilities, dtype=np.float64)
+        if probabilities.ndim != 1 or probabilities.size == 0:
+            raise ValueError("AliasTable needs a non-empty 1-D probability vector.")
+        total = probabilities.sum()
+        if total <= 0:
+            raise ValueError("AliasTable probabilities must sum to a positive value.")
+
+        n = probabilities.size
+        scaled = probabilities * (n / total)
+        self.prob = np.ones(n, dtype=np.float64)
+        self.alias = np.arange(n, dtype=np.int64)
+
+        small = [i for i in range(n) if scaled[i] < 1.0]
+        large = [i for i in range(n) if scaled[i] >= 1.0]
+        while small and large:
+            s = small.pop()
+            l = large.pop()
+            self.prob[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] = scaled[l] + scaled[s] - 1.0
+            if scaled[l] < 1.0:
+                small.append(l)
+            else:
+                large.append(l)
+        # Leftovers are 1.0 up to floating point error; keep their default prob/alias.
+
+    def __len__(self):
+        return self.prob.size
+
+    def sample(self, size, rng):
+        columns = rng.integers(0, self.prob.size, size=size)
+        accept = rng.random(size) < self.prob[columns]
+        return np.where(accept, columns, self.alias[columns])
+
+
+class NegativeSampler:
+    """
+    Draws negative items for (user, item) positives, either uniformly or
+    weighted by item popularity, rejecting items the user interacted with.
+    """
+
+    def __init__(self, user_idx, item_idx, num_items, strategy="popularity",
+                 exponent=DEFAULT_POPULARITY_EXPONENT, seed=None,
+                 max_resample_rounds=DEFAULT_MAX_RESAMPLE_ROUNDS):
+        """
+        Args:
+            user_idx (array-like): User indices of the positive interactions.
+            item_idx (array-like): Item indices of the positive interactions.
+            num_items (int): Size of the item index space.
+            strategy (str): 'popularity' (counts ** exponent) or 'uniform'.
+            exponent (float): Popularity smoothing exponent.
+            seed (int): Random seed.
+            max_resample_rounds (int): Resampling rounds for negatives that collide with positives.
+        """
+        if strategy not in ("popularity", "uniform"):
+            raise ValueError(f"Unknown sampling strategy '{strategy}'. Use 'popularity' or 'uniform'.")
+        user_idx = np.asarray(user_idx, dtype=np.int64)
+        item_idx = np.asarray(item_idx, dtype=np.int64)
+
+        self.num_items = int(num_items)
+        self.strategy = strategy
+        self.max_resample_rounds = max_resample_rounds
+        self.rng = np.random.default_rng(seed)
+        # Sorted (user, item) keys of every positive, for vectorized membership checks.
+        self.positive_keys = np.unique(user_idx * self.num_items + item_idx)
+
+        if strategy == "popularity":
+            counts = np.bincount(item_idx, minlength=self.num_items).astype(np.float64)
+            self.alias_table = AliasTable(np.power(counts + 1.0, exponent))
+        else:
+            self.alias_table = None
+
+    def _draw(self, size, rng):
+        if self.alias_table is not None:
+            return self.alias_table.sample(size, rng)
+        return rng.integers(0, self.num_items, size=size)
+
+    def _is_positive(self, users, items):
+        keys = users * self.num_items + items
+        positions = np.searchsorted(self.positive_keys, keys)
+        positions = np.minimum(positions, len(self.positive_keys) - 1)
+        return self.positive_keys[positions] == keys
+
+    def sample(self, users, negatives_per_user, rng=None):
+        """
+        Draws negatives_per_user items for every entry of users, from rng if given (e.g. a
+        per-batch generator, so parallel callers stay reproducible) or the sampler's own.
+
+        Returns:
+            tuple: (negative_users, negative_items) int64 arrays. Negatives that still
+                   collide with a positive after max_resample_rounds are dropped.
+        """
+        rng = self.rng if rng is None else rng
+        negative_users = np.repeat(np.asarray(users, dtype=np.int64), negatives_per_user)
+        negative_items = self._draw(negative_users.size, rng)
+        if self.positive_keys.size == 0:
+            return negative_users, negative_items
+
+        collisions = self._is_positive(negative_users, negative_items)
+        for _ in range(self.max_resample_rounds):
+            if not collisions.any():
+                break
+            negative_items[collisions] = self._draw(int(collisions.sum()), rng)
+            collisions = self._is_positive(negative_users, negative_items)
+
+        keep = ~collisions
+        return negative_users[keep], negative_items[keep]
+
+
+class NegativeSamplingSequence(tf.keras.utils.Sequence):
+    """
+    Keras Sequence over positive interactions that samples fresh negatives
+    for every batch, so each epoch sees different negatives and the
+    positives x negative_samples rows are never materialized.
+    """
+
+    def __init__(self, user_idx, item_idx, sampler, negative_samples, batch_size, shuffle=True, seed=None,
+                 sample_weights=None):
+        super().__init__()
+        self.user_idx = np.asarray(user_idx, dtype=np.int64)
+        self.item_idx = np.asarray(item_idx, dtype=np.int64)
+        # Optional per-positive loss weights; sampled negatives always weigh 1.0
+        self.sample_weights = None if sample_weights is None else np.asarray(sample_weights, dtype=np.float32)
+        self.sampler = sampler
+        self.negative_samples = negative_samples
+        # batch_size counts rows after negatives are added, like a regular fit() batch.
+        self.positives_per_batch = max(1, batch_size // (1 + negative_samples))
+        self.shuffle = shuffle
+        self.rng = np.random.default_rng(seed)
+        self.order = np.arange(len(self.user_idx))
+        self.on_epoch_end()
+
+    def __len__(self):
+        return int(np.ceil(len(self.user_idx) / self.positives_per_batch))
+
+    def __getitem__(self, index):
+        batch = self.order[index * self.positives_per_batch:(index + 1) * self.positives_per_batch]
+        pos_users = self.user_idx[batch]
+        pos_items = self.item_idx[batch]
+        neg_users, neg_items = self.sampler.sample(pos_users, self.negative_samples)
+
+        users = np.concatenate([pos_users, neg_users])
+        items = np.concatenate([pos_items, neg_items])
+        labels = np.concatenate([np.ones(len(pos_users), dtype=np.float32),
+                                 np.zeros(len(neg_users), dtype=np.float32)])
+        if self.sample_weights is None:
+            return (users, items), labels
+        weights = np.concatenate([self.sample_weights[batch], np.ones(len(neg_users), dtype=np.float32)])
+        return (users, items), labels, weights
+
+    def on_epoch_end(self):
+        if self.shuffle:
+            self.rng.shuffle(self.order)
@@ -0,0 +1,276 @@
+# scheduler.py
+import heapq
+import importlib
+import itertools
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from metrics import record_stage
+from logging_setup import get_logger
+
+# --- Configuration ---
+TRAINING_MAX_WORKERS = int(os.environ.get("TRAINING_MAX_WORKERS", "1"))
+TRAINING_THREADS_PER_JOB = int(os.environ.get("TRAINING_THREADS_PER_JOB", "2"))
+WALL_TIME_HISTORY = 100 # Number of finished jobs kept for wall-time statistics
+MAX_TRACKED_JOBS = 1000 # Finished jobs beyond this are forgotten (oldest first)
+
+logger = get_logger("scheduler")
+
+THREAD_LIMIT_ENV_VARS = (
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "TF_NUM_INTRAOP_THREADS",
+    "TF_NUM_INTEROP_THREADS",
+)
+
+
+def _run_job_in_worker(target, args, num_threads):
+    """
+    Entry point executed inside the worker process. Thread limits are set through
+    the environment before the target module (and TensorFlow) is imported; each
+    worker process runs a single job, so the limits apply to that job only.
+    """
+    for var in THREAD_LIMIT_ENV_VARS:
+        os.environ[var] = str(num_threads)
+    module_name, func_name = target.split(":")
+    func = getattr(importlib.import_module(module_name), func_name)
+    return func(*args)
+
+
+class TrainingJob:
+    """A queued or running train/retrain job."""
+
+    def __init__(self, kind, api_key, target, args, size, num_threads):
+        self.job_id = str(uuid.uuid4())
+        self.kind = kind
+        self.api_key = api_key
+        self.target = target
+        self.args = args
+        self.size = size
+        self.num_threads = num_threads
+        self.status = "queued"
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.future = Future()
+
+    @property
+    def wall_time(self):
+        if self.started_at is None:
+            return None
+        return (self.finished_at or time.time()) - self.started_at
+
+    def to_dict(self):
+        # No api_key: /v1/train jobs carry keys that haven't been returned to their owner yet.
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "size": self.size,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wall_time_seconds": self.wall_time,
+            "error": self.error,
+        }
+
+
+class TrainingScheduler:
+    """
+    Runs train/retrain jobs on a bounded process pool.
+
+    - Smallest jobs (by size, e.g. input bytes) are dispatched first.
+    - At most one job per API key runs at a time, so retrains never race.
+    - A retrain submitted while an identical one (same key, target and args) is still
+      queued is coalesced into the queued job instead of being queued twice.
+    """
+
+    def __init__(self, max_workers=TRAINING_MAX_WORKERS, threads_per_job=TRAINING_THREADS_PER_JOB):
+        self.max_workers = max_workers
+        self.threads_per_job = threads_per_job
+        self._queue = []           # heap of (size, sequence, job)
+        self._sequence = itertools.count()
+        self._jobs = {}            # job_id -> TrainingJob
+        self._running_keys = set()
+        self._running = 0
+        self._wall_times = deque(maxlen=WALL_TIME_HISTORY)
+        self._completed = 0
+        self._failed = 0
+        self._condition = threading.Condition()
+        self._executor = None
+        self._dispatcher = None
+        self._stopping = False
+
+    def _new_executor(self):
+        # A fresh spawned process per job: TensorFlow state and memory never leak between tenants.
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            max_tasks_per_child=1,
+        )
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._executor = self._new_executor()
+            self._dispatcher = threading.Thread(target=self._dispatch_loop, name="training-dispatcher", daemon=True)
+            self._dispatcher.start()
+
+    def submit(self, kind, api_key, target, args=(), size=0, num_threads=None, coalesce=False):
+        """
+        Queues a job. target is a 'module:function' string resolved in the worker process.
+
+        Returns:
+            TrainingJob: The new job, or the already-queued job it was coalesced into.
+        """
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("Training scheduler is shutting down.")
+            if coalesce:
+                for _, _, queued in self._queue:
+                    if (queued.kind, queued.api_key, queued.target, queued.args) == (kind, api_key, target, tuple(args)):
+                        logger.info(f"Coalescing {kind} request for key '{api_key}' into queued job {queued.job_id}.")
+                        return queued
+
+            job = TrainingJob(kind, api_key, target, tuple(args), size, num_threads or self.threads_per_job)
+            self._jobs[job.job_id] = job
+            heapq.heappush(self._queue, (size, next(self._sequence), job))
+            self._ensure_started()
+            self._condition.notify_all()
+        logger.info(f"Queued {kind} job {job.job_id} for key '{api_key}' (size {size}, queue depth {len(self._queue)}).")
+        return job
+
+    def _next_runnable_job(self):
+        """Pops the smallest queued job whose API key is not already running."""
+        skipped = []
+        job = None
+        while self._queue:
+            entry = heapq.heappop(self._queue)
+            if entry[2].api_key in self._running_keys:
+                skipped.append(entry)
+                continue
+            job = entry[2]
+            break
+        for entry in skipped:
+            heapq.heappush(self._queue, entry)
+        return job
+
+    def _dispatch_loop(self):
+        while True:
+            with self._condition:
+                job = None
+                while not self._stopping:
+                    if self._running < self.max_workers:
+                        job = self._next_runnable_job()
+                        if job is not None:
+                            break
+                    self._condition.wait()
+                if job is None:
+                    return
+                self._running += 1
+                self._running_keys.add(job.api_key)
+                job.status = "running"
+                job.started_at = time.time()
+            record_stage("queue_wait", job.started_at - job.submitted_at, endpoint=f"training:{job.kind}", api_key=job.api_key)
+
+            for attempt in range(2):
+                executor = self._executor
+                try:
+                    pool_future = executor.submit(_run_job_in_worker, job.target, job.args, job.num_threads)
+                except BrokenProcessPool as e:
+                    # A worker of an earlier job died; the job never started, so retry on a new pool
+                    self._replace_broken_executor(executor)
+                    if attempt == 0:
+                        continue
+                    self._finish(job, None, e)
+                except Exception as e:
+                    self._finish(job, None, e)
+                else:
+                    pool_future.add_done_callback(lambda f, job=job, executor=executor: self._finish(job, f, None, executor))
+                break
+
+    def _replace_broken_executor(self, executor):
+        """Swaps in a new process pool after a worker crash (OOM kill, segfault) broke this one."""
+        with self._condition:
+            if self._executor is not executor or self._stopping:
+                return # Already replaced by another job's callback
+            self._executor = self._new_executor()
+        logger.error("Training worker process died; replaced the process pool.")
+        executor.shutdown(wait=False)
+
+    def _finish(self, job, pool_future, submit_error, executor=None):
+        error = submit_error if submit_error is not None else pool_future.exception()
+        if isinstance(error, BrokenProcessPool) and executor is not None:
+            # Only jobs that were running in the broken pool fail; queued jobs go to the new one
+            self._replace_broken_executor(executor)
+        with self._condition:
+            job.finished_at = time.time()
+            self._running -= 1
+            self._running_keys.discard(job.api_key)
+            self._wall_times.append(job.wall_time)
+            record_stage("run", job.wall_time, endpoint=f"training:{job.kind}", api_key=job.api_key)
+            if error is None:
+                job.status = "completed"
+                self._completed += 1
+            else:
+                job.status = "failed"
+                job.error = str(error)
+                self._failed += 1
+            self._forget_old_jobs()
+            self._condition.notify_all()
+
+        logger.info(f"{job.kind} job {job.job_id} for key '{job.api_key}' {job.status} in {job.wall_time:.2f}s.")
+        if error is None:
+            job.future.set_result(pool_future.result())
+        else:
+            job.future.set_exception(error)
+
+    def _forget_old_jobs(self):
+        excess = len(self._jobs) - MAX_TRACKED_JOBS
+        if excess <= 0:
+            return
+        for job_id in [j.job_id for j in self._jobs.values() if j.finished_at is not None][:excess]:
+            del self._jobs[job_id]
+
+    def get_job(self, job_id):
+        with self._condition:
+            return self._jobs.get(job_id)
+
+    def stats(self):
+        with self._condition:
+            wall_times = list(self._wall_times)
+            return {
+                "max_workers": self.max_workers,
+                "threads_per_job": self.threads_per_job,
+                "queue_depth": len(self._queue),
+                "running": self._running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "mean_wall_time_seconds": sum(wall_times) / len(wall_times) if wall_times else None,
+                "max_wall_time_seconds": max(wall_times) if wall_times else None,
+                "queued_jobs": [entry[2].to_dict() for entry in sorted(self._queue)],
+            }
+
+    def shutdown(self, wait=True):
+        """Stops dispatching; queued jobs fail right away so requests waiting on them return."""
+        with self._condition:
+            self._stopping = True
+            cancelled = [entry[2] for entry in self._queue]
+            self._queue.clear()
+            for job in cancelled:
+                job.status = "failed"
+                job.error = "Training scheduler shut down before the job started."
+                job.finished_at = time.time()
+                self._failed += 1
+            self._condition.notify_all()
+        for job in cancelled:
+            job.future.set_exception(RuntimeError(job.error))
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
@@ -0,0 +1,213 @@
+# serving_bundle.py
+import json
+import os
+import shutil
+import time
+import uuid
+import numpy as np
+
+from model_registry import file_sha256
+
+# --- Configuration ---
+BUNDLE_FORMAT_VERSION = 1
+BUNDLE_DIRNAME = "bundle" # models_store/<api_key>/bundle/
+MANIFEST_FILENAME = "manifest.json"
+CURRENT_FILENAME = "CURRENT" # Names the active version directory; replaced atomically
+BUNDLE_KEEP_VERSIONS = 2 # Older versions are pruned after each write
+USER_IDS_ARRAY = "user_ids"
+ITEM_IDS_ARRAY = "item_ids"
+
+
+class BundleError(Exception):
+    """Raised when a serving bundle is missing, incomplete or fails its checksum."""
+
+
+def bundle_path_for_model(model_path):
+    """Where the serving bundle for a Keras model file is stored."""
+    return os.path.join(os.path.dirname(model_path), BUNDLE_DIRNAME)
+
+
+def ncf_hyperparameters(weights):
+    """create_ncf_model arguments recovered from export_ncf_weights() output."""
+    return {
+        "num_users": int(weights["gmf_user_embedding"].shape[0]),
+        "num_items": int(weights["gmf_item_embedding"].shape[0]),
+        "embedding_dim": int(weights["gmf_user_embedding"].shape[1]),
+        "mlp_layers": [int(kernel.shape[1]) for kernel in weights["mlp_kernels"]],
+    }
+
+
+def _flatten_weights(weights):
+    arrays = {name: weights[name] for name in ("gmf_user_embedding", "gmf_item_embedding",
+                                               "mlp_user_embedding", "mlp_item_embedding")}
+    for i, (kernel, bias) in enumerate(zip(weights["mlp_kernels"], weights["mlp_biases"])):
+        arrays[f"mlp_kernel_{i}"] = kernel
+        arrays[f"mlp_bias_{i}"] = bias
+    arrays["output_kernel"] = weights["output_kernel"]
+    arrays["output_bias"] = weights["output_bias"]
+    return arrays
+
+
+def _id_table(index_map):
+    """{id: index} -> array of ids ordered by index (fixed-width unicode, mmap-able)."""
+    ids = [None] * len(index_map)
+    for item_id, idx in index_map.items():
+        ids[idx] = str(item_id)
+    return np.array(ids, dtype=str) if ids else np.array([], dtype="<U1")
+
+
+def _existing_versions(bundle_root):
+    if not os.path.isdir(bundle_root):
+        return []
+    return sorted(int(name[1:]) for name in os.listdir(bundle_root)
+                  if name.startswith("v") and name[1:].isdigit())
+
+
+def write_bundle(bundle_root, weights, user_map, item_map):
+    """
+    Writes a new bundle version: one .npy per weight array and ID table, plus a manifest
+    with hyperparameters, shapes, dtypes and SHA-256 checksums. The version directory is
+    fully written before CURRENT is switched to it, so readers never see a partial bundle.
+
+    Args:
+        bundle_root (str): The bundle directory (see bundle_path_for_model).
+        weights (dict): Output of inference.export_ncf_weights.
+        user_map (dict): Original user ID -> index.
+        item_map (dict): Original item ID -> index.
+
+    Returns:
+        dict: The manifest that was written.
+    """
+    os.makedirs(bundle_root, exist_ok=True)
+    version = (_existing_versions(bundle_root) or [0])[-1] + 1
+    version_name = f"v{version:06d}"
+    temp_dir = os.path.join(bundle_root, f".tmp-{uuid.uuid4().hex}")
+    os.makedirs(temp_dir)
+
+    arrays = _flatten_weights(weights)
+    arrays[USER_IDS_ARRAY] = _id_table(user_map)
+    arrays[ITEM_IDS_ARRAY] = _id_table(item_map)
+
+    manifest = {
+        "format_version": BUNDLE_FORMAT_VERSION,
+        "version": version,
+        "created_at": time.time(),
+        "hyperparameters": ncf_hyperparameters(weights),
+        "num_mlp_layers": len(weights["mlp_kernels"]),
+        "arrays": {},
+    }
+    try:
+        for name, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            file_name = f"{name}.npy"
+            file_path = os.path.join(temp_dir, file_name)
+            np.save(file_path, array)
+            manifest["arrays"][name] = {
+                "file": file_name,
+                "shape": list(array.shape),
+                "dtype": array.dtype.str,
+                "bytes": os.path.getsize(file_path),
+                "sha256": file_sha256(file_path),
+            }
+        with open(os.path.join(temp_dir, MANIFEST_FILENAME), "w") as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(temp_dir, os.path.join(bundle_root, version_name))
+    except BaseException:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    current_temp = os.path.join(bundle_root, f"{CURRENT_FILENAME}.tmp")
+    with open(current_temp, "w") as f:
+        f.write(version_name)
+    os.replace(current_temp, os.path.join(bundle_root, CURRENT_FILENAME))
+
+    for old_version in _existing_versions(bundle_root)[:-BUNDLE_KEEP_VERSIONS]:
+        shutil.rmtree(os.path.join(bundle_root, f"v{old_version:06d}"), ignore_errors=True)
+    return manifest
+
+
+def current_bundle_dir(bundle_root):
+    """The active version directory, or None if no bundle has been written."""
+    try:
+        with open(os.path.join(bundle_root, CURRENT_FILENAME)) as f:
+            return os.path.join(bundle_root, f.read().strip())
+    except FileNotFoundError:
+        return None
+
+
+class ServingBundle:
+    """A loaded bundle: manifest, weights in export_ncf_weights() layout, and ID tables."""
+
+    def __init__(self, bundle_dir, manifest, arrays):
+        self.bundle_dir = bundle_dir
+        self.manifest = manifest
+        self.version = manifest["version"]
+        self.hyperparameters = manifest["hyperparameters"]
+        self.user_ids = arrays.pop(USER_IDS_ARRAY)
+        self.item_ids = arrays.pop(ITEM_IDS_ARRAY)
+        num_layers = manifest["num_mlp_layers"]
+        self.weights = {name: arrays[name] for name in ("gmf_user_embedding", "gmf_item_embedding",
+                                                        "mlp_user_embedding", "mlp_item_embedding")}
+        self.weights["mlp_kernels"] = [arrays[f"mlp_kernel_{i}"] for i in range(num_layers)]
+        self.weights["mlp_biases"] = [arrays[f"mlp_bias_{i}"] for i in range(num_layers)]
+        self.weights["output_kernel"] = arrays["output_kernel"]
+        self.weights["output_bias"] = arrays["output_bias"]
+
+    def mappings(self):
+        """(user_map, item_map) in the same {id: index} form as mappings.load_mappings."""
+        user_map = {user_id: idx for idx, user_id in enumerate(self.user_ids.tolist())}
+        item_map = {item_id: idx for idx, item_id in enumerate(self.item_ids.tolist())}
+        return user_map, item_map
+
+
+def verify_bundle(bundle_dir):
+    """
+    Checks every array of a bundle version against its manifest's SHA-256 (reads every
+    byte once, so this belongs off the request path).
+
+    Raises:
+        BundleError: If the manifest is unreadable or an array is missing or corrupt.
+    """
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Unreadable bundle manifest in {bundle_dir}: {e}")
+    for name, info in manifest["arrays"].items():
+        file_path = os.path.join(bundle_dir, info["file"])
+        if not os.path.exists(file_path) or file_sha256(file_path) != info["sha256"]:
+            raise BundleError(f"Checksum mismatch for bundle array '{name}' in {bundle_dir}")
+
+
+def load_bundle(bundle_root, mmap=True, verify=True):
+    """
+    Loads the current bundle version. Arrays are memory-mapped read-only when mmap is set,
+    so load time doesn't grow with model size. File sizes are always checked against the
+    manifest; verify additionally checks SHA-256 checksums (reads every byte once).
+
+    Raises:
+        BundleError: If there is no bundle, or it is incomplete or corrupt.
+    """
+    bundle_dir = current_bundle_dir(bundle_root)
+    if bundle_dir is None:
+        raise BundleError(f"No serving bundle found in {bundle_root}")
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_FILENAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError) as e:
+        raise BundleError(f"Unreadable bundle manifest in {bundle_dir}: {e}")
+    if manifest.get("format_version") != BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"Unsupported bundle format {manifest.get('format_version')} in {bundle_dir}")
+
+    arrays = {}
+    for name, info in manifest["arrays"].items():
+        file_path = os.path.join(bundle_dir, info["file"])
+        if not os.path.exists(file_path) or os.path.getsize(file_path) != info["bytes"]:
+            raise BundleError(f"Bundle array '{name}' is missing or truncated in {bundle_dir}")
+        if verify and file_sha256(file_path) != info["sha256"]:
+            raise BundleError(f"Checksum mismatch for bundle array '{name}' in {bundle_dir}")
+        array = np.load(file_path, mmap_mode="r" if mmap else None)
+        if list(array.shape) != info["shape"] or array.dtype.str != info["dtype"]:
+            raise BundleError(f"Bundle array '{name}' doesn't match its manifest entry in {bundle_dir}")
+        arrays[name] = array
+    return ServingBundle(bundle_dir, manifest, arrays)
@@ -0,0 +1,85 @@
+# session_scoring.py
+import sqlite3
+import numpy as np
+
+# --- Configuration ---
+# Relative strength of each interaction type; used for training (retrain_model.py) and for
+# folding a session into a user vector here.
+INTERACTION_WEIGHTS = {
+    "tap": 1.0,      # Basic interest
+    "cart": 2.5,     # Stronger intent to purchase
+    # "view": 0.5,    # Passive view (example)
+    # "like": 1.5,    # Positive sentiment (example)
+    # "purchase": 5.0 # Definitive action (if tracked)
+}
+SESSION_MAX_INTERACTIONS = 50 # Most recent interactions folded into the session vector
+
+
+def recent_interactions(db_path, user_id, since=None, limit=SESSION_MAX_INTERACTIONS):
+    """
+    The user's most recent (item_id, type) interactions, newest first, optionally only
+    those after the since timestamp. Served by the (user_id, timestamp) index.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        if since is None:
+            rows = conn.execute(
+                "SELECT item_id, type FROM user_interactions WHERE user_id = ? ORDER BY timestamp DESC LIMIT ?",
+                (user_id, limit)
+            ).fetchall()
+        else:
+            rows = conn.execute(
+                "SELECT item_id, type FROM user_interactions WHERE user_id = ? AND timestamp > ? "
+                "ORDER BY timestamp DESC LIMIT ?",
+                (user_id, since, limit)
+            ).fetchall()
+    finally:
+        conn.close()
+    return rows
+
+
+def fold_in_session(scorer, item_map, interactions):
+    """
+    Builds a temporary user from interacted items: the INTERACTION_WEIGHTS-weighted mean
+    of their GMF and MLP item embeddings. Items the model doesn't know are ignored.
+
+    Args:
+        scorer (NCFScorer): The model's NumPy scorer.
+        item_map (dict): Original item ID -> index.
+        interactions (list): (item_id, type) pairs, e.g. from recent_interactions.
+
+    Returns:
+        tuple or None: (gmf_latent, mlp_latent) as (dim,) float32 vectors, or None if no
+                       interaction refers to a known item.
+    """
+    indices, weights = [], []
+    for item_id, interaction_type in interactions:
+        item_idx = item_map.get(item_id)
+        if item_idx is not None:
+            indices.append(item_idx)
+            weights.append(INTERACTION_WEIGHTS.get(interaction_type, 1.0))
+    if not indices:
+        return None
+    indices = np.asarray(indices, dtype=np.int64)
+    weights = np.asarray(weights, dtype=np.float32)
+    weights /= weights.sum()
+    return weights @ scorer.gmf_item.lookup(indices), weights @ scorer.mlp_item.lookup(indices)
+
+
+def session_latents(scorer, item_map, interactions, user_idx=None, blend=0.5):
+    """
+    User latent vectors for session-aware scoring. For an unknown user (user_idx None)
+    this is the folded-in session; for a known user, the trained embedding moved towards
+    the session by blend (0 keeps the trained vector, 1 uses only the session).
+
+    Returns:
+        tuple or None: (gmf_latent, mlp_latent), or None if there is no usable session.
+    """
+    session = fold_in_session(scorer, item_map, interactions)
+    if session is None:
+        return None
+    if user_idx is None:
+        return session
+    user = np.asarray([user_idx])
+    trained = (scorer.gmf_user.lookup(user)[0], scorer.mlp_user.lookup(user)[0])
+    return tuple((1.0 - blend) * t + blend * s for t, s in zip(trained, session))
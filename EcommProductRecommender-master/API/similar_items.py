@@ -0,0 +1,212 @@
+# similar_items.py
+import os
+import time
+import numpy as np
+
+# --- Configuration ---
+NEIGHBORS_FILENAME = "item_neighbors.npz" # Stored next to the key's model
+DEFAULT_TOP_K = 20 # Neighbors kept per item
+BLOCK_ELEMENTS = 1 << 24 # Similarity entries per block (64 MB of float32), bounding peak memory
+# An item whose vector moved less than this (1 - cosine to the stored vector) keeps its
+# stored vector and neighbor list on incremental updates.
+DRIFT_TOLERANCE = 1e-3
+
+
+def neighbors_path_for_model(model_path):
+    """Where the item-neighbor table for a Keras model file is stored."""
+    return os.path.join(os.path.dirname(model_path), NEIGHBORS_FILENAME)
+
+
+def item_vectors(weights):
+    """
+    Unit-length item vectors from exported NCF weights (inference.export_ncf_weights):
+    the GMF item embedding scaled by the output layer's GMF weights, i.e. the space in
+    which the model measures user-item affinity.
+    """
+    gmf_item = np.asarray(weights["gmf_item_embedding"], dtype=np.float32)
+    vectors = gmf_item * np.asarray(weights["output_kernel"], dtype=np.float32)[:gmf_item.shape[1], 0]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(similarities, top_k):
+    """Column indices and values of each row's top_k entries, best first; -1 pads short rows."""
+    rows, columns = similarities.shape
+    k = min(top_k, columns)
+    indices = np.full((rows, top_k), -1, dtype=np.int32)
+    scores = np.zeros((rows, top_k), dtype=np.float32)
+    if k == 0:
+        return indices, scores
+    top = np.argpartition(-similarities, k - 1, axis=1)[:, :k] if k < columns else np.tile(np.arange(columns), (rows, 1))
+    top_scores = np.take_along_axis(similarities, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    top = np.take_along_axis(top, order, axis=1)
+    top_scores = np.take_along_axis(top_scores, order, axis=1)
+    valid = np.isfinite(top_scores)
+    indices[:, :k] = np.where(valid, top, -1)
+    scores[:, :k] = np.where(valid, top_scores, 0.0)
+    return indices, scores
+
+
+def compute_neighbors(vectors, top_k=DEFAULT_TOP_K, rows=None):
+    """
+    Exact top-k cosine neighbors (excluding the item itself) for the given rows of
+    unit-length vectors, one block of rows x catalog matrix product at a time.
+
+    Returns:
+        tuple: (neighbors, scores), (len(rows), top_k) int32 item indices (-1 padded)
+               and float32 cosine similarities.
+    """
+    num_items = len(vectors)
+    rows = np.arange(num_items) if rows is None else np.asarray(rows, dtype=np.int64)
+    neighbors = np.full((len(rows), top_k), -1, dtype=np.int32)
+    scores = np.zeros((len(rows), top_k), dtype=np.float32)
+    block = max(1, BLOCK_ELEMENTS // max(num_items, 1))
+    for start in range(0, len(rows), block):
+        block_rows = rows[start:start + block]
+        similarities = vectors[block_rows] @ vectors.T
+        similarities[np.arange(len(block_rows)), block_rows] = -np.inf
+        neighbors[start:start + block], scores[start:start + block] = _top_k(similarities, top_k)
+    return neighbors, scores
+
+
+def update_neighbors(vectors, item_ids, previous=None, top_k=DEFAULT_TOP_K, tolerance=DRIFT_TOLERANCE):
+    """
+    Neighbor table for a (possibly retrained) model, reusing a previous table where the
+    catalog didn't change. Items are matched to the previous table by ID. An item is
+    changed if it is new or its vector drifted more than tolerance; unchanged items keep
+    their stored vector, so similarities between them are exactly the stored ones.
+
+    Only changed items and items whose stored neighbors include a changed or removed item
+    are recomputed against the whole catalog; every other item just merges its stored list
+    with its similarities to the changed items, which gives the same top-k.
+
+    Args:
+        vectors (np.ndarray): (num_items, dim) unit vectors from item_vectors, in model index order.
+        item_ids (np.ndarray): Original item ID per index.
+        previous (dict): A table from load_neighbor_table, or None to compute from scratch.
+
+    Returns:
+        tuple: (table dict with item_ids, neighbors, scores, vectors; stats dict with
+               recomputed and merged row counts).
+    """
+    num_items = len(vectors)
+    item_ids = np.asarray(item_ids).astype(str)
+    reference = vectors.astype(np.float32, copy=True)
+    changed = np.ones(num_items, dtype=bool)
+    old_rows = np.full(num_items, -1, dtype=np.int64)
+
+    usable = (previous is not None and previous["neighbors"].shape[1] == top_k
+              and previous["vectors"].shape[1] == vectors.shape[1])
+    if usable:
+        old_row_of = {item_id: row for row, item_id in enumerate(previous["item_ids"].tolist())}
+        old_rows = np.array([old_row_of.get(item_id, -1) for item_id in item_ids.tolist()], dtype=np.int64)
+        kept = old_rows >= 0
+        old_vectors = previous["vectors"][old_rows[kept]]
+        drift = 1.0 - np.einsum("nd,nd->n", old_vectors, vectors[kept])
+        unchanged = np.flatnonzero(kept)[drift <= tolerance]
+        changed[unchanged] = False
+        reference[unchanged] = previous["vectors"][old_rows[unchanged]]
+
+    neighbors = np.full((num_items, top_k), -1, dtype=np.int32)
+    scores = np.zeros((num_items, top_k), dtype=np.float32)
+    recompute = changed.copy()
+    merge_rows = np.empty(0, dtype=np.int64)
+    if usable and not changed.all():
+        # Stored neighbor lists in the new index space; removed items map to -1
+        old_to_new = np.full(len(previous["item_ids"]), -1, dtype=np.int64)
+        old_to_new[old_rows[old_rows >= 0]] = np.flatnonzero(old_rows >= 0)
+        merge_rows = np.flatnonzero(~changed)
+        stored = previous["neighbors"][old_rows[merge_rows]]
+        padded = stored < 0
+        remapped = np.where(padded, -1, old_to_new[np.maximum(stored, 0)])
+        stale = (~padded & (remapped < 0)).any(axis=1) | (~padded & changed[np.maximum(remapped, 0)]).any(axis=1)
+        recompute[merge_rows[stale]] = True
+        merge_rows, remapped = merge_rows[~stale], remapped[~stale]
+        stored_scores = previous["scores"][old_rows[merge_rows]]
+
+        changed_rows = np.flatnonzero(changed)
+        block = max(1, BLOCK_ELEMENTS // max(len(changed_rows) + top_k, 1))
+        for start in range(0, len(merge_rows), block):
+            rows = merge_rows[start:start + block]
+            candidates = np.concatenate([remapped[start:start + block],
+                                         np.broadcast_to(changed_rows, (len(rows), len(changed_rows)))], axis=1)
+            candidate_scores = np.concatenate([
+                np.where(remapped[start:start + block] < 0, -np.inf, stored_scores[start:start + block]),
+                reference[rows] @ reference[changed_rows].T,
+            ], axis=1)
+            top, top_scores = _top_k(candidate_scores, top_k)
+            neighbors[rows] = np.where(top < 0, -1, np.take_along_axis(candidates, np.maximum(top, 0), axis=1))
+            scores[rows] = top_scores
+
+    recompute_rows = np.flatnonzero(recompute)
+    if len(recompute_rows):
+        neighbors[recompute_rows], scores[recompute_rows] = compute_neighbors(reference, top_k, recompute_rows)
+
+    table = {"item_ids": item_ids, "neighbors": neighbors, "scores": scores, "vectors": reference}
+    return table, {"items": num_items, "changed": int(changed.sum()),
+                   "recomputed": len(recompute_rows), "merged": len(merge_rows)}
+
+
+def save_neighbor_table(table, path):
+    """Writes the table atomically so the API never reads a partial file."""
+    temp_path = f"{path}.tmp.npz" # np.savez appends .npz to names without it
+    np.savez(temp_path, **table)
+    os.replace(temp_path, path)
+
+
+def load_neighbor_table(path):
+    with np.load(path) as data:
+        return {name: data[name] for name in ("item_ids", "neighbors", "scores", "vectors")}
+
+
+def build_item_neighbors(weights, item_map, path, top_k=DEFAULT_TOP_K, incremental=True):
+    """
+    Post-training stage: computes (or incrementally updates) the item-neighbor table for
+    a model and saves it at path.
+
+    Args:
+        weights (dict): Exported NCF weights (inference.export_ncf_weights).
+        item_map (dict): Original item ID -> index.
+        path (str): Output .npz; with incremental, an existing table there is reused.
+
+    Returns:
+        dict: Stats from update_neighbors plus 'seconds'.
+    """
+    start = time.perf_counter()
+    vectors = item_vectors(weights)
+    item_ids = np.empty(len(vectors), dtype=object)
+    item_ids[list(item_map.values())] = [str(item_id) for item_id in item_map.keys()]
+    previous = None
+    if incremental and os.path.exists(path):
+        try:
+            previous = load_neighbor_table(path)
+        except (OSError, ValueError, KeyError):
+            previous = None # Unreadable or from an older format; rebuild
+    table, stats = update_neighbors(vectors, item_ids, previous, top_k)
+    save_neighbor_table(table, path)
+    stats["seconds"] = time.perf_counter() - start
+    return stats
+
+
+class ItemNeighbors:
+    """A loaded neighbor table with an ID index, for constant-time similar-item lookups."""
+
+    def __init__(self, table):
+        self.item_ids = table["item_ids"]
+        self.neighbors = table["neighbors"]
+        self.scores = table["scores"]
+        self.row_of = {item_id: row for row, item_id in enumerate(self.item_ids.tolist())}
+
+    @classmethod
+    def load(cls, path):
+        return cls(load_neighbor_table(path))
+
+    def similar(self, item_id, count=DEFAULT_TOP_K):
+        """[(item_id, cosine)] for the item's nearest neighbors, best first; None if the item is unknown."""
+        row = self.row_of.get(item_id)
+        if row is None:
+            return None
+        neighbors = self.neighbors[row, :count]
+        valid = neighbors >= 0
+        return list(zip(self.item_ids[neighbors[valid]].tolist(), self.scores[row, :count][valid].tolist()))
@@ -0,0 +1,131 @@
+# test_cooccurrence.py
+import os
+import sqlite3
+
+import numpy as np
+import pytest
+
+from cooccurrence import CooccurrenceModel, load_cooccurrence_model, save_caught_up_state
+from session_scoring import INTERACTION_WEIGHTS
+
+
+def _random_interactions(seed, count, num_users=30, num_items=25):
+    rng = np.random.default_rng(seed)
+    users = [f"u{u}" for u in rng.integers(0, num_users, size=count)]
+    items = [f"i{i}" for i in rng.integers(0, num_items, size=count)]
+    weights = rng.choice([1.0, 2.0, 3.0], size=count)
+    return users, items, weights
+
+
+def _assert_same_model(model, expected):
+    assert model.user_ids == expected.user_ids
+    assert model.item_ids == expected.item_ids
+    np.testing.assert_allclose(model.user_items.toarray(), expected.user_items.toarray())
+    np.testing.assert_allclose(model.cooccurrence.toarray(), expected.cooccurrence.toarray())
+    np.testing.assert_allclose(model.scores, expected.scores, rtol=1e-5, atol=1e-6)
+    for user_idx in range(expected.num_users):
+        np.testing.assert_allclose(model.score_user(user_idx), expected.score_user(user_idx), rtol=1e-5, atol=1e-6)
+
+
+@pytest.fixture
+def interactions_db(tmp_path):
+    db_path = str(tmp_path / "user_interactions.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE user_interactions (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "user_id TEXT, item_id TEXT, type TEXT, timestamp REAL)")
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def _log(db_path, rows):
+    conn = sqlite3.connect(db_path)
+    conn.executemany("INSERT INTO user_interactions (user_id, item_id, type, timestamp) VALUES (?, ?, ?, 0)", rows)
+    conn.commit()
+    conn.close()
+
+
+def test_incremental_updates_equal_a_full_rebuild():
+    base = _random_interactions(0, 300)
+    batches = [_random_interactions(seed, 40, num_users=40, num_items=35) for seed in (1, 2, 3)]
+
+    model = CooccurrenceModel.from_interactions(*base, top_k=5)
+    for batch in batches: # Includes new users and items
+        model.add_interactions(*batch)
+
+    all_rows = [np.concatenate([base[column]] + [batch[column] for batch in batches]) for column in range(3)]
+    _assert_same_model(model, CooccurrenceModel.from_interactions(*all_rows, top_k=5))
+
+
+def test_non_positive_weights_are_ignored():
+    model = CooccurrenceModel.from_interactions(["u1", "u2"], ["i1", "i2"], [1.0, 1.0])
+    assert model.add_interactions(["u3", "u1"], ["i3", "i2"], [0.0, -1.0]) == 0
+    assert model.num_users == 2 and model.num_items == 2
+
+
+def test_catch_up_applies_rows_after_the_watermark(interactions_db):
+    view = INTERACTION_WEIGHTS.get("view", 1.0)
+    _log(interactions_db, [("u1", "i1", "view"), ("u2", "i2", "view")]) # Already in the model (ids 1-2)
+    model = CooccurrenceModel.from_interactions(["u1", "u2"], ["i1", "i2"], [view, view], watermark=2)
+    new_rows = [("u1", "i2", "cart"), ("u3", "i1", "tap"), ("u3", "i3", "view")]
+    _log(interactions_db, new_rows)
+
+    assert model.has_new_interactions(interactions_db)
+    assert model.catch_up(interactions_db, batch_size=2) == 3
+    assert model.watermark == 5
+    assert not model.has_new_interactions(interactions_db)
+    assert model.catch_up(interactions_db) == 0
+
+    expected = CooccurrenceModel.from_interactions(
+        ["u1", "u2"] + [row[0] for row in new_rows], ["i1", "i2"] + [row[1] for row in new_rows],
+        [view, view] + [INTERACTION_WEIGHTS.get(row[2], 1.0) for row in new_rows]
+    )
+    _assert_same_model(model, expected)
+
+
+def test_catch_up_max_rows_leaves_the_rest_for_later(interactions_db):
+    _log(interactions_db, [(f"u{n % 4}", f"i{n % 5}", "view") for n in range(10)])
+    model = CooccurrenceModel.from_interactions(["u0"], ["i0"], [1.0], watermark=0)
+
+    assert model.catch_up(interactions_db, batch_size=3, max_rows=4) == 4
+    assert model.watermark == 4
+    assert model.catch_up(interactions_db, batch_size=3, max_rows=4) == 4
+    assert model.watermark == 8
+    assert model.catch_up(interactions_db, max_rows=4) == 2
+    assert model.watermark == 10
+
+
+def test_catch_up_is_a_no_op_without_a_watermark(interactions_db):
+    _log(interactions_db, [("u1", "i1", "view")])
+    model = CooccurrenceModel.from_interactions(["u0"], ["i0"], [1.0])
+    assert not model.has_new_interactions(interactions_db)
+    assert model.catch_up(interactions_db) == 0
+
+
+def test_copy_is_independent(interactions_db):
+    model = CooccurrenceModel.from_interactions(*_random_interactions(0, 100), watermark=0)
+    before = model.cooccurrence.toarray()
+    _log(interactions_db, [("new-user", "new-item", "cart"), ("u1", "new-item", "view")])
+
+    updated = model.copy()
+    updated.catch_up(interactions_db)
+
+    assert "new-item" in updated.item_map and "new-item" not in model.item_map
+    assert model.watermark == 0 and updated.watermark == 2
+    np.testing.assert_array_equal(model.cooccurrence.toarray(), before)
+
+
+def test_caught_up_state_is_used_until_the_model_file_changes(interactions_db, tmp_path):
+    model_path = str(tmp_path / "cooccurrence.npz")
+    model = CooccurrenceModel.from_interactions(["u1", "u2"], ["i1", "i2"], [1.0, 1.0], watermark=0)
+    model.save(model_path)
+    _log(interactions_db, [("u3", "i1", "view")])
+    model.catch_up(interactions_db)
+
+    save_caught_up_state(model, model_path)
+    resumed = load_cooccurrence_model(model_path)
+    assert resumed.watermark == 1 and "u3" in resumed.user_map
+
+    stat = os.stat(model_path) # A retrain replacing the file invalidates the saved state
+    os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    assert load_cooccurrence_model(model_path).watermark == 0
@@ -0,0 +1,95 @@
+# test_interaction_archive.py
+import sqlite3
+
+import pytest
+
+import interaction_archive
+
+DAY = interaction_archive.SECONDS_PER_DAY
+NOW = 1_800_000_000.0
+
+
+def _timestamp(i):
+    return NOW - (60 - i * 0.5) * DAY
+
+
+@pytest.fixture
+def interactions_db(tmp_path):
+    """100 interactions, one every half day from 60 days ago."""
+    db_path = str(tmp_path / "user_interactions.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE user_interactions (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                 "user_id TEXT, item_id TEXT, type TEXT, timestamp REAL)")
+    conn.executemany(
+        "INSERT INTO user_interactions (user_id, item_id, type, timestamp) VALUES (?, ?, ?, ?)",
+        [(f"u{i % 7}", f"p{i % 11}", "view", _timestamp(i)) for i in range(100)]
+    )
+    conn.commit()
+    conn.close()
+    return db_path
+
+
+def _archived_and_hot_ids(db_path, archive_dir):
+    archived = interaction_archive.read_archive(archive_dir, columns=("id",))["id"].tolist()
+    conn = sqlite3.connect(db_path)
+    try:
+        hot = [row[0] for row in conn.execute("SELECT id FROM user_interactions")]
+    finally:
+        conn.close()
+    return archived, hot
+
+
+def test_compaction_moves_old_rows(interactions_db, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    result = interaction_archive.compact_interactions(interactions_db, archive_dir, 30, now=NOW)
+
+    archived, hot = _archived_and_hot_ids(interactions_db, archive_dir)
+    assert result["rows_archived"] == result["rows_deleted"] == len(archived) == 60
+    assert sorted(archived + hot) == list(range(1, 101))
+
+
+@pytest.mark.parametrize("moved_cutoff_days", [30, 20])
+def test_crash_between_snapshot_and_delete_is_recovered(interactions_db, tmp_path, monkeypatch, moved_cutoff_days):
+    archive_dir = str(tmp_path / "archive")
+    # Every part of the snapshot is written, then the process dies before the DELETE runs
+    write_part = interaction_archive._write_part
+    parts_to_write = len({int(_timestamp(i) // DAY) for i in range(100)
+                          if _timestamp(i) < NOW - 30 * DAY}) # One part per day partition
+
+    def crashing_write_part(*args):
+        written = write_part(*args)
+        crashing_write_part.calls += 1
+        if crashing_write_part.calls == parts_to_write:
+            raise KeyboardInterrupt
+        return written
+    crashing_write_part.calls = 0
+
+    monkeypatch.setattr(interaction_archive, "_write_part", crashing_write_part)
+    with pytest.raises(KeyboardInterrupt):
+        interaction_archive.compact_interactions(interactions_db, archive_dir, 30, now=NOW)
+    monkeypatch.setattr(interaction_archive, "_write_part", write_part)
+
+    archived, hot = _archived_and_hot_ids(interactions_db, archive_dir)
+    assert len(archived) == 60 and len(hot) == 100 # Archived but not yet deleted
+
+    # The next run (possibly with a moved cutoff) replays the pending snapshot first
+    interaction_archive.compact_interactions(interactions_db, archive_dir, moved_cutoff_days, now=NOW)
+
+    archived, hot = _archived_and_hot_ids(interactions_db, archive_dir)
+    assert len(archived) == len(set(archived)) # No row archived twice
+    assert not set(archived) & set(hot)
+    assert sorted(archived + hot) == list(range(1, 101)) # And none lost
+    assert len(hot) == sum(_timestamp(i) >= NOW - moved_cutoff_days * DAY for i in range(100))
+
+
+def test_read_interactions_combines_archive_and_hot_rows(interactions_db, tmp_path):
+    archive_dir = str(tmp_path / "archive")
+    interaction_archive.compact_interactions(interactions_db, archive_dir, 30, now=NOW)
+
+    frame = interaction_archive.read_interactions(interactions_db, archive_dir, columns=("id", "user_id", "timestamp"))
+    assert sorted(frame["id"].tolist()) == list(range(1, 101))
+
+    recent = interaction_archive.read_interactions(interactions_db, archive_dir, start_time=NOW - 45 * DAY,
+                                                   columns=("id", "timestamp"))
+    assert (recent["timestamp"] >= NOW - 45 * DAY).all()
+    assert len(recent) == 70
@@ -0,0 +1,82 @@
+# test_preprocess_cache.py
+import os
+
+import pandas as pd
+import pytest
+
+from preprocess_cache import PreprocessCache
+from train import load_and_preprocess_data
+
+
+@pytest.fixture
+def interactions():
+    return pd.DataFrame({
+        "user_id": ["u1", "u1", "u2", "u3", "u3", "u4"],
+        "item_id": ["i1", "i2", "i1", "i3", "i2", "i4"],
+        "interaction_score": [1.0, 2.0, 1.0, 3.0, 1.0, 1.0],
+    })
+
+
+def _entries(cache):
+    return sorted(name for name in os.listdir(cache.cache_dir) if not name.startswith("."))
+
+
+def test_hit_returns_the_stored_result(interactions, tmp_path):
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    computed = load_and_preprocess_data(interactions, negative_samples=0, cache=cache)
+    cached = load_and_preprocess_data(interactions, negative_samples=0, cache=cache)
+
+    assert len(_entries(cache)) == 1
+    pd.testing.assert_frame_equal(cached[0], computed[0], check_dtype=False)
+    assert cached[1:] == computed[1:]
+
+
+def test_changed_input_or_params_miss(interactions, tmp_path):
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    key = cache.fingerprint(interactions, negative_samples=0)
+    load_and_preprocess_data(interactions, negative_samples=0, cache=cache)
+
+    changed = interactions.copy()
+    changed.loc[0, "item_id"] = "i9"
+    assert cache.get(cache.fingerprint(changed, negative_samples=0)) is None
+    assert cache.get(cache.fingerprint(interactions, negative_samples=4)) is None
+    assert cache.get(key) is not None
+
+    result = load_and_preprocess_data(changed, negative_samples=0, cache=cache)
+    assert "i9" in result[2]
+    assert len(_entries(cache)) == 2
+
+
+def test_csv_is_keyed_by_content(interactions, tmp_path):
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    first, second = str(tmp_path / "a.csv"), str(tmp_path / "b.csv")
+    interactions.to_csv(first, index=False)
+    interactions.to_csv(second, index=False)
+    assert cache.fingerprint(first, negative_samples=0) == cache.fingerprint(second, negative_samples=0)
+
+    interactions.iloc[:-1].to_csv(second, index=False)
+    assert cache.fingerprint(first, negative_samples=0) != cache.fingerprint(second, negative_samples=0)
+
+
+def test_eviction_removes_least_recently_used_entries(interactions, tmp_path):
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=10 * 1024 * 1024)
+    keys = []
+    for n in range(3):
+        frame = interactions.assign(interaction_score=interactions["interaction_score"] + n)
+        keys.append(cache.fingerprint(frame, negative_samples=0))
+        load_and_preprocess_data(frame, negative_samples=0, cache=cache)
+        os.utime(os.path.join(cache.cache_dir, keys[-1]), (1000 + n, 1000 + n)) # Deterministic ages
+
+    cache.get(keys[0]) # Now the most recently used
+    size = lambda key: sum(entry.stat().st_size for entry in os.scandir(os.path.join(cache.cache_dir, key)))
+    cache.max_bytes = size(keys[0]) + size(keys[2]) # Room for two of the three entries
+    cache.evict()
+
+    assert _entries(cache) == sorted([keys[0], keys[2]])
+
+
+def test_disabled_cache_stores_nothing(interactions, tmp_path):
+    cache = PreprocessCache(str(tmp_path / "cache"), max_bytes=0)
+    result = load_and_preprocess_data(interactions, negative_samples=0)
+    assert cache.put(cache.fingerprint(interactions, negative_samples=0), result) is False
+    assert not os.path.exists(cache.cache_dir)
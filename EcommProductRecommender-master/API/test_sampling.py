@@ -0,0 +1,62 @@
+# test_sampling.py
+import numpy as np
+import pytest
+
+from sampling import AliasTable, NegativeSampler
+
+
+def test_alias_table_matches_distribution():
+    probabilities = np.array([0.5, 0.25, 0.125, 0.0625, 0.0625, 0.0])
+    table = AliasTable(probabilities * 8) # Unnormalized weights are fine
+    draws = table.sample(200_000, np.random.default_rng(0))
+
+    frequencies = np.bincount(draws, minlength=len(probabilities)) / len(draws)
+    np.testing.assert_allclose(frequencies, probabilities, atol=0.005)
+    assert frequencies[-1] == 0.0 # Zero-probability items are never drawn
+
+
+@pytest.mark.parametrize("probabilities", [[], [0.0, 0.0], [[0.5, 0.5]]])
+def test_alias_table_rejects_invalid_input(probabilities):
+    with pytest.raises(ValueError):
+        AliasTable(probabilities)
+
+
+@pytest.mark.parametrize("strategy", ["popularity", "uniform"])
+def test_sampler_never_returns_a_positive(strategy):
+    rng = np.random.default_rng(1)
+    num_users, num_items = 50, 40
+    users = rng.integers(0, num_users, size=1500)
+    items = rng.integers(0, num_items, size=1500)
+    positives = set(zip(users.tolist(), items.tolist()))
+    sampler = NegativeSampler(users, items, num_items, strategy=strategy, seed=2)
+
+    negative_users, negative_items = sampler.sample(users, 4)
+
+    assert len(negative_users) == len(negative_items) > 0
+    assert not positives & set(zip(negative_users.tolist(), negative_items.tolist()))
+    assert ((negative_items >= 0) & (negative_items < num_items)).all()
+
+
+def test_sampler_drops_negatives_for_users_without_any():
+    # User 0 interacted with every item, so no negative exists for them
+    users = np.array([0, 0, 0, 1])
+    items = np.array([0, 1, 2, 0])
+    sampler = NegativeSampler(users, items, num_items=3, strategy="uniform", seed=0)
+
+    negative_users, negative_items = sampler.sample(np.array([0, 1]), 5)
+
+    assert 0 not in negative_users.tolist()
+    assert set(negative_items.tolist()) <= {1, 2}
+
+
+def test_sampler_is_reproducible_with_an_explicit_generator():
+    users = np.arange(100) % 10
+    items = np.arange(100) % 17
+    sampler = NegativeSampler(users, items, num_items=17, seed=0)
+
+    first = sampler.sample(users, 3, rng=np.random.default_rng(7))
+    sampler.sample(users, 3) # Advances the sampler's own generator only
+    second = sampler.sample(users, 3, rng=np.random.default_rng(7))
+
+    np.testing.assert_array_equal(first[0], second[0])
+    np.testing.assert_array_equal(first[1], second[1])
@@ -1,40 +1,156 @@
+import os
 import pandas as pd
 import numpy as np
-import json
+import time
 from sklearn.model_selection import train_test_split
 from tensorflow.keras.optimizers import Adam
 import tensorflow as tf # Added for AUC
 
 # Assuming train.py and model.py are in the same src directory
 from model import create_ncf_model
+from sampling import NegativeSampler, NegativeSamplingSequence
+from input_pipeline import make_datasets, make_sampled_datasets
+from inference import export_ncf_weights, save_ncf_weights, weights_path_for_model
+# Re-exported: mappings I/O lives in mappings.py so serving doesn't import TensorFlow
+from mappings import save_mappings, load_mappings
+from model_registry import artifact_checksums
+from serving_bundle import write_bundle, bundle_path_for_model
+from preprocess_cache import default_preprocess_cache
+from popularity import compute_popularity, load_item_categories, save_popularity, popularity_path_for_model
+from similar_items import build_item_neighbors, neighbors_path_for_model
 # --- Configuration ---
 DEFAULT_EMBEDDING_DIM = 32
 DEFAULT_MLP_LAYERS = [64, 32, 16]
 DEFAULT_BATCH_SIZE = 256
 DEFAULT_EPOCHS = 10 # Low for quick example, should be higher for real training
 DEFAULT_NEGATIVE_SAMPLES = 4 # Number of negative samples per positive sample
+DEFAULT_SAMPLING_STRATEGY = "popularity" # 'popularity' or 'uniform' for the per-epoch NegativeSampler
+DEFAULT_INPUT_PIPELINE = "numpy" # 'numpy' or 'tf.data' (streaming, see input_pipeline.py)
+DEFAULT_DECAY_HALF_LIFE_DAYS = 30.0 # aggregate_interactions: an event's weight halves every N days (0 = no decay)
+SECONDS_PER_DAY = 24 * 3600
+CSV_CACHE_SUFFIX = ".cache.npz" # load_interactions_csv: pre-encoded copy stored next to the CSV
 
-def load_and_preprocess_data(csv_file_path, negative_samples=DEFAULT_NEGATIVE_SAMPLES):
+
+def aggregate_interactions(df, half_life_days=DEFAULT_DECAY_HALF_LIFE_DAYS, reference_time=None):
+    """
+    Collapses an event log to one row per (user_id, item_id), vectorized.
+
+    Each event contributes its 'interaction_score' (e.g. the INTERACTION_WEIGHTS value of
+    its type, 1 if absent) times 0.5 ** (age / half_life). Events without a timestamp
+    aren't decayed. Ages are measured from reference_time (default: the newest event).
+
+    Returns:
+        pd.DataFrame: user_id, item_id, interaction_score and weight (the summed, decayed
+                      scores), timestamp (latest event, if present) and event_count.
+    """
+    scores = df['interaction_score'].astype('float64') if 'interaction_score' in df.columns else pd.Series(1.0, index=df.index)
+    weighted = pd.DataFrame({'user_id': df['user_id'], 'item_id': df['item_id'], 'weight': scores})
+
+    has_timestamp = 'timestamp' in df.columns
+    if has_timestamp:
+        timestamps = pd.to_numeric(df['timestamp'], errors='coerce')
+        weighted['timestamp'] = timestamps
+        if half_life_days and half_life_days > 0:
+            if reference_time is None:
+                reference_time = timestamps.max()
+            ages = (reference_time - timestamps).clip(lower=0.0) / (half_life_days * SECONDS_PER_DAY)
+            weighted['weight'] *= np.power(0.5, ages.fillna(0.0).to_numpy())
+
+    aggregations = {'weight': ('weight', 'sum'), 'event_count': ('weight', 'size')}
+    if has_timestamp:
+        aggregations['timestamp'] = ('timestamp', 'max')
+    aggregated = weighted.groupby(['user_id', 'item_id'], sort=False, as_index=False).agg(**aggregations)
+    aggregated['interaction_score'] = aggregated['weight']
+    return aggregated
+
+
+def _csv_cache_path(csv_file_path):
+    directory, name = os.path.split(csv_file_path)
+    return os.path.join(directory, f".{name}{CSV_CACHE_SUFFIX}")
+
+
+def load_interactions_csv(csv_file_path, use_cache=True):
     """
-    Loads data from a CSV file, performs entity mapping, and generates negative samples.
+    Reads an interactions CSV into a DataFrame, parsing it only when it has changed.
+
+    The parsed columns are kept as a pre-encoded .npz next to the CSV (strings as fixed-width
+    unicode, no pickling) and reused while the CSV's mtime and size are unchanged.
+    """
+    stat = os.stat(csv_file_path)
+    source_key = np.array([stat.st_mtime_ns, stat.st_size], dtype=np.int64)
+    cache_path = _csv_cache_path(csv_file_path)
+    if use_cache and os.path.exists(cache_path):
+        try:
+            with np.load(cache_path) as cached:
+                if np.array_equal(cached["_source"], source_key):
+                    return pd.DataFrame({column: cached[f"col:{column}"] for column in cached["_columns"].tolist()})
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Ignoring unreadable CSV cache {cache_path}: {e}")
+
+    df = pd.read_csv(csv_file_path)
+    if not use_cache:
+        return df
+    arrays = {}
+    for column in df.columns:
+        values = df[column]
+        if not pd.api.types.is_numeric_dtype(values): # Text (object or string dtype)
+            if values.isna().any():
+                return df # Nulls in a text column don't survive fixed-width encoding; skip caching
+            arrays[f"col:{column}"] = values.to_numpy().astype(str)
+        else:
+            arrays[f"col:{column}"] = values.to_numpy()
+    temp_path = f"{cache_path}.{os.getpid()}.tmp.npz"
+    try:
+        np.savez(temp_path, _source=source_key, _columns=np.array(list(df.columns), dtype=str), **arrays)
+        os.replace(temp_path, cache_path)
+    except OSError as e:
+        print(f"Could not write CSV cache {cache_path}: {e}")
+    return df
+
+
+def load_and_preprocess_data(data, negative_samples=DEFAULT_NEGATIVE_SAMPLES, cache=None):
+    """
+    Loads interaction data, performs entity mapping, and generates negative samples.
 
     Args:
-        csv_file_path (str): Path to the CSV file.
+        data (str, pd.DataFrame or dict): Path to a CSV file, or the interactions themselves
+                               as a DataFrame or a {column: array} dict (not modified).
                                Expected columns: 'user_id', 'item_id',
                                                  'interaction_score' (optional, 1 for positive if not present),
-                                                 'timestamp' (optional, not used in this version).
+                                                 'timestamp' (optional, kept in df_processed for
+                                                              evaluation.leave_last_out_split),
+                                                 'weight' (optional, kept in df_processed and used
+                                                           as the loss weight by train_model).
         negative_samples (int): Number of negative samples to generate per positive interaction.
+        cache (PreprocessCache, optional): If given, the result is looked up by a fingerprint of
+                                           the data and negative_samples, and stored on a miss.
 
     Returns:
         tuple: Contains:
-            - df_processed (pd.DataFrame): Processed dataframe with 'user_idx', 'item_idx', 'label'.
+            - df_processed (pd.DataFrame): Processed dataframe with 'user_idx', 'item_idx', 'label'
+                                           (and 'timestamp'/'weight' for positives, if the input has them).
             - user_map (dict): Mapping from original user_id to integer index.
             - item_map (dict): Mapping from original item_id to integer index.
             - num_users (int): Total number of unique users.
             - num_items (int): Total number of unique items.
     """
-    print(f"Loading data from {csv_file_path}...")
-    df = pd.read_csv(csv_file_path)
+    if cache is not None:
+        key = cache.fingerprint(data, negative_samples=negative_samples)
+        cached = cache.get(key)
+        if cached is not None:
+            print(f"Using cached preprocessing result {key[:12]} ({len(cached[0])} samples).")
+            return cached
+        result = load_and_preprocess_data(data, negative_samples=negative_samples)
+        cache.put(key, result)
+        return result
+
+    if isinstance(data, str):
+        print(f"Loading data from {data}...")
+        df = load_interactions_csv(data) # Parsed once, then reused from the .npz cache
+    elif isinstance(data, pd.DataFrame):
+        df = data.copy(deep=False) # Columns added below don't leak into the caller's frame
+    else:
+        df = pd.DataFrame(data)
 
     # Assume positive interaction if 'interaction_score' is not present or > 0
     if 'interaction_score' in df.columns:
@@ -61,52 +177,122 @@ def load_and_preprocess_data(csv_file_path, negative_samples=DEFAULT_NEGATIVE_SA
     df_positive['item_idx'] = df_positive['item_id'].map(item_map)
 
     # --- Negative Sampling ---
+    # negative_samples=0 keeps only positives, e.g. for train_model(negative_sampler=...)
     print(f"Generating {negative_samples} negative samples per positive interaction...")
-    df_negatives_list = []
-    all_item_indices = set(range(num_items))
-
-    for _, row in df_positive.iterrows():
-        user_idx = row['user_idx']
-        interacted_items = set(df_positive[df_positive['user_idx'] == user_idx]['item_idx'])
-        non_interacted_items = list(all_item_indices - interacted_items)
-
-        if not non_interacted_items: # User interacted with all items
-            continue
-
-        num_samples_to_generate = min(negative_samples, len(non_interacted_items))
-        sampled_negative_items = np.random.choice(non_interacted_items, size=num_samples_to_generate, replace=False)
-
-        for item_idx in sampled_negative_items:
-            df_negatives_list.append({'user_idx': user_idx, 'item_idx': item_idx, 'label': 0})
-
-    df_negatives = pd.DataFrame(df_negatives_list)
+    if negative_samples > 0:
+        sampler = NegativeSampler(df_positive['user_idx'].to_numpy(dtype=np.int64),
+                                  df_positive['item_idx'].to_numpy(dtype=np.int64),
+                                  num_items, strategy="uniform", seed=42)
+        negative_users, negative_items = sampler.sample(df_positive['user_idx'].to_numpy(dtype=np.int64), negative_samples)
+    else:
+        negative_users = negative_items = np.empty(0, dtype=np.int64)
+    df_negatives = pd.DataFrame({'user_idx': negative_users, 'item_idx': negative_items,
+                                 'label': np.zeros(len(negative_users), dtype=np.int64)})
 
     # Combine positive and negative samples
-    df_processed = pd.concat([df_positive[['user_idx', 'item_idx', 'label']], df_negatives], ignore_index=True)
+    positive_columns = ['user_idx', 'item_idx', 'label']
+    for optional_column in ('timestamp', 'weight'):
+        if optional_column in df_positive.columns:
+            positive_columns.append(optional_column) # NaN for negatives
+    df_processed = pd.concat([df_positive[positive_columns], df_negatives], ignore_index=True)
     df_processed = df_processed.sample(frac=1, random_state=42).reset_index(drop=True) # Shuffle
 
     print(f"Total samples after negative sampling: {len(df_processed)}")
     return df_processed, user_map, item_map, num_users, num_items
 
 
+def make_negative_sampler(df_processed, num_items, strategy=DEFAULT_SAMPLING_STRATEGY, seed=42):
+    """
+    Builds a NegativeSampler over the positive rows of df_processed.
+    """
+    df_positive = df_processed[df_processed['label'] == 1]
+    return NegativeSampler(df_positive['user_idx'].values, df_positive['item_idx'].values,
+                           num_items, strategy=strategy, seed=seed)
+
+
 def train_model(df_processed, num_users, num_items,
                 model_save_path='model.h5', mappings_save_path='mappings.json',
                 embedding_dim=DEFAULT_EMBEDDING_DIM, mlp_layers=DEFAULT_MLP_LAYERS,
-                batch_size=DEFAULT_BATCH_SIZE, epochs=DEFAULT_EPOCHS):
+                batch_size=DEFAULT_BATCH_SIZE, epochs=DEFAULT_EPOCHS,
+                negative_sampler=None, negative_samples=DEFAULT_NEGATIVE_SAMPLES,
+                input_pipeline=DEFAULT_INPUT_PIPELINE):
     """
     Trains the NCF model and saves it along with the mappings.
+
+    If negative_sampler (a sampling.NegativeSampler) is given, df_processed is expected to
+    hold positives only (see load_and_preprocess_data(..., negative_samples=0)); fresh
+    negatives are then drawn for every training batch instead of being fixed up front.
+
+    input_pipeline selects how batches reach model.fit: 'numpy' (in-memory arrays with a
+    random split) or 'tf.data' (streaming tf.data.Dataset with shuffle buffer, prefetching
+    and a deterministic hash-based validation split, see input_pipeline.py).
+
+    If df_processed has a 'weight' column (see aggregate_interactions), positives are
+    weighted by it in the training loss (rescaled to mean 1; negatives weigh 1).
     """
+    if input_pipeline not in ("numpy", "tf.data"):
+        raise ValueError(f"Unknown input_pipeline '{input_pipeline}'. Use 'numpy' or 'tf.data'.")
+
     print("Preparing data for training...")
     X_user = df_processed['user_idx'].values
     X_item = df_processed['item_idx'].values
     y = df_processed['label'].values
-
-    # Train-validation split (optional, but good practice)
-    X_user_train, X_user_val, X_item_train, X_item_val, y_train, y_val = train_test_split(
-        X_user, X_item, y, test_size=0.2, random_state=42
-    )
-
-    print(f"Training with {len(X_user_train)} samples, validating with {len(X_user_val)} samples.")
+    sample_weights = None
+    if 'weight' in df_processed.columns:
+        weights = df_processed['weight'].to_numpy(dtype=np.float32, na_value=np.nan)
+        positive_mean = np.nanmean(weights[y == 1]) if (y == 1).any() else 1.0
+        sample_weights = np.where(y == 1, weights / positive_mean, 1.0).astype(np.float32)
+    fit_kwargs = {}
+
+    if negative_sampler is not None:
+        positive_mask = y == 1
+        X_user, X_item = X_user[positive_mask], X_item[positive_mask]
+        if sample_weights is not None:
+            sample_weights = sample_weights[positive_mask]
+
+    if input_pipeline == "tf.data":
+        if negative_sampler is not None:
+            train_data, validation_data = make_sampled_datasets(
+                X_user, X_item, negative_sampler, negative_samples, batch_size, sample_weights=sample_weights
+            )
+            print(f"Streaming {len(X_user)} positives through tf.data ({negative_samples} fresh negatives each per epoch).")
+        else:
+            train_data, validation_data = make_datasets(X_user, X_item, y, batch_size, sample_weights=sample_weights)
+            print(f"Streaming {len(X_user)} samples through tf.data.")
+    elif negative_sampler is not None:
+        w_train = None
+        if sample_weights is not None:
+            X_user_train, X_user_val, X_item_train, X_item_val, w_train, _ = train_test_split(
+                X_user, X_item, sample_weights, test_size=0.2, random_state=42
+            )
+        else:
+            X_user_train, X_user_val, X_item_train, X_item_val = train_test_split(
+                X_user, X_item, test_size=0.2, random_state=42
+            )
+        # Validation negatives are drawn once so val metrics stay comparable across epochs
+        val_neg_users, val_neg_items = negative_sampler.sample(X_user_val, negative_samples)
+        X_user_val = np.concatenate([X_user_val, val_neg_users])
+        X_item_val = np.concatenate([X_item_val, val_neg_items])
+        y_val = np.concatenate([np.ones(len(X_item_val) - len(val_neg_items)), np.zeros(len(val_neg_items))])
+        train_data = NegativeSamplingSequence(
+            X_user_train, X_item_train, negative_sampler, negative_samples, batch_size, seed=42,
+            sample_weights=w_train
+        )
+        validation_data = ([X_user_val, X_item_val], y_val)
+        print(f"Training with {len(X_user_train)} positives ({negative_samples} fresh negatives each per epoch), "
+              f"validating with {len(X_user_val)} samples.")
+    else:
+        # Train-validation split (optional, but good practice)
+        weights = sample_weights if sample_weights is not None else np.ones(len(y), dtype=np.float32)
+        X_user_train, X_user_val, X_item_train, X_item_val, y_train, y_val, w_train, _ = train_test_split(
+            X_user, X_item, y, weights, test_size=0.2, random_state=42
+        )
+        train_data = [X_user_train, X_item_train]
+        validation_data = ([X_user_val, X_item_val], y_val)
+        fit_kwargs = {'y': y_train, 'batch_size': batch_size}
+        if sample_weights is not None:
+            fit_kwargs['sample_weight'] = w_train
+        print(f"Training with {len(X_user_train)} samples, validating with {len(X_user_val)} samples.")
 
     model = create_ncf_model(num_users, num_items, embedding_dim, mlp_layers)
 
@@ -116,11 +302,11 @@ def train_model(df_processed, num_users, num_items,
 
     print("Starting model training...")
     history = model.fit(
-        [X_user_train, X_item_train], y_train,
-        validation_data=([X_user_val, X_item_val], y_val),
-        batch_size=batch_size,
+        train_data,
+        validation_data=validation_data,
         epochs=epochs,
-        verbose=1
+        verbose=1,
+        **fit_kwargs
     )
 
     print(f"Training complete. Saving model to {model_save_path} and mappings to {mappings_save_path}")
@@ -130,20 +316,68 @@ def train_model(df_processed, num_users, num_items,
     print("Model training process finished.")
     return model, history
 
-def save_mappings(user_map, item_map, file_path):
-    mappings = {
-        'user_map': user_map,
-        'item_map': item_map
-    }
-    with open(file_path, 'w') as f:
-        json.dump(mappings, f)
-    print(f"Mappings saved to {file_path}")
-
-def load_mappings(file_path):
-    with open(file_path, 'r') as f:
-        mappings = json.load(f)
-    print(f"Mappings loaded from {file_path}")
-    return mappings['user_map'], mappings['item_map']
+def run_training_job(csv_file_path, model_save_path, mappings_save_path):
+    """
+    Full /v1/train pipeline for one uploaded CSV, run inside a scheduler worker process.
+
+    Returns:
+        dict: 'num_users' and 'num_items' of the trained model, 'checksums' of the saved
+              artifacts (for the model registry), and 'stage_seconds' (wall time per
+              pipeline stage) for the API's metrics.
+    """
+    stage_seconds = {}
+
+    start = time.perf_counter()
+    # Positives only: negatives are resampled per batch by the NegativeSampler
+    df_processed, user_map, item_map, num_users, num_items = load_and_preprocess_data(
+        csv_file_path, negative_samples=0, cache=default_preprocess_cache()
+    )
+    stage_seconds["preprocess"] = time.perf_counter() - start
+
+    if df_processed.empty or num_users == 0 or num_items == 0:
+        raise ValueError("Processed data is empty or no users/items found. Check data format and content.")
+
+    start = time.perf_counter()
+    trained_model, _ = train_model(
+        df_processed, num_users, num_items,
+        model_save_path=model_save_path,
+        negative_sampler=make_negative_sampler(df_processed, num_items)
+    )
+    stage_seconds["fit_and_save_model"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    save_mappings(user_map, item_map, mappings_save_path)
+    stage_seconds["save_mappings"] = time.perf_counter() - start
+
+    # Popularity lists the API serves to users the model doesn't know
+    start = time.perf_counter()
+    positives = df_processed[df_processed['label'] == 1]
+    index_to_item = np.empty(num_items, dtype=object)
+    index_to_item[list(item_map.values())] = list(item_map.keys())
+    popularity = compute_popularity(
+        index_to_item[positives['item_idx'].to_numpy(dtype=np.int64)],
+        positives['weight'].to_numpy() if 'weight' in positives else 1.0,
+        item_categories=load_item_categories()
+    )
+    save_popularity(popularity, popularity_path_for_model(model_save_path))
+    stage_seconds["popularity"] = time.perf_counter() - start
+
+    # Artifacts for the TF-free serving backend (SERVING_BACKEND=numpy)
+    start = time.perf_counter()
+    weights = export_ncf_weights(trained_model)
+    save_ncf_weights(weights, weights_path_for_model(model_save_path))
+    write_bundle(bundle_path_for_model(model_save_path), weights, user_map, item_map)
+    stage_seconds["write_serving_bundle"] = time.perf_counter() - start
+
+    # Precomputed neighbors for /v1/items/{item_id}/similar
+    start = time.perf_counter()
+    build_item_neighbors(weights, item_map, neighbors_path_for_model(model_save_path))
+    stage_seconds["similar_items"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    checksums = artifact_checksums(model_save_path, mappings_save_path, weights_path_for_model(model_save_path))
+    stage_seconds["checksum"] = time.perf_counter() - start
+    return {"num_users": num_users, "num_items": num_items, "checksums": checksums, "stage_seconds": stage_seconds}
 
 
 if __name__ == '__main__':